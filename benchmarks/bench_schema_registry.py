@@ -0,0 +1,64 @@
+'''
+Микро-бенчмарк валидации ответа GET /movies:
+старый путь (чтение файла схемы + jsonschema.validate на каждый вызов)
+против закэшированного валидатора из SchemaRegistry.
+
+Запуск: python -m benchmarks.bench_schema_registry [--movies 1000] [--repeat 50]
+'''
+import argparse
+import json
+import os
+import timeit
+
+from jsonschema import validate
+
+from utils.schema_registry import SCHEMAS_DIR, SchemaRegistry
+
+
+def make_movies_page(movies_count):
+    movies = [
+        {
+            'id': i,
+            'name': f'Movie {i}',
+            'price': 100 + i,
+            'description': 'Some description',
+            'imageUrl': 'https://example.com/image.png',
+            'location': 'MSK',
+            'published': True,
+            'genreId': 1,
+            'genre': {'name': 'Драма'},
+            'createdAt': '2024-01-01T00:00:00.000Z',
+            'rating': 5,
+        }
+        for i in range(movies_count)
+    ]
+    return {'movies': movies, 'count': movies_count, 'page': 1,
+            'pageSize': movies_count, 'pageCount': 1}
+
+
+def validate_from_file(instance):
+    with open(os.path.join(SCHEMAS_DIR, 'get_movies.json')) as file:
+        schema = json.load(file)
+    validate(instance, schema)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--movies', type=int, default=1000, help='Фильмов на странице')
+    parser.add_argument('--repeat', type=int, default=50, help='Количество валидаций')
+    args = parser.parse_args()
+
+    page = make_movies_page(args.movies)
+    small_page = make_movies_page(1)
+    registry = SchemaRegistry()
+
+    for title, instance in (('1 фильм', small_page), (f'{args.movies} фильмов', page)):
+        before = timeit.timeit(lambda: validate_from_file(instance), number=args.repeat)
+        after = timeit.timeit(lambda: registry.validate(instance, 'get_movies'), number=args.repeat)
+        print(f'{title}: jsonschema.validate {before / args.repeat * 1000:.3f} ms/call, '
+              f'SchemaRegistry {after / args.repeat * 1000:.3f} ms/call, '
+              f'x{before / after:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,80 +1,421 @@
 import pytest
-import requests
 import os
+import zlib
+from urllib.parse import urlsplit
 
-from dotenv import load_dotenv
-
+from constants import BASE_URL
+from custom_requester.cassette import (Cassette, get_active_cassette, merge_worker_cassettes,
+                                       remove_worker_cassettes, use_cassette, worker_cassette_path)
+from custom_requester.custom_requester import format_exchange, recent_exchanges
+from custom_requester.http_cache import ResponseCache, http_cache_stats
+from custom_requester.metrics import latency_registry
+from custom_requester.middleware import middleware_stats
+from custom_requester.token_provider import BearerAuth, TokenProvider
+from custom_requester.tracing import tracer
+from custom_requester.transport import build_session, transport_stats
 from tests.api.api_manager import ApiManager
+from tests.api.async_api_manager import AsyncApiManager
 from utils.data_generator import DataGenerator
-load_dotenv()
-username = os.getenv('USERNAME')
-password = os.getenv('PASSWORD')
+from utils.fixture_profiler import FixtureProfiler
+from utils.movie_factory import MovieFactory
+from utils.perf_budget import MODES as PERF_BUDGET_MODES, PerfBudgetPlugin
+from utils.perf_history import RESULTS_DB_PATH, PerfHistoryPlugin
+from utils.stub_server import CinescopeStubServer, FaultConfig
+from utils.user_pool import USER_POOL_PATH, UserPool
+from utils.xdist_sharding import (DurationStore, is_xdist_controller, is_xdist_worker, make_duration_scheduler,
+                                  shared_session_value)
+# Длительности тестов для шардирования xdist (только в основном процессе)
+duration_store = None
+
+def pytest_addoption(parser):
+    parser.addoption('--latency-json', action='store', default=None, metavar='PATH',
+                     help='Сохранить перцентили задержек по эндпойнтам в JSON-файл')
+    parser.addoption('--stub', action='store_true', default=os.getenv('CINESCOPE_STUB') == '1',
+                     help='Гонять тесты против локальной заглушки Cinescope (или CINESCOPE_STUB=1)')
+    parser.addoption('--stub-movies', type=int, default=30,
+                     help='Сколько фильмов создать в заглушке заранее')
+    parser.addoption('--stub-latency', type=float, default=0.0,
+                     help='Задержка ответов заглушки, секунды')
+    parser.addoption('--stub-error-rate', type=float, default=0.0,
+                     help='Доля ответов заглушки с ошибкой 503')
+    parser.addoption('--cassette', choices=('record', 'replay'), default=None,
+                     help='Записать HTTP-обмены в кассету или воспроизвести их без сети')
+    parser.addoption('--cassette-path', default=os.path.join('cassettes', 'cinescope.cassette'),
+                     help='Путь к файлу кассеты')
+    parser.addoption('--trace-file', action='store', default=None, metavar='PATH',
+                     help='Писать спаны тестов и HTTP-запросов в файл (OTLP-JSON, по строке на пачку)')
+    parser.addoption('--fixture-profile', action='store_true', default=False,
+                     help='Время setup/teardown и число HTTP-запросов каждой фикстуры')
+    parser.addoption('--fixture-profile-top', type=int, default=15,
+                     help='Сколько самых дорогих фикстур выводить')
+    parser.addoption('--fixture-profile-folded', action='store', default=None, metavar='PATH',
+                     help='Сохранить folded stacks для flamegraph (включает --fixture-profile)')
+    parser.addoption('--startup-profile', action='store_true', default=False,
+                     help='Показать время импорта по модулям при сборе тестов и выйти')
+    parser.addoption('--http-cache', action='store_true', default=False,
+                     help='Кэшировать ответы GET с перепроверкой по ETag/Last-Modified')
+    parser.addoption('--user-pool', type=int, default=0, metavar='N',
+                     help='Фоново пополнять пул зарегистрированных пользователей до N (см. utils/user_pool.py)')
+    parser.addoption('--perf-budget-mode', choices=(*PERF_BUDGET_MODES, 'off'), default=None,
+                     help='Режим всех маркеров perf_budget вместо указанного в маркере (off - не проверять)')
+    parser.addoption('--results-db', default=RESULTS_DB_PATH, metavar='PATH',
+                     help='Сохранить задержки и длительности прогона в SQLite-историю и сравнить '
+                          'с прошлыми прогонами (или CINESCOPE_RESULTS_DB)')
+    parser.addoption('--results-env', default=None,
+                     help='Окружение прогона в истории (по умолчанию stub, CINESCOPE_ENV или хост BASE_URL)')
+    parser.addoption('--no-duration-sharding', action='store_true', default=False,
+                     help='Не раздавать тесты воркерам xdist по длительностям прошлых прогонов')
+
+def pytest_cmdline_main(config):
+    if config.getoption('--startup-profile'):
+        from utils.startup_profile import format_report, profile_startup
+        args = [arg for arg in config.invocation_params.args if arg != '--startup-profile']
+        print(format_report(*profile_startup(args, cwd=str(config.invocation_params.dir))))
+        return 0
+
+def pytest_configure(config):
+    global duration_store
+    # Длительности собирает и сохраняет только основной процесс (не воркер xdist)
+    if hasattr(config, 'cache') and not hasattr(config, 'workerinput'):
+        duration_store = DurationStore(config.cache)
+    cassette_mode, cassette_path = config.getoption('--cassette'), config.getoption('--cassette-path')
+    if cassette_mode and is_xdist_controller(config):
+        # Тесты идут в воркерах: основной процесс кассету не открывает, а после записи склеивает файлы воркеров
+        if cassette_mode == 'record':
+            remove_worker_cassettes(cassette_path)
+    elif cassette_mode:
+        worker_id = getattr(config, 'workerinput', {}).get('workerid')
+        if cassette_mode == 'record' and worker_id:
+            cassette_path = worker_cassette_path(cassette_path, worker_id)
+        use_cassette(Cassette(cassette_path, cassette_mode))
+    if config.getoption('--fixture-profile') or config.getoption('--fixture-profile-folded'):
+        config.pluginmanager.register(FixtureProfiler(config.getoption('--fixture-profile-top'),
+                                                      config.getoption('--fixture-profile-folded')),
+                                      'fixture_profiler')
+    config.addinivalue_line('markers', 'perf_budget(total=None, calls=None, endpoints=None, mode="warn", '
+                                       'samples=1, setup=False): бюджет времени и числа HTTP-запросов теста')
+    config.pluginmanager.register(PerfBudgetPlugin(config.getoption('--perf-budget-mode')), 'perf_budget')
+    results_db = config.getoption('--results-db')
+    # Задержки воспроизведения из кассеты ничего не говорят о сервисе
+    if results_db and config.getoption('--cassette') != 'replay':
+        environment = config.getoption('--results-env') or (
+            'stub' if config.getoption('--stub') else os.getenv('CINESCOPE_ENV') or urlsplit(BASE_URL).netloc)
+        config.pluginmanager.register(PerfHistoryPlugin(results_db, environment), 'perf_history')
+    trace_file = config.getoption('--trace-file')
+    if trace_file:
+        # Каждый воркер xdist пишет в свой файл
+        worker_id = getattr(config, 'workerinput', {}).get('workerid')
+        tracer.start(f'{trace_file}.{worker_id}' if worker_id else trace_file)
+
+def pytest_unconfigure(config):
+    tracer.stop()
+    cassette = get_active_cassette()
+    if cassette is not None:
+        use_cassette(None)
+        cassette.close()
+    if config.getoption('--cassette') == 'record' and is_xdist_controller(config):
+        merge_worker_cassettes(config.getoption('--cassette-path'))
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    '''
+    Шардирование по длительностям: при -n N --dist load сначала раздаются самые долгие тесты.
+    '''
+    if duration_store is None or config.getoption('dist') != 'load' \
+            or config.getoption('--no-duration-sharding'):
+        return None
+    return make_duration_scheduler(config, log, duration_store)
+
+def pytest_runtest_logreport(report):
+    if duration_store is not None:
+        duration_store.add(report.nodeid, report.duration)
+    if report.failed and tracer.enabled:
+        tracer.mark_failed()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    '''
+    Спан теста (setup, call и teardown) - родитель спанов его HTTP-запросов.
+    '''
+    if not tracer.enabled:
+        yield
+        return
+    tracer.start_test(item.nodeid)
+    yield
+    tracer.end_test()
+
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session):
+    if duration_store is not None:
+        duration_store.save()
+    # Воркер xdist отдаёт счётчики основному процессу (после teardown сессионных фикстур),
+    # отчёты печатает только он
+    workeroutput = getattr(session.config, 'workeroutput', None)
+    if workeroutput is not None:
+        workeroutput['http_stats'] = {
+            'latency': latency_registry.snapshot(),
+            'transport': transport_stats.snapshot(),
+            'middleware': middleware_stats.snapshot(),
+            'http_cache': http_cache_stats.snapshot(),
+        }
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    '''
+    Очистка буфера последних HTTP-обменов перед каждым тестом.
+    С кассетой - начало записи/воспроизведения теста и фиксация генераторов данных,
+    чтобы тела запросов совпадали между записью и воспроизведением.
+    '''
+    recent_exchanges.clear()
+    cassette = get_active_cassette()
+    if cassette is not None:
+        cassette.begin_test(item.nodeid)
+        DataGenerator.seed(zlib.crc32(item.nodeid.encode()))
+
+def pytest_runtest_logfinish(nodeid, location):
+    cassette = get_active_cassette()
+    if cassette is not None:
+        cassette.end_test()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    '''
+    При падении теста выводим последние HTTP-обмены отдельной секцией отчёта.
+    '''
+    outcome = yield
+    report = outcome.get_result()
+    if report.failed and recent_exchanges:
+        dump = '\n'.join(format_exchange(response, color=False) for response in recent_exchanges)
+        report.sections.append(('Recent HTTP exchanges', dump))
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    stats = getattr(node, 'workeroutput', {}).get('http_stats')
+    if not stats:
+        return
+    latency_registry.merge_snapshot(stats['latency'])
+    transport_stats.merge_snapshot(stats['transport'])
+    middleware_stats.merge_snapshot(stats['middleware'])
+    http_cache_stats.merge_snapshot(stats['http_cache'])
+
+def pytest_terminal_summary(terminalreporter, config):
+    '''
+    Отчёты в конце сессии: задержки по эндпойнтам, переиспользование соединений, повторы.
+    Под xdist - только в основном процессе, по счётчикам всех воркеров.
+    '''
+    if getattr(config, 'workeroutput', None) is not None:
+        return
+    if latency_registry.histograms:
+        terminalreporter.write_sep('=', 'API latency, ms')
+        terminalreporter.write_line(latency_registry.report())
+        latency_json = config.getoption('--latency-json')
+        if latency_json:
+            latency_registry.dump_json(latency_json)
+            terminalreporter.write_line(f'latency report saved to {latency_json}')
+    if transport_stats.hosts:
+        terminalreporter.write_sep('=', 'HTTP connections')
+        terminalreporter.write_line(transport_stats.report())
+    if middleware_stats.hosts:
+        terminalreporter.write_sep('=', 'Retries and throttling')
+        terminalreporter.write_line(middleware_stats.report())
+    if http_cache_stats.used:
+        terminalreporter.write_sep('=', 'HTTP cache')
+        terminalreporter.write_line(http_cache_stats.report())
+
+@pytest.fixture(scope='session')
+def shared_dir(tmp_path_factory, stub_server):
+    '''
+    Общий для воркеров xdist каталог: через него воркеры делят пользователя и его данные.
+    Без xdist или с заглушкой (у каждого воркера своя) - None.
+    '''
+    if not is_xdist_worker() or stub_server is not None:
+        return None
+    return str(tmp_path_factory.getbasetemp().parent)
 
 @pytest.fixture(scope='session')
-def test_user():
+def test_user(shared_dir):
     '''
-    Генерация случайного пользователя для тестов
+    Генерация случайного пользователя для тестов (один на весь прогон, в том числе под xdist)
     '''
-    random_email = DataGenerator.generate_random_email()
-    random_name = DataGenerator.generate_random_name()
-    random_password = DataGenerator.generate_random_password()
+    def generate():
+        random_email = DataGenerator.generate_random_email()
+        random_name = DataGenerator.generate_random_name()
+        random_password = DataGenerator.generate_random_password()
+
+        return {
+            "email": random_email,
+            "fullName": random_name,
+            'password': random_password,
+            'passwordRepeat': random_password
+        }
 
-    return {
-        "email": random_email,
-        "fullName": random_name,
-        'password': random_password,
-        'passwordRepeat': random_password
-    }
+    return shared_session_value(shared_dir, 'test_user', generate)
 
 @pytest.fixture(scope='session')
-def registered_user(api_manager, test_user):
+def registered_user(api_manager, test_user, shared_dir):
     '''
-    Фикстуры для регистрации и получения данных зарегистрированного пользователя
+    Фикстуры для регистрации и получения данных зарегистрированного пользователя.
+    Под xdist регистрирует первый воркер, остальные получают его данные.
     '''
-    response = api_manager.auth_api.register_user(test_user)
+    def register():
+        response = api_manager.auth_api.register_user(test_user)
+
+        response_data = response.json()
+        test_user_with_id = test_user.copy()
+        test_user_with_id['id'] = response_data['id']
+        return response_data, test_user_with_id
 
-    response_data = response.json()
-    test_user_with_id = test_user.copy()
-    test_user_with_id['id'] = response_data['id']
+    response_data, test_user_with_id = shared_session_value(shared_dir, 'registered_user', register)
     return response_data, test_user_with_id
 
+@pytest.fixture(scope='session')
+def user_pool(api_manager, stub_server, tmp_path_factory, pytestconfig):
+    '''
+    Пул заранее зарегистрированных пользователей. С реальным сервисом пул живёт между прогонами
+    (CINESCOPE_USER_POOL), у заглушки свой пул на прогон.
+    '''
+    path = USER_POOL_PATH if stub_server is None else str(tmp_path_factory.getbasetemp() / 'users.sqlite')
+    pool = UserPool(path, api_manager.auth_api.base_url)
+    target = pytestconfig.getoption('--user-pool')
+    if target:
+        pool.start_filling(api_manager.auth_api, target)
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def pooled_user(user_pool, api_manager):
+    '''
+    Пользователь из пула на время теста. Если пул пуст, пользователь регистрируется и после теста
+    остаётся в пуле для следующих прогонов.
+    '''
+    user = user_pool.lease(api_manager.auth_api)
+    yield user
+    user_pool.release(user)
+
 
 @pytest.fixture(scope='session')
 def session():
     '''
-    Фикстура для создания HTTP-сессии.
+    Фикстура для создания HTTP-сессии с настроенным пулом соединений и таймаутами (см. TransportConfig).
+    Транспорт не повторяет запросы: повторы - в RetryMiddleware (custom_requester/middleware.py).
     '''
-    http_session = requests.Session()
+    http_session = build_session()
     yield http_session
     http_session.close()
 
 @pytest.fixture(scope='session')
-def api_manager(session):
+def stub_server(request):
+    '''
+    Локальная заглушка Cinescope, если тесты запущены с --stub, иначе None.
+    '''
+    config = request.config
+    if not config.getoption('--stub'):
+        yield None
+        return
+    faults = FaultConfig(latency=config.getoption('--stub-latency'),
+                         error_rate=config.getoption('--stub-error-rate'))
+    server = CinescopeStubServer(faults=faults).start()
+    server.seed_movies(config.getoption('--stub-movies'))
+    yield server
+    server.stop()
+
+@pytest.fixture(scope='session')
+def admin_creds(stub_server):
+    '''
+    Логин и пароль админа: из .env или предсозданный админ заглушки.
+    '''
+    if stub_server is None:
+        # .env читается только когда нужен реальный стенд
+        from dotenv import load_dotenv
+        load_dotenv()
+        return os.getenv('USERNAME'), os.getenv('PASSWORD')
+    return stub_server.admin_email, stub_server.admin_password
+
+@pytest.fixture(scope='session')
+def api_manager(session, stub_server, pytestconfig):
     '''
     Фикстура для создания экземпляра ApiManager.
     '''
-    return ApiManager(session)
+    cache = ResponseCache() if pytestconfig.getoption('--http-cache') else None
+    if stub_server is None and get_active_cassette() is None:
+        return ApiManager(session, cache=cache)
+    # Токены заглушки и кассеты живут только в этом прогоне - файловый кэш не нужен
+    auth = BearerAuth(TokenProvider(cache_path=None))
+    if stub_server is None:
+        return ApiManager(session, auth=auth, cache=cache)
+    return ApiManager(session, auth=auth, base_url=stub_server.base_url, movies_url=stub_server.base_url,
+                      cache=cache)
 
 @pytest.fixture(scope="session")
-def admin_auth(api_manager):
+def admin_auth(api_manager, admin_creds):
     """
     Автоматическая авторизация админом перед всеми тестами.
     """
-    api_manager.auth_api.authenticate((username, password))
+    api_manager.auth_api.authenticate(admin_creds)
+
+@pytest.fixture(scope='session')
+def anyio_backend():
+    '''
+    Бэкенд для асинхронных тестов и фикстур (плагин anyio).
+    '''
+    return 'asyncio'
+
+@pytest.fixture(scope='session')
+async def async_session(anyio_backend):
+    '''
+    Фикстура для создания асинхронной HTTP-сессии.
+    '''
+    import httpx
+
+    async with httpx.AsyncClient(timeout=30) as http_session:
+        yield http_session
+
+@pytest.fixture(scope='session')
+def async_api_manager(async_session, stub_server):
+    '''
+    Фикстура для создания экземпляра AsyncApiManager.
+    '''
+    if stub_server is None:
+        return AsyncApiManager(async_session)
+    return AsyncApiManager(async_session, auth=BearerAuth(TokenProvider(cache_path=None)),
+                           base_url=stub_server.base_url, movies_url=stub_server.base_url)
+
+@pytest.fixture(scope='session')
+async def async_admin_auth(async_api_manager, admin_creds):
+    """
+    Авторизация админом для асинхронных тестов.
+    """
+    await async_api_manager.auth_api.authenticate(admin_creds)
 
 @pytest.fixture(scope='session')
 def test_movie():
     return DataGenerator.generate_movie_data()
 
+def _cleanup_movies(factory):
+    errors = factory.cleanup()
+    if errors:
+        pytest.fail('Не удалось удалить созданные фильмы:\n' + '\n'.join(errors), pytrace=False)
+
+@pytest.fixture
+def movie_factory(api_manager, admin_auth):
+    '''
+    Фабрика фильмов на время теста: movie_factory.create(n) создаёт n фильмов параллельно,
+    после теста все созданные фильмы удаляются параллельно. Ошибки удаления не скрываются.
+    '''
+    factory = MovieFactory(api_manager.movies_api)
+    yield factory
+    _cleanup_movies(factory)
+
+@pytest.fixture(scope='session')
+def session_movie_factory(api_manager, admin_auth):
+    '''
+    Фабрика фильмов на всю сессию - для общего набора данных в тестах списков и фильтров.
+    '''
+    factory = MovieFactory(api_manager.movies_api)
+    yield factory
+    _cleanup_movies(factory)
+
 @pytest.fixture
-def created_movie(api_manager, test_movie):
-    response = api_manager.movies_api.create_movie(test_movie,
-                                                   expected_status=201)
-    response_body = response.json()
-    yield response_body, test_movie
-
-    # teardown
-    try:
-        api_manager.movies_api.delete_movie(response_body['id'], expected_status=200)
-    except Exception:
-        pass
+def created_movie(movie_factory, test_movie):
+    response_body, payload = movie_factory.create_from([test_movie])[0]
+    return response_body, payload
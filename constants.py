@@ -7,4 +7,5 @@ LOGIN_ENDPOINT = "/login"
 REGISTER_ENDPOINT = "/register"
 
 MOVIES_URL = "https://api.dev-cinescope.coconutqa.ru"
-MOVIES_ENDPOINT = "/movies"
\ No newline at end of file
+MOVIES_ENDPOINT = "/movies"
+MOVIES_PAGE_SIZE = 20
@@ -0,0 +1,107 @@
+import time
+
+from custom_requester.cassette import get_active_cassette
+from custom_requester.custom_requester import CustomRequester, recent_exchanges
+from custom_requester.json_backend import loads as json_loads
+from custom_requester.metrics import latency_registry, record_call
+from custom_requester.middleware import RequestInfo
+from custom_requester.tracing import tracer
+from utils.schema_registry import schema_registry
+
+
+class AsyncCustomRequester(CustomRequester):
+    """
+    Асинхронный двойник CustomRequester для работы поверх httpx.AsyncClient.
+    Поверхность методов и семантика expected_status те же, что у синхронного реквестера.
+    Авторизация (BearerAuth) подставляется в заголовки каждого запроса, клиент httpx не меняется.
+    """
+
+    async def send_request(self, method, endpoint, data=None, expected_status=200, need_logging=True,
+                           schema=None, params=None, model=None):
+        '''
+        Асинхронная отправка запроса.
+        :param method: HTTP метод (GET, POST, PUT, PATCH, DELETE).
+        :param endpoint: Эндпойнт (например, /login).
+        :param data: Тело запроса (JSON-данные).
+        :param expected_status: Ожидаемый статус-код (по-умолчанию 200).
+        :param need_logging: Флаг для логирования (по-умолчанию True).
+        :param schema: Имя JSON-схемы из schemas/ для валидации тела ответа (например, get_movies).
+        :param params: Query-параметры запроса (например, {'page': 2}).
+        :param model: Класс модели с from_dict (например, Movie) - вернуть модель вместо ответа.
+        :return: Объект ответа httpx.Response (или модель, если передан model).
+        '''
+
+        url = f"{self.base_url}{endpoint}"
+        start_ns = time.time_ns() if tracer.enabled else 0
+        response, retries, error = None, 0, None
+        try:
+            # Свежий ответ из кэша отдаётся без запроса
+            cache_ticket, response, headers = self._cache_lookup(method, url, params)
+            if response is None:
+                if self.middleware is None:
+                    response = await self._attempt(method, url, endpoint, data, params, headers)
+                else:
+                    request = RequestInfo(method, url)
+                    try:
+                        response = await self.middleware.execute_async(
+                            request, lambda: self._attempt(method, url, endpoint, data, params, headers))
+                    finally:
+                        retries = request.attempt
+                if self.cache is not None:
+                    response = self._cache_update(method, url, cache_ticket, response)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Спан пишется и для запросов, прерванных исключением
+            if start_ns:
+                tracer.record_http(start_ns, method, url, endpoint, response, retries, error)
+        if need_logging:
+            self.log_request_and_response(response)
+        self.check_status(response, expected_status)
+        if schema is not None or model is not None:
+            # Тело разбирается один раз и для схемы, и для модели
+            body = json_loads(response.content)
+            if schema is not None:
+                schema_registry.validate(body, schema)
+            if model is not None:
+                return model.from_dict(body)
+        return response
+
+    async def _attempt(self, method, url, endpoint, data, params, headers=None):
+        '''
+        Одна попытка запроса с учётом задержки и сохранением в буфер последних обменов.
+        Если сервер отверг токен (401), токен сбрасывается и запрос один раз повторяется с новым.
+        '''
+        for _ in range(2):
+            start = time.perf_counter()
+            response = await self._perform(method, url, endpoint, data, params, headers)
+            elapsed = time.perf_counter() - start
+            latency_registry.record(method, endpoint, elapsed)
+            record_call(method, endpoint, elapsed)
+            recent_exchanges.append(response)
+            if not self._invalidate_rejected_token(response):
+                break
+        return response
+
+    async def _perform(self, method, url, endpoint, data, params, headers=None):
+        '''
+        Отправка запроса в сеть или ответ из кассеты (record/replay).
+        '''
+        cassette = get_active_cassette()
+        if cassette is not None and cassette.replaying:
+            entry = cassette.replay(method, endpoint, params, data)
+            # httpx импортируется только в асинхронном режиме - синхронным прогонам он не нужен
+            import httpx
+
+            request = httpx.Request(method, url, json=data, params=params, headers=self.headers)
+            return httpx.Response(entry['s'], headers=entry['hd'], content=entry['b'].encode('utf-8'),
+                                  request=request)
+
+        headers = headers or self.headers
+        if self.auth is not None:
+            headers = {**headers, **(await self.auth.auth_headers_async())}
+        response = await self.session.request(method, url, json=data, params=params, headers=headers)
+        if cassette is not None:
+            cassette.record(method, endpoint, params, data, response.status_code, response.headers, response.content)
+        return response
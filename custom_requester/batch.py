@@ -0,0 +1,82 @@
+'''
+Пакетное выполнение запросов: ограниченный параллелизм, результаты в порядке входа.
+'''
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from custom_requester.custom_requester import UnexpectedStatusError
+from custom_requester.metrics import bind_calls
+
+DEFAULT_BATCH_WORKERS = 8
+
+
+class BatchResult:
+    '''
+    Результат одного элемента пакета: либо value, либо error.
+    '''
+    __slots__ = ('item', 'value', 'error')
+
+    def __init__(self, item, value=None, error=None):
+        self.item = item
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f'BatchResult(item={self.item!r}, ok)'
+        return f'BatchResult(item={self.item!r}, error={self.error!r})'
+
+
+def _is_missing(error):
+    return isinstance(error, UnexpectedStatusError) and error.response.status_code == 404
+
+
+def run_batch(func, items, max_workers=DEFAULT_BATCH_WORKERS, missing_ok=False):
+    '''
+    Параллельный вызов func для каждого элемента.
+    Исключения не пробрасываются, а попадают в BatchResult.error.
+    :param func: Функция от одного элемента (обычно метод API-клиента).
+    :param items: Элементы пакета.
+    :param max_workers: Максимум одновременных запросов.
+    :param missing_ok: Считать 404 успехом (value=None) - удобно для очистки.
+    :return: Список BatchResult в порядке items.
+    '''
+    items = list(items)
+
+    def call(item):
+        try:
+            return BatchResult(item, func(item))
+        except Exception as e:
+            if missing_ok and _is_missing(e):
+                return BatchResult(item)
+            return BatchResult(item, error=e)
+
+    if not items:
+        return []
+    if max_workers <= 1 or len(items) == 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        # Запросы потоков пула засчитываются тесту (фикстуре), запустившему пакет
+        return list(executor.map(bind_calls(call), items))
+
+
+async def run_batch_async(func, items, max_workers=DEFAULT_BATCH_WORKERS, missing_ok=False):
+    '''
+    Асинхронная версия run_batch: func возвращает корутину, параллелизм ограничен семафором.
+    '''
+    semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+    async def call(item):
+        async with semaphore:
+            try:
+                return BatchResult(item, await func(item))
+            except Exception as e:
+                if missing_ok and _is_missing(e):
+                    return BatchResult(item)
+                return BatchResult(item, error=e)
+
+    return list(await asyncio.gather(*(call(item) for item in items)))
@@ -0,0 +1,211 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import deque
+from urllib.parse import urlencode
+
+from custom_requester.metrics import endpoint_template
+
+# Заголовки ответа, которые сохраняются в кассете
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+_active_cassette = None
+
+
+def get_active_cassette():
+    return _active_cassette
+
+
+def use_cassette(cassette):
+    '''
+    Включение кассеты для всех реквестеров процесса (None - выключить).
+    '''
+    global _active_cassette
+    _active_cassette = cassette
+
+
+def worker_cassette_path(path, worker_id):
+    '''
+    Файл записи воркера xdist: воркеры пишут каждый в свой файл, основной процесс их склеивает.
+    '''
+    return f'{path}.{worker_id}'
+
+
+def merge_worker_cassettes(path):
+    '''
+    Склейка файлов воркеров (path.gw0, path.gw1, ...) в одну кассету; файлы воркеров удаляются.
+    Строки независимы (по строке на тест), поэтому достаточно дописать их подряд.
+    :return: Число склеенных файлов.
+    '''
+    parts = sorted(glob.glob(glob.escape(path) + '.gw*'))
+    if not parts:
+        return 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as merged:
+        for part in parts:
+            with open(part, encoding='utf-8') as file:
+                for line in file:
+                    merged.write(line)
+    for part in parts:
+        os.remove(part)
+    return len(parts)
+
+
+def remove_worker_cassettes(path):
+    '''
+    Удаление файлов воркеров, оставшихся от прошлого прогона (например, с большим -n).
+    '''
+    for part in glob.glob(glob.escape(path) + '.gw*'):
+        os.remove(part)
+
+
+class CassetteMissError(LookupError):
+    '''
+    В кассете нет записи для запроса, а режим replay не ходит в сеть.
+    '''
+
+
+class Cassette:
+    '''
+    Запись и воспроизведение HTTP-обменов на уровне send_request.
+
+    Формат файла: одна строка на тест - "<nodeid>\\t<json-список обменов>".
+    Запросы нормализуются: query сортируется, тело хэшируется в каноническом виде,
+    заголовок Authorization не сохраняется. Кроме точного пути хранится шаблон
+    с {id} вместо идентификаторов - по нему находятся ответы, если id изменились.
+    При воспроизведении файл отображается в память (mmap), индекс строится по смещениям строк,
+    а JSON разбирается только для запущенных тестов.
+    '''
+
+    def __init__(self, path, mode):
+        '''
+        :param path: Путь к файлу кассеты.
+        :param mode: 'record' - писать обмены из сети, 'replay' - отвечать из кассеты без сети.
+        '''
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown cassette mode: {mode}')
+        self.path = path
+        self.mode = mode
+        self.current_test = None
+        self._lock = threading.Lock()
+        self._recorded = []
+        self._index = {}
+        self._used = set()
+        self._global = None
+        if mode == 'record':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'w', encoding='utf-8')
+        else:
+            self._file = open(path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets = self._build_offsets()
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @staticmethod
+    def request_key(method, endpoint, params=None, data=None):
+        '''
+        Ключ запроса: (метод, путь, шаблон пути, хэш тела); к пути и шаблону добавляется
+        отсортированный query.
+        '''
+        query = f'?{urlencode(sorted(params.items()), doseq=True)}' if params else ''
+        body = '' if data is None else json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return (method, f'{endpoint}{query}', f'{endpoint_template(endpoint)}{query}',
+                hashlib.blake2b(body.encode(), digest_size=8).hexdigest())
+
+    @staticmethod
+    def _lookups(method, path, template, body_hash):
+        # От самого точного совпадения к самому общему
+        return (method, path, body_hash), (method, template, body_hash), (method, template)
+
+    def _build_offsets(self):
+        offsets = {}
+        position, size = 0, len(self._mmap)
+        while position < size:
+            end = self._mmap.find(b'\n', position)
+            end = size if end == -1 else end
+            tab = self._mmap.find(b'\t', position, end)
+            if tab != -1:
+                offsets[self._mmap[position:tab].decode()] = (tab + 1, end)
+            position = end + 1
+        return offsets
+
+    def _load(self, nodeid):
+        start, end = self._offsets[nodeid]
+        return json.loads(self._mmap[start:end])
+
+    def begin_test(self, nodeid):
+        with self._lock:
+            self.current_test = nodeid
+            self._recorded = []
+            self._index, self._used = {}, set()
+            if self.replaying and nodeid in self._offsets:
+                for entry in self._load(nodeid):
+                    for lookup in self._lookups(entry['m'], entry['p'], entry['u'], entry['h']):
+                        self._index.setdefault(lookup, deque()).append(entry)
+
+    def end_test(self):
+        with self._lock:
+            if not self.replaying and self.current_test is not None and self._recorded:
+                self._file.write(f'{self.current_test}\t')
+                self._file.write(json.dumps(self._recorded, ensure_ascii=False, separators=(',', ':')))
+                self._file.write('\n')
+                self._file.flush()
+            self.current_test = None
+            self._recorded = []
+
+    def record(self, method, endpoint, params, data, status, headers, body):
+        '''
+        Сохранение обмена текущего теста.
+        :param body: Тело ответа (bytes).
+        '''
+        method, path, template, body_hash = self.request_key(method, endpoint, params, data)
+        entry = {
+            'm': method, 'p': path, 'u': template, 'h': body_hash, 's': status,
+            'hd': {name: headers[name] for name in RECORDED_HEADERS if name in headers},
+            'b': body.decode('utf-8', errors='replace'),
+        }
+        with self._lock:
+            self._recorded.append(entry)
+
+    def replay(self, method, endpoint, params=None, data=None):
+        '''
+        Поиск записанного ответа в текущем тесте: по точному пути, по шаблону пути,
+        по шаблону без учёта тела; затем так же по всем тестам кассеты.
+        :return: Словарь с ключами s (статус), hd (заголовки), b (тело).
+        '''
+        lookups = self._lookups(*self.request_key(method, endpoint, params, data))
+        with self._lock:
+            for lookup in lookups:
+                entries = self._index.get(lookup)
+                while entries:
+                    # Запись лежит сразу в нескольких индексах - использованные пропускаем
+                    entry = entries.popleft()
+                    if id(entry) not in self._used:
+                        self._used.add(id(entry))
+                        return entry
+            global_index = self._global_index()
+            entry = next((global_index[lookup] for lookup in lookups if lookup in global_index), None)
+        if entry is None:
+            raise CassetteMissError(f'No recorded response for {method} {lookups[0][1]} in {self.path} '
+                                    f'(test {self.current_test})')
+        return entry
+
+    def _global_index(self):
+        if self._global is None:
+            self._global = {}
+            for nodeid in self._offsets:
+                for entry in self._load(nodeid):
+                    for lookup in self._lookups(entry['m'], entry['p'], entry['u'], entry['h']):
+                        self._global.setdefault(lookup, entry)
+        return self._global
+
+    def close(self):
+        if self.replaying:
+            self._mmap.close()
+        self._file.close()
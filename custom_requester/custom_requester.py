@@ -2,8 +2,111 @@
 import json
 import logging
 import os
+import time
+from collections import deque
+
+import requests
+from requests.structures import CaseInsensitiveDict
 
 from constants import HEADERS
+from custom_requester.cassette import get_active_cassette
+from custom_requester.json_backend import loads as json_loads
+from custom_requester.metrics import latency_registry, record_call
+from custom_requester.middleware import RequestInfo
+from custom_requester.tracing import tracer
+from utils.schema_registry import schema_registry
+
+# Максимальная длина тела запроса/ответа в логах (в символах)
+MAX_LOG_BODY = 4000
+# Сколько последних обменов запрос/ответ хранить для дампа при падении теста
+EXCHANGE_HISTORY_SIZE = 20
+
+# Кольцевой буфер последних ответов текущего теста (очищается хуком в conftest.py).
+# Храним только ссылки на ответы - форматирование происходит при дампе.
+recent_exchanges = deque(maxlen=EXCHANGE_HISTORY_SIZE)
+
+GREEN = '\033[32m'
+RED = '\033[31m'
+RESET = '\033[0m'
+
+
+def _truncate(text, limit=MAX_LOG_BODY):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [truncated {len(text) - limit} chars]"
+
+
+def format_exchange(response, color=True):
+    '''
+    Форматирование пары запрос/ответ в виде curl-команды и тела ответа.
+    :param response: Объект ответа (requests.Response или httpx.Response).
+    :param color: Раскрашивать ли вывод ANSI-цветами.
+    :return: Готовая к выводу строка.
+    '''
+    green, red, reset = (GREEN, RED, RESET) if color else ('', '', '')
+    request = response.request
+    headers = " \\\n".join([f"-H '{header}: {value}'" for header, value in request.headers.items()])
+    full_test_name = f"pytest {os.environ.get('PYTEST_CURRENT_TEST', '').replace(' (call)', '')}"
+
+    body = ""
+    # у requests тело лежит в request.body, у httpx - в request.content
+    raw_body = getattr(request, 'body', None)
+    if raw_body is None:
+        raw_body = getattr(request, 'content', None) or None
+    if raw_body is not None:
+        body = raw_body.decode('utf-8') if isinstance(raw_body, bytes) else str(raw_body)
+        body = f"-d '{_truncate(body)}' \n" if body != '{}' else ''
+
+    response_data = response.text
+    # Большие тела не переформатируем - только обрезаем
+    if len(response_data) <= MAX_LOG_BODY:
+        try:
+            response_data = json.dumps(json.loads(response_data), indent=4, ensure_ascii=False)
+        except json.JSONDecodeError:
+            pass
+    else:
+        response_data = _truncate(response_data)
+
+    status_color = red if response.status_code >= 400 else green
+    return (
+        f"\n{'=' * 40} REQUEST {'=' * 40}\n"
+        f"{green}{full_test_name}{reset}\n"
+        f"curl -X {request.method} '{request.url}' \\\n"
+        f"{headers} \\\n"
+        f"{body}"
+        f"\n{'=' * 40} RESPONSE {'=' * 40}\n"
+        f"\tSTATUS_CODE: {status_color}{response.status_code}{reset}\n"
+        f"\tDATA:\n{response_data}\n"
+        f"{'=' * 80}\n"
+    )
+
+
+class UnexpectedStatusError(ValueError):
+    '''
+    Сервер вернул статус-код, отличный от ожидаемого. Ответ доступен в атрибуте response.
+    '''
+
+    def __init__(self, response, expected_status):
+        super().__init__(f"Unexpected status code: {response.status_code}. Expected: {expected_status}")
+        self.response = response
+        self.expected_status = expected_status
+
+
+class LazyExchange:
+    '''
+    Обёртка для ленивого форматирования: строка собирается только тогда,
+    когда logging действительно выводит запись.
+    '''
+    __slots__ = ('response',)
+
+    def __init__(self, response):
+        self.response = response
+
+    def __str__(self):
+        try:
+            return format_exchange(self.response)
+        except Exception as e:
+            return f"\nLogging failed: {type(e)} - {e}"
 
 
 class CustomRequester:
@@ -12,14 +115,20 @@ class CustomRequester:
     """
     base_headers = HEADERS
 
-    def __init__(self, session, base_url):
+    def __init__(self, session, base_url, auth=None, middleware=None, cache=None):
         self.session = session
         self.base_url = base_url
+        # Авторизация на уровне запроса (например, BearerAuth) - сессия не меняется
+        self.auth = auth
+        # Цепочка повторов/ограничений (MiddlewareChain), None - запрос отправляется как есть
+        self.middleware = middleware
+        # Кэш ответов GET (ResponseCache), None - без кэширования
+        self.cache = cache
         self.headers = self.base_headers.copy()
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.INFO)
 
-    def send_request(self, method, endpoint, data=None, expected_status=200, need_logging=True):
+    def send_request(self, method, endpoint, data=None, expected_status=200, need_logging=True,
+                     schema=None, params=None, model=None):
         '''
         Универсальный метод для отправки запросов.
         :param method: HTTP метод (GET, POST, PUT, PATCH, DELETE).
@@ -27,17 +136,135 @@ class CustomRequester:
         :param data: Тело запроса (JSON-данные).
         :param expected_status: Ожидаемый статус-код (по-умолчанию 200).
         :param need_logging: Флаг для логирования (по-умолчанию True).
-        :return: Объект ответа requests.Response.
+        :param schema: Имя JSON-схемы из schemas/ для валидации тела ответа (например, get_movies).
+        :param params: Query-параметры запроса (например, {'page': 2}).
+        :param model: Класс модели с from_dict (например, Movie) - вернуть модель вместо ответа.
+        :return: Объект ответа requests.Response (или модель, если передан model).
         '''
 
         url = f"{self.base_url}{endpoint}"
-        response = self.session.request(method, url, json=data, headers=self.headers)
+        start_ns = time.time_ns() if tracer.enabled else 0
+        response, retries, error = None, 0, None
+        try:
+            # Свежий ответ из кэша отдаётся без запроса
+            cache_ticket, response, headers = self._cache_lookup(method, url, params)
+            if response is None:
+                if self.middleware is None:
+                    response = self._attempt(method, url, endpoint, data, params, headers)
+                else:
+                    request = RequestInfo(method, url)
+                    try:
+                        response = self.middleware.execute(
+                            request, lambda: self._attempt(method, url, endpoint, data, params, headers))
+                    finally:
+                        retries = request.attempt
+                if self.cache is not None:
+                    response = self._cache_update(method, url, cache_ticket, response)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Спан пишется и для запросов, прерванных исключением
+            if start_ns:
+                tracer.record_http(start_ns, method, url, endpoint, response, retries, error)
         if need_logging:
             self.log_request_and_response(response)
-        if response.status_code != expected_status:
-            raise ValueError(f"Unexpected status code: {response.status_code}. Expected: {expected_status}")
+        self.check_status(response, expected_status)
+        if schema is not None or model is not None:
+            # Тело разбирается один раз и для схемы, и для модели
+            body = json_loads(response.content)
+            if schema is not None:
+                schema_registry.validate(body, schema)
+            if model is not None:
+                return model.from_dict(body)
         return response
 
+    def _attempt(self, method, url, endpoint, data, params, headers=None):
+        '''
+        Одна попытка запроса с учётом задержки и сохранением в буфер последних обменов.
+        Если сервер отверг токен (401), токен сбрасывается и запрос один раз повторяется с новым.
+        '''
+        for _ in range(2):
+            start = time.perf_counter()
+            response = self._perform(method, url, endpoint, data, params, headers)
+            elapsed = time.perf_counter() - start
+            latency_registry.record(method, endpoint, elapsed)
+            record_call(method, endpoint, elapsed)
+            recent_exchanges.append(response)
+            if not self._invalidate_rejected_token(response):
+                break
+        return response
+
+    def _invalidate_rejected_token(self, response):
+        '''
+        Сброс токена, с которым пришёл ответ 401.
+        :return: True, если токен сброшен и запрос стоит повторить.
+        '''
+        if response.status_code != 401 or getattr(self.auth, 'key', None) is None:
+            return False
+        authorization = response.request.headers.get('Authorization') if response.request is not None else None
+        if not authorization:
+            return False
+        self.auth.invalidate(authorization)
+        return True
+
+    def _perform(self, method, url, endpoint, data, params, headers=None):
+        '''
+        Отправка запроса в сеть или ответ из кассеты (record/replay).
+        '''
+        cassette = get_active_cassette()
+        if cassette is not None and cassette.replaying:
+            entry = cassette.replay(method, endpoint, params, data)
+            request = requests.Request(method, url, json=data, params=params, headers=self.headers).prepare()
+            response = requests.Response()
+            response.status_code = entry['s']
+            response.headers = CaseInsensitiveDict(entry['hd'])
+            response._content = entry['b'].encode('utf-8')
+            response.encoding = 'utf-8'
+            response.url = request.url
+            response.request = request
+            return response
+
+        response = self.session.request(method, url, json=data, params=params,
+                                        headers=headers or self.headers, auth=self.auth)
+        if cassette is not None:
+            cassette.record(method, endpoint, params, data, response.status_code, response.headers, response.content)
+        return response
+
+    def _cache_lookup(self, method, url, params):
+        '''
+        Поиск ответа GET в кэше.
+        :return: Тройка (билет кэша, свежий ответ или None, заголовки запроса с валидаторами).
+        '''
+        if self.cache is None or method != 'GET':
+            return None, None, None
+        # Личность авторизации: ответы разных пользователей не должны смешиваться
+        identity = (getattr(self.auth, 'key', None),
+                    self.headers.get('Authorization') or self.session.headers.get('Authorization'))
+        response, validators, ticket = self.cache.lookup(self.cache.key(method, url, params, identity))
+        return ticket, response, {**self.headers, **validators} if validators else None
+
+    def _cache_update(self, method, url, cache_ticket, response):
+        '''
+        Сохранение ответа GET в кэше (при 304 - подстановка закэшированного) или сброс кэша после записи.
+        '''
+        if cache_ticket is not None:
+            return self.cache.store(cache_ticket, response)
+        if method != 'GET':
+            self.cache.invalidate(url)
+        return response
+
+    def check_status(self, response, expected_status):
+        '''
+        Проверка статус-кода ответа. При несовпадении обмен целиком пишется в DEBUG:
+        в отчёт упавшего теста он попадает из буфера последних обменов (recent_exchanges).
+        :param response: Объект ответа (requests.Response или httpx.Response).
+        :param expected_status: Ожидаемый статус-код.
+        '''
+        if response.status_code != expected_status:
+            self.logger.debug("%s", LazyExchange(response))
+            raise UnexpectedStatusError(response, expected_status)
+
     def update_session_headers(self, session, **kwargs):
         '''
         Обновление заголовков сессии.
@@ -48,45 +275,10 @@ class CustomRequester:
         session.headers.update(self.headers) # Обновляем заголовки в текущей сессии
 
     def log_request_and_response(self, response):
-        try:
-            request = response.request
-            GREEN = '\033[32m'
-            RED = '\033[31m'
-            RESET = '\033[0m'
-            headers = " \\\n".join([f"-H '{header}: {value}'" for header, value in request.headers.items()])
-            full_test_name = f"pytest {os.environ.get('PYTEST_CURRENT_TEST', '').replace(' (call)', '')}"
-
-            body = ""
-            if hasattr(request, 'body') and request.body is not None:
-                if isinstance(request.body, bytes):
-                    body = request.body.decode('utf-8')
-                body = f"-d '{body}' \n" if body != '{}' else ''
-
-            self.logger.info(f"\n{'=' * 40} REQUEST {'=' * 40}")
-            self.logger.info(
-                f"{GREEN}{full_test_name}{RESET}\n"
-                f"curl -X {request.method} '{request.url}' \\\n"
-                f"{headers} \\\n"
-                f"{body}"
-            )
-
-            response_data = response.text
-            try:
-                response_data = json.dumps(json.loads(response.text), indent=4, ensure_ascii=False)
-            except json.JSONDecodeError:
-                pass
-
-            self.logger.info(f"\n{'=' * 40} RESPONSE {'=' * 40}")
-            if not response.ok:
-                self.logger.info(
-                    f"\tSTATUS_CODE: {RED}{response.status_code}{RESET}\n"
-                    f"\tDATA: {RED}{response_data}{RESET}"
-                )
-            else:
-                self.logger.info(
-                    f"\tSTATUS_CODE: {GREEN}{response.status_code}{RESET}\n"
-                    f"\tDATA:\n{response_data}"
-                )
-            self.logger.info(f"{'=' * 80}\n")
-        except Exception as e:
-            self.logger.error(f"\nLogging failed: {type(e)} - {e}")
+        '''
+        Логирование запроса и ответа на уровне DEBUG.
+        Форматирование выполняется лениво - только если запись будет выведена
+        (например, при запуске с --log-cli-level=DEBUG).
+        '''
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s", LazyExchange(response))
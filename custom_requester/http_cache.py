@@ -0,0 +1,171 @@
+'''
+Кэш ответов GET с условной перепроверкой (ETag / Last-Modified).
+Свежая запись (моложе ttl) отдаётся без запроса; устаревшая перепроверяется запросом
+с If-None-Match / If-Modified-Since, и при 304 тело берётся из кэша.
+Запись через тот же клиент (POST/PUT/PATCH/DELETE) сбрасывает записи ресурса и его коллекции.
+'''
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+DEFAULT_CACHE_ENTRIES = 512
+DEFAULT_CACHE_TTL = 5.0
+
+
+class CacheStats:
+    '''
+    Счётчики всех кэшей процесса.
+    '''
+    EVENTS = ('hits', 'misses', 'revalidated', 'invalidated', 'evicted')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.EVENTS, 0)
+
+    def record(self, event, value=1):
+        with self._lock:
+            self.counts[event] += value
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.EVENTS, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def merge_snapshot(self, snapshot):
+        '''
+        Добавление счётчиков воркера xdist (результат snapshot).
+        '''
+        for event, value in snapshot.items():
+            self.record(event, value)
+
+    @property
+    def used(self):
+        return any(self.counts.values())
+
+    def report(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses'] + counts['revalidated']
+        ratio = (counts['hits'] + counts['revalidated']) / lookups if lookups else 0.0
+        return ' '.join(f'{event}: {count}' for event, count in counts.items()) + f', hit ratio: {ratio:.0%}'
+
+
+http_cache_stats = CacheStats()
+
+
+class CacheEntry:
+    __slots__ = ('response', 'etag', 'last_modified', 'stored_at', 'path')
+
+    def __init__(self, response, path):
+        self.response = response
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.stored_at = time.monotonic()
+        self.path = path
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    '''
+    LRU-кэш ответов с ограничением числа записей и временем свежести.
+    Ключ - метод, URL с отсортированными query-параметрами и личность авторизации,
+    так что ответы разных пользователей не смешиваются.
+    '''
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES, ttl=DEFAULT_CACHE_TTL):
+        '''
+        :param max_entries: Максимум записей, при переполнении вытесняются давно не использованные.
+        :param ttl: Сколько секунд запись отдаётся без перепроверки (0 - перепроверять всегда).
+        '''
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Растёт при каждом invalidate: ответы запросов, начатых до сброса, не кэшируются
+        self._generation = 0
+
+    @staticmethod
+    def key(method, url, params, identity):
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        return method, url, query, identity
+
+    def lookup(self, key):
+        '''
+        :return: Тройка (свежий ответ или None, заголовки для условного запроса, билет для store).
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            ticket = (key, entry, self._generation)
+        if entry is None:
+            return None, {}, ticket
+        if time.monotonic() - entry.stored_at < self.ttl:
+            http_cache_stats.record('hits')
+            return entry.response, {}, ticket
+        return None, entry.validators(), ticket
+
+    def store(self, ticket, response):
+        '''
+        Обработка ответа на запрос, для которого делался lookup. Если за время запроса
+        что-то было сброшено invalidate, ответ мог устареть ещё в пути и не кэшируется.
+        :param ticket: Билет из lookup.
+        :return: Ответ для вызывающего кода (при 304 - закэшированный).
+        '''
+        key, entry, generation = ticket
+        with self._lock:
+            current = generation == self._generation
+            if response.status_code == 304 and entry is not None:
+                if current and self._entries.get(key) is entry:
+                    entry.stored_at = time.monotonic()
+                http_cache_stats.record('revalidated')
+                return entry.response
+            http_cache_stats.record('misses')
+            cacheable = (current and response.status_code == 200
+                         and 'no-store' not in response.headers.get('Cache-Control', ''))
+            if not cacheable:
+                self._entries.pop(key, None)
+                return response
+            self._entries[key] = CacheEntry(response, key[1])
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            http_cache_stats.record('evicted', evicted)
+        return response
+
+    def invalidate(self, url):
+        '''
+        Сброс записей после изменения ресурса: сам ресурс, вложенные в него пути
+        и коллекция-родитель (PATCH /movies/5 сбрасывает /movies/5 и страницы /movies).
+        '''
+        parent = url.rsplit('/', 1)[0]
+        prefix = url.rstrip('/') + '/'
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, entry in self._entries.items()
+                     if entry.path in (url, parent) or entry.path.startswith(prefix)]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            http_cache_stats.record('invalidated', len(stale))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
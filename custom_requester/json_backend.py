@@ -0,0 +1,21 @@
+'''
+Быстрый разбор и сериализация JSON: orjson, если установлен, иначе стандартный json.
+dumps возвращает bytes без пробелов; sort_keys - для канонического представления (хэши).
+'''
+try:
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj, sort_keys=False):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+
+except ImportError:
+    import json
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj, sort_keys=False):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys).encode('utf-8')
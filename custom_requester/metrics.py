@@ -0,0 +1,263 @@
+import json
+import re
+import threading
+from functools import lru_cache
+
+# Точность гистограммы: 2**7 = 128 под-интервалов на каждую степень двойки (ошибка < 1%)
+PRECISION_BITS = 7
+_ID_SEGMENT = re.compile(r'/(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27,}|[0-9a-fA-F]{24,})(?=/|$)')
+
+
+@lru_cache(maxsize=1024)
+def endpoint_template(endpoint):
+    '''
+    Шаблон эндпойнта для группировки метрик: /movies/123 -> /movies/{id}.
+    :param endpoint: Путь запроса без query-параметров.
+    '''
+    return _ID_SEGMENT.sub('/{id}', endpoint.split('?', 1)[0])
+
+
+class LatencyHistogram:
+    '''
+    Гистограмма задержек в духе HDR Histogram: логарифмические корзины
+    с линейным делением внутри каждой степени двойки. Значения хранятся в микросекундах,
+    память не зависит от количества замеров.
+    '''
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def _bucket(value):
+        shift = max(value.bit_length() - PRECISION_BITS, 0)
+        return (shift << PRECISION_BITS) | (value >> shift)
+
+    @staticmethod
+    def _bucket_value(bucket):
+        # Середина корзины
+        shift, mantissa = bucket >> PRECISION_BITS, bucket & ((1 << PRECISION_BITS) - 1)
+        return (mantissa << shift) + ((1 << shift) - 1) // 2
+
+    def record(self, seconds):
+        '''
+        :param seconds: Задержка в секундах.
+        '''
+        value = max(int(seconds * 1_000_000), 0)
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def values(self):
+        '''
+        :return: Пары (середина корзины в секундах, количество) по возрастанию.
+        '''
+        return [(min(self._bucket_value(bucket), self.max) / 1_000_000, count)
+                for bucket, count in sorted(self.counts.items())]
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        '''
+        :param percent: Перцентиль от 0 до 100.
+        :return: Значение в секундах.
+        '''
+        if not self.count:
+            return 0.0
+        rank = max(int(self.count * percent / 100 + 0.5), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._bucket_value(bucket), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count / 1_000_000 if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max / 1_000_000,
+        }
+
+
+class LatencyRegistry:
+    '''
+    Гистограммы задержек по ключу (метод, шаблон эндпойнта).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        # Всего записанных запросов - по разнице значений считаются запросы фикстур
+        self.total = 0
+
+    def record(self, method, endpoint, seconds):
+        key = (method, endpoint_template(endpoint))
+        with self._lock:
+            self.total += 1
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.total = 0
+
+    def summaries(self):
+        '''
+        :return: Словарь 'METHOD /template' -> сводка (count, mean, p50, p95, p99, max в секундах).
+        '''
+        with self._lock:
+            return {f'{method} {template}': histogram.summary()
+                    for (method, template), histogram in sorted(self.histograms.items())}
+
+    def report(self):
+        '''
+        Текстовая таблица перцентилей в миллисекундах.
+        '''
+        lines = [f"{'endpoint':<40} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+        for name, stats in self.summaries().items():
+            lines.append(f"{name:<40} {stats['count']:>6} " + ' '.join(
+                f"{stats[key] * 1000:>9.1f}" for key in ('p50', 'p95', 'p99', 'max')))
+        return '\n'.join(lines)
+
+    def snapshot(self):
+        '''
+        Гистограммы в виде, пригодном для передачи из воркера xdist (workeroutput).
+        '''
+        with self._lock:
+            return {'total': self.total, 'histograms': [
+                {'method': method, 'template': template, 'counts': dict(histogram.counts),
+                 'count': histogram.count, 'total': histogram.total, 'max': histogram.max}
+                for (method, template), histogram in self.histograms.items()]}
+
+    def merge_snapshot(self, snapshot):
+        '''
+        Добавление гистограмм воркера (результат snapshot) - корзины суммируются без потери точности.
+        '''
+        with self._lock:
+            self.total += snapshot['total']
+            for data in snapshot['histograms']:
+                other = LatencyHistogram()
+                other.counts, other.count, other.total, other.max = (
+                    data['counts'], data['count'], data['total'], data['max'])
+                key = (data['method'], data['template'])
+                self.histograms.setdefault(key, LatencyHistogram()).merge(other)
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.summaries(), file, indent=4, ensure_ascii=False)
+
+
+latency_registry = LatencyRegistry()
+
+
+class CallRecorder:
+    '''
+    Список отдельных запросов (метод, шаблон эндпойнта, секунды) за время записи -
+    для бюджетов производительности тестов. Вне записи record ничего не делает.
+    Записываются только запросы потока, вызвавшего start, и потоков пулов, которым он отдал
+    работу через bind; запросы посторонних фоновых потоков (пополнение UserPool и т.п.) не учитываются.
+    '''
+
+    def __init__(self):
+        self.active = False
+        self.calls = []
+        self._threads = set()
+
+    def start(self):
+        self.calls = []
+        self._threads = {threading.get_ident()}
+        self.active = True
+
+    def stop(self):
+        '''
+        :return: Записанные вызовы.
+        '''
+        self.active = False
+        self._threads = set()
+        calls, self.calls = self.calls, []
+        return calls
+
+    def bind(self, func):
+        '''
+        Обёртка func для выполнения в потоке пула: пока она работает, запросы потока пула
+        записываются, если записываются запросы потока, вызвавшего bind.
+        :param func: Функция, которая будет вызвана в другом потоке.
+        '''
+        parent = threading.get_ident()
+
+        def wrapper(*args, **kwargs):
+            ident = threading.get_ident()
+            threads = self._threads
+            tracked = parent in threads and ident not in threads
+            if tracked:
+                threads.add(ident)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if tracked:
+                    threads.discard(ident)
+
+        return wrapper
+
+    def record(self, method, endpoint, seconds):
+        # list.append потокобезопасен: запросы пакетных методов пишутся из потоков пула
+        if threading.get_ident() in self._threads:
+            self.calls.append((method, endpoint_template(endpoint), seconds))
+
+
+class CallCounter(CallRecorder):
+    '''
+    Только число запросов потока, вызвавшего start, и привязанных к нему потоков пулов - без списка
+    вызовов: для профилировщика фикстур, который пишет весь прогон.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, method, endpoint, seconds):
+        if threading.get_ident() in self._threads:
+            with self._lock:
+                self.count += 1
+
+
+call_recorder = CallRecorder()
+# Все записывающие экземпляры: бюджеты тестов (call_recorder) и счётчик профилировщика фикстур
+call_recorders = [call_recorder]
+
+
+def record_call(method, endpoint, seconds):
+    '''
+    Запись запроса во все активные CallRecorder (вызывается CustomRequester после каждого запроса).
+    '''
+    for recorder in call_recorders:
+        if recorder.active:
+            recorder.record(method, endpoint, seconds)
+
+
+def bind_calls(func):
+    '''
+    CallRecorder.bind для всех записывающих экземпляров: запросы func в потоке пула
+    засчитываются потоку, вызвавшему bind_calls.
+    '''
+    for recorder in call_recorders:
+        func = recorder.bind(func)
+    return func
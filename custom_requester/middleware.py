@@ -0,0 +1,366 @@
+'''
+Цепочка middleware вокруг отправки запроса: ограничение частоты (token bucket на хост),
+повторы с джиттером и учётом Retry-After, circuit breaker. Все события считаются в middleware_stats.
+'''
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
+# Методы, которые безопасно повторять при сетевых ошибках
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+# Сетевые ошибки requests, после которых запрос можно повторить
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout)
+# Статусы "хост перегружен или недоступен"
+UNAVAILABLE_STATUSES = frozenset({502, 503, 504})
+
+
+def is_transport_error(error):
+    '''
+    Сетевая ошибка requests или httpx. httpx не импортируется ради проверки:
+    если его нет в sys.modules, его ошибок тоже быть не может.
+    '''
+    if isinstance(error, TRANSPORT_ERRORS):
+        return True
+    httpx = sys.modules.get('httpx')
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+class CircuitOpenError(RuntimeError):
+    '''
+    Хост помечен недоступным: запрос не отправлялся.
+    '''
+
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f'Circuit for {host} is open, next probe in {retry_in:.1f}s')
+
+
+class RequestInfo:
+    '''
+    Описание отправляемого запроса для middleware.
+    '''
+    __slots__ = ('method', 'url', 'host', 'attempt')
+
+    def __init__(self, method, url):
+        self.method = method.upper()
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.attempt = 0
+
+
+class MiddlewareStats:
+    '''
+    Счётчики по хостам: повторы, ожидания ограничителя частоты, срабатывания circuit breaker.
+    '''
+    EVENTS = ('retries', 'throttled', 'throttle_wait', 'circuit_opened', 'rejected')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    def record(self, host, event, value=1):
+        with self._lock:
+            stats = self.hosts.setdefault(host, dict.fromkeys(self.EVENTS, 0))
+            stats[event] += value
+
+    def reset(self):
+        with self._lock:
+            self.hosts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {host: dict(stats) for host, stats in self.hosts.items()}
+
+    def merge_snapshot(self, snapshot):
+        '''
+        Добавление счётчиков воркера xdist (результат snapshot).
+        '''
+        for host, other in snapshot.items():
+            for event, value in other.items():
+                self.record(host, event, value)
+
+    def report(self):
+        '''
+        Текстовый отчёт по хостам.
+        '''
+        lines = [f"{'host':<40} {'retries':>8} {'throttled':>9} {'wait, s':>8} {'opened':>7} {'rejected':>8}"]
+        with self._lock:
+            for host, stats in sorted(self.hosts.items()):
+                lines.append(f"{host:<40} {stats['retries']:>8} {stats['throttled']:>9} "
+                             f"{stats['throttle_wait']:>8.2f} {stats['circuit_opened']:>7} {stats['rejected']:>8}")
+        return '\n'.join(lines)
+
+
+middleware_stats = MiddlewareStats()
+
+
+class Middleware:
+    '''
+    Базовый middleware. before_request вызывается перед каждой попыткой и возвращает,
+    сколько секунд подождать; after_response - после попытки и возвращает задержку
+    перед повтором или None, если повторять не нужно.
+    '''
+
+    def before_request(self, request):
+        return 0.0
+
+    def after_response(self, request, response, error):
+        return None
+
+
+class RateLimiter(Middleware):
+    '''
+    Token bucket на каждый хост: не больше rate запросов в секунду с всплесками до burst.
+    '''
+
+    def __init__(self, rate, burst=None):
+        '''
+        :param rate: Запросов в секунду на хост.
+        :param burst: Ёмкость корзины (по умолчанию равна rate, но не меньше 1).
+        '''
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def before_request(self, request):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(request.host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+            self._buckets[request.host] = (tokens, now)
+        # Токен уже зарезервирован; при долге ждём, пока он восполнится
+        if tokens >= 0:
+            return 0.0
+        wait = -tokens / self.rate
+        middleware_stats.record(request.host, 'throttled')
+        middleware_stats.record(request.host, 'throttle_wait', wait)
+        return wait
+
+
+def parse_retry_after(value):
+    '''
+    Разбор заголовка Retry-After: число секунд или HTTP-дата.
+    :return: Секунды ожидания или None.
+    '''
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryMiddleware(Middleware):
+    '''
+    Повтор при сетевых ошибках и 502/503/504 для идемпотентных методов и при 429 для любых
+    (сервер отклонил запрос, не обработав его). Задержка - full jitter от экспоненциального
+    backoff, а если сервер прислал Retry-After - не меньше указанного.
+    '''
+
+    def __init__(self, max_retries=3, backoff=0.2, max_delay=10.0):
+        '''
+        :param max_retries: Максимум повторов одного запроса.
+        :param backoff: Базовая задержка, удваивается с каждой попыткой.
+        :param max_delay: Верхняя граница задержки (в том числе для Retry-After).
+        '''
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+
+    def after_response(self, request, response, error):
+        if request.attempt >= self.max_retries or not self._should_retry(request, response, error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.backoff * 2 ** request.attempt))
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        middleware_stats.record(request.host, 'retries')
+        return min(delay, self.max_delay)
+
+    @staticmethod
+    def _should_retry(request, response, error):
+        if error is not None:
+            return is_transport_error(error) and request.method in IDEMPOTENT_METHODS
+        if response.status_code == 429:
+            return True
+        return response.status_code in UNAVAILABLE_STATUSES and request.method in IDEMPOTENT_METHODS
+
+
+class CircuitBreaker(Middleware):
+    '''
+    После failure_threshold сетевых ошибок или 502/503/504 подряд хост считается недоступным:
+    запросы к нему сразу падают с CircuitOpenError. Через reset_timeout пропускается
+    один пробный запрос - при успехе хост снова доступен.
+    '''
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        # host -> [подряд неудач, время открытия или None, идёт ли пробный запрос]
+        self._hosts = {}
+
+    def before_request(self, request):
+        with self._lock:
+            state = self._hosts.get(request.host)
+            if state is None or state[1] is None:
+                return 0.0
+            retry_in = state[1] + self.reset_timeout - time.monotonic()
+            if retry_in <= 0 and not state[2]:
+                state[2] = True
+                return 0.0
+        middleware_stats.record(request.host, 'rejected')
+        raise CircuitOpenError(request.host, max(retry_in, 0.0))
+
+    def after_response(self, request, response, error):
+        failed = (is_transport_error(error)
+                  or (response is not None and response.status_code in UNAVAILABLE_STATUSES))
+        with self._lock:
+            state = self._hosts.setdefault(request.host, [0, None, False])
+            if not failed:
+                state[:] = [0, None, False]
+                return None
+            state[0] += 1
+            opened = state[2] or (state[1] is None and state[0] >= self.failure_threshold)
+            if opened:
+                state[1:] = [time.monotonic(), False]
+        if opened:
+            middleware_stats.record(request.host, 'circuit_opened')
+        return None
+
+
+class MiddlewareChain:
+    '''
+    Упорядоченный набор middleware и цикл попыток отправки запроса.
+    '''
+
+    def __init__(self, middlewares=()):
+        self.middlewares = list(middlewares)
+
+    def _before(self, request):
+        return sum(middleware.before_request(request) for middleware in self.middlewares)
+
+    def _after(self, request, response, error):
+        delays = [middleware.after_response(request, response, error) for middleware in reversed(self.middlewares)]
+        delays = [delay for delay in delays if delay is not None]
+        return max(delays) if delays else None
+
+    def execute(self, request, send):
+        '''
+        Отправка запроса через цепочку.
+        :param request: RequestInfo.
+        :param send: Функция без аргументов, выполняющая одну попытку и возвращающая ответ.
+        :return: Ответ последней попытки.
+        '''
+        while True:
+            wait = self._before(request)
+            if wait > 0:
+                time.sleep(wait)
+            response, error = None, None
+            try:
+                response = send()
+            except Exception as e:
+                error = e
+            delay = self._after(request, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            request.attempt += 1
+            time.sleep(delay)
+
+    async def execute_async(self, request, send):
+        '''
+        Асинхронная версия execute: send возвращает корутину.
+        '''
+        while True:
+            wait = self._before(request)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            response, error = None, None
+            try:
+                response = await send()
+            except Exception as e:
+                error = e
+            delay = self._after(request, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            request.attempt += 1
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class MiddlewareConfig:
+    '''
+    Настройки цепочки по умолчанию. Переопределяются переменными окружения
+    CINESCOPE_RATE_LIMIT, CINESCOPE_MAX_RETRIES и т.д. (см. from_env).
+    '''
+    rate_limit: float = 0.0  # запросов в секунду на хост, 0 - без ограничения
+    rate_burst: int = 0
+    max_retries: int = 3
+    retry_backoff: float = 0.2
+    retry_max_delay: float = 10.0
+    breaker_threshold: int = 5  # 0 - без circuit breaker
+    breaker_reset: float = 30.0
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            rate_limit=float(os.getenv('CINESCOPE_RATE_LIMIT', defaults.rate_limit)),
+            rate_burst=int(os.getenv('CINESCOPE_RATE_BURST', defaults.rate_burst)),
+            max_retries=int(os.getenv('CINESCOPE_MAX_RETRIES', defaults.max_retries)),
+            retry_backoff=float(os.getenv('CINESCOPE_RETRY_BACKOFF', defaults.retry_backoff)),
+            retry_max_delay=float(os.getenv('CINESCOPE_RETRY_MAX_DELAY', defaults.retry_max_delay)),
+            breaker_threshold=int(os.getenv('CINESCOPE_BREAKER_THRESHOLD', defaults.breaker_threshold)),
+            breaker_reset=float(os.getenv('CINESCOPE_BREAKER_RESET', defaults.breaker_reset)),
+        )
+
+
+def build_middleware(config=None):
+    '''
+    Сборка цепочки: circuit breaker -> ограничитель частоты -> повторы.
+    :param config: MiddlewareConfig (по умолчанию из переменных окружения).
+    :return: MiddlewareChain.
+    '''
+    config = config or MiddlewareConfig.from_env()
+    middlewares = []
+    if config.breaker_threshold > 0:
+        middlewares.append(CircuitBreaker(config.breaker_threshold, config.breaker_reset))
+    if config.rate_limit > 0:
+        middlewares.append(RateLimiter(config.rate_limit, config.rate_burst or None))
+    if config.max_retries > 0:
+        middlewares.append(RetryMiddleware(config.max_retries, config.retry_backoff, config.retry_max_delay))
+    return MiddlewareChain(middlewares)
+
+
+_default_middleware = None
+_default_lock = threading.Lock()
+
+
+def get_default_middleware():
+    '''
+    Общая на процесс цепочка: лимиты и состояние хостов едины для всех API-клиентов.
+    '''
+    global _default_middleware
+    with _default_lock:
+        if _default_middleware is None:
+            _default_middleware = build_middleware()
+        return _default_middleware
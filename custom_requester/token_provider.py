@@ -0,0 +1,202 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from requests.auth import AuthBase
+
+from utils.file_lock import file_lock
+
+# Время жизни токена, если срок не удалось прочитать из самого токена (в секундах)
+DEFAULT_TOKEN_TTL = 15 * 60
+# За сколько секунд до истечения токен обновляется заранее
+TOKEN_REFRESH_MARGIN = 60
+TOKEN_CACHE_PATH = os.getenv('CINESCOPE_TOKEN_CACHE',
+                             os.path.join(tempfile.gettempdir(), 'cinescope_tokens.json'))
+
+
+def token_expires_at(token, default_ttl=DEFAULT_TOKEN_TTL):
+    '''
+    Время истечения токена: claim exp из JWT, иначе текущее время + default_ttl.
+    '''
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + default_ttl
+
+
+class TokenProvider:
+    '''
+    Кэш токенов по паре логин/пароль: в памяти процесса и в общем файле с блокировкой,
+    чтобы воркеры и повторные сессии не логинились заново, пока токен жив.
+    '''
+
+    def __init__(self, cache_path=TOKEN_CACHE_PATH, refresh_margin=TOKEN_REFRESH_MARGIN):
+        '''
+        :param cache_path: Путь к файлу кэша (None - кэш только в памяти).
+        :param refresh_margin: За сколько секунд до истечения обновлять токен.
+        '''
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(*credentials):
+        # Пароли в файл не пишем - только хэш
+        return hashlib.sha256('\0'.join(map(str, credentials)).encode()).hexdigest()
+
+    def _is_fresh(self, entry):
+        return entry is not None and entry['expires_at'] - self.refresh_margin > time.time()
+
+    def get_token(self, key, login):
+        '''
+        Получение живого токена. При отсутствии или скором истечении вызывается login().
+        :param key: Ключ кэша (см. cache_key).
+        :param login: Функция без аргументов, выполняющая логин и возвращающая токен.
+        :return: Токен доступа.
+        '''
+        entry = self._tokens.get(key)
+        if self._is_fresh(entry):
+            return entry['token']
+
+        with self._lock:
+            entry = self._tokens.get(key)
+            if self._is_fresh(entry):
+                return entry['token']
+            if self.cache_path is None:
+                entry = self._login(login)
+            else:
+                with file_lock(f'{self.cache_path}.lock'):
+                    file_cache = self._read_file()
+                    entry = file_cache.get(key)
+                    if not self._is_fresh(entry):
+                        entry = file_cache[key] = self._login(login)
+                        self._write_file(file_cache)
+            self._tokens[key] = entry
+            return entry['token']
+
+    async def get_token_async(self, key, login):
+        '''
+        Асинхронный вариант get_token: login - корутинная функция.
+        Блокировки на время логина не держатся (иначе встал бы цикл событий),
+        поэтому одновременные задачи без живого токена могут залогиниться каждая.
+        '''
+        entry = self._tokens.get(key)
+        if self._is_fresh(entry):
+            return entry['token']
+        if self.cache_path is not None:
+            with self._lock, file_lock(f'{self.cache_path}.lock'):
+                entry = self._read_file().get(key)
+            if self._is_fresh(entry):
+                self._tokens[key] = entry
+                return entry['token']
+
+        token = await login()
+        entry = {'token': token, 'expires_at': token_expires_at(token)}
+        with self._lock:
+            self._tokens[key] = entry
+            if self.cache_path is not None:
+                with file_lock(f'{self.cache_path}.lock'):
+                    file_cache = self._read_file()
+                    file_cache[key] = entry
+                    self._write_file(file_cache)
+        return token
+
+    def invalidate(self, key, token=None):
+        '''
+        Сброс токена (например, если сервер ответил 401).
+        :param token: Отвергнутый токен: если другой поток уже получил новый, тот не сбрасывается.
+        '''
+        def stale(entry):
+            return entry is not None and (token is None or entry['token'] == token)
+
+        with self._lock:
+            if stale(self._tokens.get(key)):
+                del self._tokens[key]
+            if self.cache_path is not None:
+                with file_lock(f'{self.cache_path}.lock'):
+                    file_cache = self._read_file()
+                    if stale(file_cache.get(key)):
+                        del file_cache[key]
+                        self._write_file(file_cache)
+
+    @staticmethod
+    def _login(login):
+        token = login()
+        return {'token': token, 'expires_at': token_expires_at(token)}
+
+    def _read_file(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_file(self, file_cache):
+        now = time.time()
+        file_cache = {key: entry for key, entry in file_cache.items() if entry['expires_at'] > now}
+        tmp_path = f'{self.cache_path}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(file_cache, file)
+        os.replace(tmp_path, self.cache_path)
+
+
+token_provider = TokenProvider()
+
+
+class BearerAuth(AuthBase):
+    '''
+    Авторизация requests, подставляющая заголовок Authorization в каждый запрос.
+    Общая сессия не меняется, токен берётся из TokenProvider и обновляется до истечения.
+    Асинхронные клиенты берут заголовки через auth_headers_async (login - корутинная функция).
+    '''
+
+    def __init__(self, provider=token_provider):
+        self.provider = provider
+        self.key = None
+        self.login = None
+
+    def set_credentials(self, key, login):
+        '''
+        :param key: Ключ кэша токена.
+        :param login: Функция логина, возвращающая токен.
+        '''
+        self.key = key
+        self.login = login
+
+    def token(self):
+        if self.key is None:
+            return None
+        return self.provider.get_token(self.key, self.login)
+
+    def auth_headers(self):
+        '''
+        Заголовки авторизации для одного запроса.
+        '''
+        token = self.token()
+        return {'Authorization': f'Bearer {token}'} if token else {}
+
+    async def auth_headers_async(self):
+        if self.key is None:
+            return {}
+        return {'Authorization': f'Bearer {await self.provider.get_token_async(self.key, self.login)}'}
+
+    def invalidate(self, authorization=None):
+        '''
+        Сброс токена после ответа 401: следующий запрос залогинится заново.
+        :param authorization: Заголовок Authorization отвергнутого запроса.
+        '''
+        if self.key is not None:
+            token = authorization[len('Bearer '):] if authorization else None
+            self.provider.invalidate(self.key, token)
+
+    def __call__(self, request):
+        request.headers.update(self.auth_headers())
+        return request
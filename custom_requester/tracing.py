@@ -0,0 +1,206 @@
+'''
+Спаны тестов и HTTP-запросов с экспортом в файл в формате OTLP-JSON (JSON Lines).
+В горячем пути - только добавление кортежа в ограниченный буфер (со ссылкой на ответ);
+статус, размеры тел, идентификаторы, шаблоны URL и JSON считаются в фоновом потоке экспортёра.
+Идентификаторы берутся из собственного генератора: глобальный random фиксируется
+DataGenerator.seed, и спаны разных тестов получали бы одинаковые trace id.
+'''
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from custom_requester.metrics import endpoint_template
+
+TRACE_BUFFER_SIZE = 50000
+EXPORT_INTERVAL = 1.0
+EXPORT_BATCH_SIZE = 2000
+SERVICE_NAME = 'cinescope-api-tests'
+
+# Виды спанов OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# Генератор trace/span id, независимый от глобального random (засевается из os.urandom)
+_ids = random.Random()
+
+
+def _trace_id():
+    return f'{_ids.getrandbits(128):032x}'
+
+
+def _span_id():
+    return f'{_ids.getrandbits(64):016x}'
+
+
+def body_size(request):
+    '''
+    Размер тела запроса: PreparedRequest.body у requests, content у httpx.
+    '''
+    body = getattr(request, 'body', None)
+    if body is None:
+        body = getattr(request, 'content', None)
+    return len(body) if body else 0
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Tracer:
+    '''
+    Буфер спанов текущего процесса. Пока tracer не запущен (enabled=False),
+    send_request ничего не записывает.
+    '''
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE):
+        # При переполнении вытесняются самые старые спаны
+        self.buffer = deque(maxlen=buffer_size)
+        self.enabled = False
+        # (trace_id, span_id, nodeid) текущего теста - родитель спанов запросов
+        self.current_test = None
+        self._test_start = 0
+        self._test_failed = False
+        self._exporter = None
+
+    def start(self, path, interval=EXPORT_INTERVAL):
+        '''
+        Включение трассировки с фоновым экспортом в файл.
+        :param path: Файл для OTLP-JSON (по строке на пачку спанов).
+        :param interval: Период выгрузки буфера, секунды.
+        '''
+        self._exporter = SpanExporter(self, path, interval)
+        self._exporter.start()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        if self._exporter is not None:
+            self._exporter.stop()
+            self._exporter = None
+
+    def start_test(self, nodeid):
+        self.current_test = (_trace_id(), _span_id(), nodeid)
+        self._test_start = time.time_ns()
+        self._test_failed = False
+
+    def mark_failed(self):
+        self._test_failed = True
+
+    def end_test(self):
+        if self.current_test is not None:
+            self.buffer.append(('test', self.current_test, self._test_start, time.time_ns(), self._test_failed))
+            self.current_test = None
+
+    def record_http(self, start_ns, method, url, endpoint, response, retries=0, error=None):
+        '''
+        Спан HTTP-запроса. Вызывается и при исключении (сетевая ошибка, CircuitOpenError):
+        тогда ответа нет, а спан помечается ошибкой с её типом.
+        :param response: Ответ requests/httpx или None; размеры тел считает экспортёр.
+        :param error: Исключение, прервавшее запрос.
+        '''
+        self.buffer.append(('http', self.current_test, start_ns, time.time_ns(), method, url, endpoint, response,
+                            retries, type(error).__name__ if error else None))
+
+
+tracer = Tracer()
+
+
+class SpanExporter:
+    '''
+    Фоновый поток, который периодически выгружает буфер спанов в файл.
+    '''
+
+    def __init__(self, tracer, path, interval=EXPORT_INTERVAL):
+        self.tracer = tracer
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._resource = {'attributes': [_attribute('service.name', SERVICE_NAME),
+                                         _attribute('process.pid', os.getpid())]}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        buffer = self.tracer.buffer
+        while buffer:
+            batch = []
+            while buffer and len(batch) < EXPORT_BATCH_SIZE:
+                batch.append(buffer.popleft())
+            self._file.write(json.dumps(self._encode(batch), separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def _encode(self, batch):
+        spans = []
+        for record in batch:
+            if record[0] == 'test':
+                spans.append(self._test_span(*record[1:]))
+            else:
+                spans.append(self._http_span(*record[1:]))
+        return {'resourceSpans': [{'resource': self._resource,
+                                   'scopeSpans': [{'scope': {'name': 'custom_requester.tracing'},
+                                                   'spans': spans}]}]}
+
+    @staticmethod
+    def _test_span(test, start_ns, end_ns, failed):
+        trace_id, span_id, nodeid = test
+        span = {'traceId': trace_id, 'spanId': span_id, 'name': nodeid, 'kind': SPAN_KIND_INTERNAL,
+                'startTimeUnixNano': str(start_ns), 'endTimeUnixNano': str(end_ns),
+                'attributes': [_attribute('test.id', nodeid)]}
+        if failed:
+            span['status'] = {'code': STATUS_ERROR}
+        return span
+
+    @staticmethod
+    def _http_span(test, start_ns, end_ns, method, url, endpoint, response, retries, error):
+        if response is None:
+            status, request_size, response_size = None, 0, 0
+        else:
+            status, request_size, response_size = (response.status_code, body_size(response.request),
+                                                   len(response.content))
+        template = endpoint_template(endpoint)
+        span = {'spanId': _span_id(), 'name': f'{method} {template}',
+                'kind': SPAN_KIND_CLIENT,
+                'startTimeUnixNano': str(start_ns), 'endTimeUnixNano': str(end_ns),
+                'attributes': [_attribute('http.request.method', method),
+                               _attribute('url.full', url),
+                               _attribute('url.template', template),
+                               _attribute('http.request.body.size', request_size),
+                               _attribute('http.response.body.size', response_size),
+                               _attribute('http.request.resend_count', retries)]}
+        if status is not None:
+            span['attributes'].append(_attribute('http.response.status_code', status))
+        if test is not None:
+            span['traceId'], span['parentSpanId'] = test[0], test[1]
+            span['attributes'].append(_attribute('test.id', test[2]))
+        else:
+            span['traceId'] = _trace_id()
+        if error is not None:
+            span['attributes'].append(_attribute('error.type', error))
+            span['status'] = {'code': STATUS_ERROR, 'message': error}
+        elif status >= 500:
+            span['status'] = {'code': STATUS_ERROR}
+        return span
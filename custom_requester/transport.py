@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+@dataclass
+class TransportConfig:
+    '''
+    Настройки транспорта HTTP-сессии. Значения по умолчанию можно переопределить
+    переменными окружения CINESCOPE_POOL_MAXSIZE, CINESCOPE_READ_TIMEOUT и т.д. (см. from_env).
+    '''
+    pool_connections: int = 4  # сколько хостов держать в кэше пулов
+    pool_maxsize: int = 16  # соединений на один хост
+    keep_alive: bool = True
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            pool_connections=int(os.getenv('CINESCOPE_POOL_CONNECTIONS', defaults.pool_connections)),
+            pool_maxsize=int(os.getenv('CINESCOPE_POOL_MAXSIZE', defaults.pool_maxsize)),
+            keep_alive=os.getenv('CINESCOPE_KEEP_ALIVE', '1') != '0',
+            connect_timeout=float(os.getenv('CINESCOPE_CONNECT_TIMEOUT', defaults.connect_timeout)),
+            read_timeout=float(os.getenv('CINESCOPE_READ_TIMEOUT', defaults.read_timeout)),
+        )
+
+
+class TransportStats:
+    '''
+    Счётчики соединений по хостам: сколько запросов отправлено, сколько соединений
+    открыто (остальные запросы пошли по переиспользованным keep-alive соединениям)
+    и сколько времени ушло на DNS+TCP и TLS.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    def _host(self, host):
+        return self.hosts.setdefault(host, {'requests': 0, 'opened': 0, 'connect_time': 0.0, 'tls_time': 0.0})
+
+    def record_request(self, host):
+        with self._lock:
+            self._host(host)['requests'] += 1
+
+    def record_connection(self, host, connect_time, tls_time):
+        with self._lock:
+            stats = self._host(host)
+            stats['opened'] += 1
+            stats['connect_time'] += connect_time
+            stats['tls_time'] += tls_time
+
+    def reset(self):
+        with self._lock:
+            self.hosts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {host: dict(stats) for host, stats in self.hosts.items()}
+
+    def merge_snapshot(self, snapshot):
+        '''
+        Добавление счётчиков воркера xdist (результат snapshot).
+        '''
+        with self._lock:
+            for host, other in snapshot.items():
+                stats = self._host(host)
+                for key, value in other.items():
+                    stats[key] += value
+
+    def report(self):
+        '''
+        Текстовый отчёт по хостам.
+        '''
+        lines = [f"{'host':<40} {'requests':>8} {'opened':>7} {'reused':>7} {'dns+tcp, s':>11} {'tls, s':>8}"]
+        with self._lock:
+            for host, stats in sorted(self.hosts.items()):
+                reused = max(stats['requests'] - stats['opened'], 0)
+                lines.append(f"{host:<40} {stats['requests']:>8} {stats['opened']:>7} {reused:>7} "
+                             f"{stats['connect_time']:>11.3f} {stats['tls_time']:>8.3f}")
+        return '\n'.join(lines)
+
+
+transport_stats = TransportStats()
+
+
+class _InstrumentedConnectionMixin:
+    _tcp_time = 0.0
+
+    def _new_conn(self):
+        # Разрешение имени и TCP-рукопожатие
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        self._tcp_time = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        total = time.perf_counter() - start
+        transport_stats.record_connection(self.host, self._tcp_time, max(total - self._tcp_time, 0.0))
+
+
+class InstrumentedHTTPConnection(_InstrumentedConnectionMixin, HTTPConnection):
+    pass
+
+
+class InstrumentedHTTPSConnection(_InstrumentedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class InstrumentedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = InstrumentedHTTPConnection
+
+
+class InstrumentedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = InstrumentedHTTPSConnection
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter с таймаутами по умолчанию и учётом открытых/переиспользованных соединений.
+    '''
+
+    def __init__(self, config, **kwargs):
+        self.transport_config = config
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': InstrumentedHTTPConnectionPool,
+            'https': InstrumentedHTTPSConnectionPool,
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (self.transport_config.connect_timeout, self.transport_config.read_timeout)
+        response = super().send(request, timeout=timeout, **kwargs)
+        transport_stats.record_request(urlsplit(request.url).hostname)
+        return response
+
+
+def build_session(config=None):
+    '''
+    Создание requests.Session с настроенным пулом соединений и таймаутами.
+    :param config: TransportConfig (по умолчанию из переменных окружения).
+    :return: Объект requests.Session.
+    '''
+    config = config or TransportConfig.from_env()
+    # urllib3 не повторяет запросы: и сетевые ошибки, и 429/502-504 повторяет RetryMiddleware,
+    # иначе попытки двух уровней перемножаются
+    retry = Retry(total=0, read=False)
+    adapter = TunedHTTPAdapter(config,
+                               pool_connections=config.pool_connections,
+                               pool_maxsize=config.pool_maxsize,
+                               max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not config.keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
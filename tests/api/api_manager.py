@@ -1,3 +1,8 @@
+from functools import cached_property
+
+from constants import BASE_URL, MOVIES_URL
+from custom_requester.middleware import get_default_middleware
+from custom_requester.token_provider import BearerAuth
 from tests.api.auth_api import AuthAPI
 from tests.api.movies_api import MoviesApi
 from tests.api.user_api import UserAPI
@@ -6,15 +11,38 @@ from tests.api.user_api import UserAPI
 class ApiManager:
     '''
     Класс для управления API-классоми с единой HTTP-сессией.
+    API-клиенты создаются при первом обращении к атрибуту.
     '''
 
-    def __init__(self, session):
+    def __init__(self, session, auth=None, base_url=BASE_URL, movies_url=MOVIES_URL, middleware=None,
+                 cache=None):
         '''
         Инициализация ApiManager.
         :param session: HTTP-сессия, используемая всеми API-классами.
+        :param auth: Общая авторизация для API-классов (по умолчанию новый BearerAuth).
+        :param base_url: Адрес auth-сервиса.
+        :param movies_url: Адрес сервиса фильмов.
+        :param middleware: Цепочка повторов/ограничений (по умолчанию общая на процесс).
+        :param cache: Общий кэш ответов GET (ResponseCache) для UserAPI и MoviesApi, None - без кэша.
         '''
 
         self.session = session
-        self.auth_api = AuthAPI(session)
-        self.user_api = UserAPI(session)
-        self.movies_api=MoviesApi(session)
\ No newline at end of file
+        self.auth = auth if auth is not None else BearerAuth()
+        self.middleware = middleware if middleware is not None else get_default_middleware()
+        self.base_url = base_url
+        self.movies_url = movies_url
+        self.cache = cache
+
+    @cached_property
+    def auth_api(self):
+        return AuthAPI(self.session, auth=self.auth, base_url=self.base_url, middleware=self.middleware)
+
+    @cached_property
+    def user_api(self):
+        return UserAPI(self.session, auth=self.auth, base_url=self.base_url, middleware=self.middleware,
+                       cache=self.cache)
+
+    @cached_property
+    def movies_api(self):
+        return MoviesApi(self.session, auth=self.auth, base_url=self.movies_url, middleware=self.middleware,
+                         cache=self.cache)
@@ -0,0 +1,48 @@
+from functools import cached_property
+
+from constants import BASE_URL, MOVIES_URL
+from custom_requester.middleware import get_default_middleware
+from custom_requester.token_provider import BearerAuth
+from tests.api.auth_api import AsyncAuthAPI
+from tests.api.movies_api import AsyncMoviesApi
+from tests.api.user_api import AsyncUserAPI
+
+
+class AsyncApiManager:
+    '''
+    Асинхронный двойник ApiManager с единым httpx.AsyncClient.
+    API-клиенты создаются при первом обращении к атрибуту.
+    '''
+
+    def __init__(self, session, auth=None, base_url=BASE_URL, movies_url=MOVIES_URL, middleware=None,
+                 cache=None):
+        '''
+        Инициализация AsyncApiManager.
+        :param session: Асинхронная HTTP-сессия (httpx.AsyncClient), используемая всеми API-классами.
+        :param auth: Общая авторизация для API-классов (по умолчанию новый BearerAuth).
+        :param base_url: Адрес auth-сервиса.
+        :param movies_url: Адрес сервиса фильмов.
+        :param middleware: Цепочка повторов/ограничений (по умолчанию общая на процесс).
+        :param cache: Общий кэш ответов GET (ResponseCache) для UserAPI и MoviesApi, None - без кэша.
+        '''
+
+        self.session = session
+        self.auth = auth if auth is not None else BearerAuth()
+        self.middleware = middleware if middleware is not None else get_default_middleware()
+        self.base_url = base_url
+        self.movies_url = movies_url
+        self.cache = cache
+
+    @cached_property
+    def auth_api(self):
+        return AsyncAuthAPI(self.session, auth=self.auth, base_url=self.base_url, middleware=self.middleware)
+
+    @cached_property
+    def user_api(self):
+        return AsyncUserAPI(self.session, auth=self.auth, base_url=self.base_url, middleware=self.middleware,
+                            cache=self.cache)
+
+    @cached_property
+    def movies_api(self):
+        return AsyncMoviesApi(self.session, auth=self.auth, base_url=self.movies_url, middleware=self.middleware,
+                              cache=self.cache)
@@ -1,5 +1,8 @@
 from constants import REGISTER_ENDPOINT, LOGIN_ENDPOINT, BASE_URL
+from custom_requester.async_custom_requester import AsyncCustomRequester
+from custom_requester.batch import DEFAULT_BATCH_WORKERS, run_batch, run_batch_async
 from custom_requester.custom_requester import CustomRequester
+from tests.api.models import AuthResult, User
 
 
 class AuthAPI(CustomRequester):
@@ -7,46 +10,121 @@ class AuthAPI(CustomRequester):
     Класс для работы с аутентификацией
     '''
 
-    def __init__(self, session):
+    def __init__(self, session, auth=None, base_url=BASE_URL, middleware=None):
+        '''
+        :param session: HTTP-сессия.
+        :param auth: Общий BearerAuth, который authenticate наполняет токеном.
+        Собственные запросы AuthAPI (/login, /register) идут без него.
+        :param base_url: Адрес auth-сервиса (по умолчанию BASE_URL).
+        :param middleware: Цепочка повторов/ограничений (MiddlewareChain).
+        '''
         super().__init__(session=session,
-                         base_url=BASE_URL)
+                         base_url=base_url,
+                         middleware=middleware)
+        self.bearer_auth = auth
 
-    def register_user(self, user_data, expected_status=201):
+    def register_user(self, user_data, expected_status=201, schema=None, as_model=False):
         '''
         Регистраиця нового пользователя.
         :param user_data: Данные пользователя.
         :param expected_status: Ожидаемый статус-код.
+        :param schema: Имя JSON-схемы для валидации ответа (например, register_user).
+        :param as_model: Вернуть User вместо ответа.
         '''
         return self.send_request(
             method='POST',
             endpoint=REGISTER_ENDPOINT,
             data=user_data,
-            expected_status=expected_status
+            expected_status=expected_status,
+            schema=schema,
+            model=User if as_model else None
         )
 
-    def login_user(self, login_data, expected_status=200):
+    _run_batch = staticmethod(run_batch)
+
+    def register_users(self, users, max_workers=DEFAULT_BATCH_WORKERS, expected_status=201):
+        '''
+        Регистрация нескольких пользователей параллельными запросами (bulk-эндпоинта нет).
+        :param users: Список данных пользователей.
+        :param max_workers: Максимум одновременных запросов.
+        :param expected_status: Ожидаемый статус-код.
+        :return: Список BatchResult в порядке users.
+        '''
+        return self._run_batch(lambda user: self.register_user(user, expected_status=expected_status),
+                               users, max_workers)
+
+    def login_user(self, login_data, expected_status=200, schema=None, as_model=False):
         '''
         Авторизация пользователя.
         :param login_data: Данные для логина.
         :param expected_status: Ожидаемый статус-код.
+        :param schema: Имя JSON-схемы для валидации ответа (например, login_user).
+        :param as_model: Вернуть AuthResult вместо ответа.
         '''
         return self.send_request(
             method='POST',
             endpoint=LOGIN_ENDPOINT,
             data=login_data,
-            expected_status=expected_status
+            expected_status=expected_status,
+            schema=schema,
+            model=AuthResult if as_model else None
         )
 
     def authenticate(self, user_creds):
+        '''
+        Авторизация по логину и паролю.
+        Если передан общий BearerAuth, токен берётся из кэша TokenProvider и подставляется
+        в каждый запрос; иначе токен записывается в заголовки сессии.
+        :param user_creds: Пара (email, пароль).
+        :return: Токен доступа.
+        '''
         login_data = {
             'email': user_creds[0],
             'password': user_creds[1]
         }
 
-        response = self.login_user(login_data).json()
-        if 'accessToken' not in response:
-            raise KeyError('token is missing')
+        def login():
+            response = self.login_user(login_data).json()
+            if 'accessToken' not in response:
+                raise KeyError('token is missing')
+            return response['accessToken']
 
-        token = response['accessToken']
+        if self.bearer_auth is not None:
+            key = self.bearer_auth.provider.cache_key(self.base_url, *user_creds)
+            self.bearer_auth.set_credentials(key, login)
+            return self.bearer_auth.token()
+
+        token = login()
         self.update_session_headers(self.session, Authorization=f"Bearer {token}")
         return token
+
+
+class AsyncAuthAPI(AuthAPI, AsyncCustomRequester):
+    '''
+    Асинхронная версия AuthAPI: методы те же, но возвращают корутины.
+    '''
+    _run_batch = staticmethod(run_batch_async)
+
+    async def authenticate(self, user_creds):
+        '''
+        Авторизация по логину и паролю через общий BearerAuth: токен подставляется в каждый запрос,
+        заголовки общего httpx.AsyncClient не меняются.
+        :param user_creds: Пара (email, пароль).
+        :return: Токен доступа.
+        '''
+        if self.bearer_auth is None:
+            raise ValueError('AsyncAuthAPI.authenticate requires a shared BearerAuth')
+        login_data = {
+            'email': user_creds[0],
+            'password': user_creds[1]
+        }
+
+        async def login():
+            response = (await self.login_user(login_data)).json()
+            if 'accessToken' not in response:
+                raise KeyError('token is missing')
+            return response['accessToken']
+
+        key = self.bearer_auth.provider.cache_key(self.base_url, *user_creds)
+        self.bearer_auth.set_credentials(key, login)
+        return await self.bearer_auth.provider.get_token_async(key, login)
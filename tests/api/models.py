@@ -0,0 +1,138 @@
+class Genre:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'Genre(name={self.name!r})'
+
+
+class Movie:
+    '''
+    Фильм из ответов /movies. Поля хранятся в __slots__, вложенные genre и reviews
+    превращаются в объекты только при первом обращении.
+    '''
+    __slots__ = ('id', 'name', 'price', 'description', 'image_url', 'location', 'published',
+                 'genre_id', 'created_at', 'rating', '_genre', '_reviews')
+
+    def __init__(self, data):
+        '''
+        :param data: Словарь фильма из JSON-ответа.
+        '''
+        self.id = data.get('id')
+        self.name = data.get('name')
+        self.price = data.get('price')
+        self.description = data.get('description')
+        self.image_url = data.get('imageUrl')
+        self.location = data.get('location')
+        self.published = data.get('published')
+        self.genre_id = data.get('genreId')
+        self.created_at = data.get('createdAt')
+        self.rating = data.get('rating')
+        self._genre = data.get('genre')
+        self._reviews = data.get('reviews')
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+    @property
+    def genre(self):
+        if isinstance(self._genre, dict):
+            self._genre = Genre(self._genre.get('name'))
+        return self._genre
+
+    @property
+    def reviews(self):
+        # Отзывы приходят только в GET /movies/{id}
+        return self._reviews
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'name': self.name,
+            'price': self.price,
+            'description': self.description,
+            'imageUrl': self.image_url,
+            'location': self.location,
+            'published': self.published,
+            'genreId': self.genre_id,
+            'createdAt': self.created_at,
+            'rating': self.rating,
+        }
+        genre = self._genre
+        data['genre'] = {'name': genre.name} if isinstance(genre, Genre) else genre
+        if self._reviews is not None:
+            data['reviews'] = self._reviews
+        return {key: value for key, value in data.items() if value is not None}
+
+    def __eq__(self, other):
+        return isinstance(other, Movie) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'Movie(id={self.id!r}, name={self.name!r})'
+
+
+class MoviePage:
+    '''
+    Страница GET /movies. Объекты Movie создаются при первом обращении к movies.
+    '''
+    __slots__ = ('count', 'page', 'page_size', 'page_count', '_movies')
+
+    def __init__(self, data):
+        self.count = data['count']
+        self.page = data['page']
+        self.page_size = data['pageSize']
+        self.page_count = data['pageCount']
+        self._movies = data['movies']
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+    @property
+    def movies(self):
+        if self._movies and isinstance(self._movies[0], dict):
+            self._movies = [Movie(movie) for movie in self._movies]
+        return self._movies
+
+    def __len__(self):
+        return len(self._movies)
+
+    def __iter__(self):
+        return iter(self.movies)
+
+
+class User:
+    __slots__ = ('id', 'email', 'full_name', 'roles')
+
+    def __init__(self, data):
+        self.id = data.get('id')
+        self.email = data.get('email')
+        self.full_name = data.get('fullName')
+        self.roles = data.get('roles', [])
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+    def __repr__(self):
+        return f'User(id={self.id!r}, email={self.email!r})'
+
+
+class AuthResult:
+    '''
+    Ответ POST /login.
+    '''
+    __slots__ = ('user', 'access_token', 'refresh_token', 'expires_in')
+
+    def __init__(self, data):
+        self.user = User(data['user'])
+        self.access_token = data['accessToken']
+        self.refresh_token = data.get('refreshToken')
+        self.expires_in = data.get('expiresIn')
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
@@ -1,40 +1,122 @@
-from constants import MOVIES_URL, MOVIES_ENDPOINT
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import MOVIES_URL, MOVIES_ENDPOINT, MOVIES_PAGE_SIZE
+from custom_requester.async_custom_requester import AsyncCustomRequester
+from custom_requester.batch import DEFAULT_BATCH_WORKERS, run_batch, run_batch_async
 from custom_requester.custom_requester import CustomRequester
+from custom_requester.json_backend import loads as json_loads
+from custom_requester.metrics import bind_calls
+from tests.api.models import Movie, MoviePage
+
+
+def _movies_of(page, wrap):
+    return page['movies'] if wrap is None else map(wrap, page['movies'])
 
 
 class MoviesApi(CustomRequester):
-    def __init__(self, session):
-        super().__init__(session=session, base_url = MOVIES_URL)
+    def __init__(self, session, auth=None, base_url=MOVIES_URL, middleware=None, cache=None):
+        super().__init__(session=session, base_url=base_url, auth=auth, middleware=middleware, cache=cache)
 
-    def get_all_movies(self, expected_status=200):
+    def get_all_movies(self, expected_status=200, schema=None, params=None, as_model=False):
         '''
-        Получение афиш фильмов.
+        Получение афиш фильмов (одна страница).
         :param expected_status: Ожидаемый статус-код.
+        :param schema: Имя JSON-схемы для валидации ответа (например, get_movies).
+        :param params: Query-параметры: page, pageSize, фильтры.
+        :param as_model: Вернуть MoviePage вместо ответа.
         '''
         return self.send_request(
             method='GET',
             endpoint=MOVIES_ENDPOINT,
-            expected_status=expected_status
+            expected_status=expected_status,
+            schema=schema,
+            params=params,
+            model=MoviePage if as_model else None
         )
 
-    def create_movie(self, movie_data, expected_status=201):
+    def get_movies_page(self, page, page_size=MOVIES_PAGE_SIZE, params=None):
+        '''
+        Получение одной страницы афиш.
+        :param page: Номер страницы (с 1).
+        :param page_size: Размер страницы.
+        :param params: Дополнительные query-параметры (фильтры).
+        '''
+        return self.get_all_movies(params={**(params or {}), 'page': page, 'pageSize': page_size})
+
+    def iter_pages(self, page_size=MOVIES_PAGE_SIZE, max_workers=1, params=None, start_page=1):
+        '''
+        Генератор страниц каталога: пары (номер страницы, разобранное тело страницы) по порядку.
+        В памяти держится не больше 2 * max_workers страниц одновременно.
+        :param page_size: Размер страницы.
+        :param max_workers: Сколько страниц запрашивать параллельно (1 - последовательно).
+        :param params: Дополнительные query-параметры (фильтры).
+        :param start_page: С какой страницы начать (для продолжения выгрузки).
+        '''
+        first_page = json_loads(self.get_movies_page(start_page, page_size, params).content)
+        page_count = first_page['pageCount']
+        yield start_page, first_page
+        del first_page
+
+        if max_workers <= 1:
+            for page in range(start_page + 1, page_count + 1):
+                yield page, json_loads(self.get_movies_page(page, page_size, params).content)
+            return
+
+        pages = iter(range(start_page + 1, page_count + 1))
+        fetch = bind_calls(self.get_movies_page)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            # Скользящее окно: следующая страница дозапрашивается, как только отдана текущая
+            window = deque((page, executor.submit(fetch, page, page_size, params))
+                           for _, page in zip(range(max_workers * 2), pages))
+            while window:
+                page, future = window.popleft()
+                response = future.result()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    window.append((next_page, executor.submit(fetch, next_page, page_size, params)))
+                yield page, json_loads(response.content)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_all_movies(self, page_size=MOVIES_PAGE_SIZE, max_workers=1, params=None, as_model=False):
+        '''
+        Генератор по всему каталогу фильмов, страница за страницей (см. iter_pages).
+        :param page_size: Размер страницы.
+        :param max_workers: Сколько страниц запрашивать параллельно (1 - последовательно).
+        :param params: Дополнительные query-параметры (фильтры).
+        :param as_model: Отдавать Movie вместо словарей.
+        '''
+        wrap = Movie if as_model else None
+        for _, page in self.iter_pages(page_size, max_workers, params):
+            yield from _movies_of(page, wrap)
+
+    def create_movie(self, movie_data, expected_status=201, schema=None, as_model=False):
         '''
         :param movie_data: Данные о фильме
         :param expected_status: Ожидаемый статус-код
+        :param schema: Имя JSON-схемы для валидации ответа (например, post_movie)
+        :param as_model: Вернуть Movie вместо ответа
         :return:
         '''
         return self.send_request(
             method='POST',
             endpoint=MOVIES_ENDPOINT,
             data=movie_data,
-            expected_status=expected_status
+            expected_status=expected_status,
+            schema=schema,
+            model=Movie if as_model else None
         )
 
-    def get_movie_by_id(self, movie_id, expected_status=200):
+    def get_movie_by_id(self, movie_id, expected_status=200, schema=None, as_model=False):
         return self.send_request(
             method='GET',
             endpoint=f'{MOVIES_ENDPOINT}/{movie_id}',
-            expected_status=expected_status
+            expected_status=expected_status,
+            schema=schema,
+            model=Movie if as_model else None
         )
 
     # def update_movie(self, movie_id, movie_data, expected_status=200):
@@ -45,17 +127,98 @@ class MoviesApi(CustomRequester):
     #         expected_status=expected_status
     #     )
 
-    def update_movie(self, movie_id, movie_data, expected_status=200):
+    def update_movie(self, movie_id, movie_data, expected_status=200, as_model=False):
         return self.send_request(
             method='PATCH',
             endpoint=f'{MOVIES_ENDPOINT}/{movie_id}',
             data=movie_data,
-            expected_status=expected_status
+            expected_status=expected_status,
+            model=Movie if as_model else None
         )
 
-    def delete_movie(self, movie_id, expected_status=204):
+    def delete_movie(self, movie_id, expected_status=204, schema=None):
         return self.send_request(
             method='DELETE',
             endpoint=f'{MOVIES_ENDPOINT}/{movie_id}',
-            expected_status=expected_status
-        )
\ No newline at end of file
+            expected_status=expected_status,
+            schema=schema
+        )
+
+    # Пакетные операции. Bulk-эндпоинтов у Cinescope нет, поэтому пакет - это
+    # параллельные одиночные запросы с ограничением max_workers.
+    _run_batch = staticmethod(run_batch)
+
+    def create_movies(self, movies_data, max_workers=DEFAULT_BATCH_WORKERS, as_model=False):
+        '''
+        Создание нескольких фильмов.
+        :param movies_data: Список данных фильмов.
+        :param max_workers: Максимум одновременных запросов.
+        :param as_model: Класть в результат Movie вместо ответа.
+        :return: Список BatchResult в порядке movies_data.
+        '''
+        return self._run_batch(lambda data: self.create_movie(data, as_model=as_model),
+                               movies_data, max_workers)
+
+    def get_movies_by_ids(self, movie_ids, max_workers=DEFAULT_BATCH_WORKERS, as_model=False):
+        '''
+        Получение нескольких фильмов по id. Несуществующие попадают в error (404).
+        :param movie_ids: Список id фильмов.
+        :param max_workers: Максимум одновременных запросов.
+        :param as_model: Класть в результат Movie вместо ответа.
+        :return: Список BatchResult в порядке movie_ids.
+        '''
+        return self._run_batch(lambda movie_id: self.get_movie_by_id(movie_id, as_model=as_model),
+                               movie_ids, max_workers)
+
+    def delete_movies(self, movie_ids, max_workers=DEFAULT_BATCH_WORKERS, expected_status=204,
+                      missing_ok=False):
+        '''
+        Удаление нескольких фильмов.
+        :param movie_ids: Список id фильмов.
+        :param max_workers: Максимум одновременных запросов.
+        :param expected_status: Ожидаемый статус-код удаления.
+        :param missing_ok: Не считать ошибкой уже удалённые фильмы (404).
+        :return: Список BatchResult в порядке movie_ids.
+        '''
+        return self._run_batch(lambda movie_id: self.delete_movie(movie_id, expected_status=expected_status),
+                               movie_ids, max_workers, missing_ok)
+
+
+class AsyncMoviesApi(MoviesApi, AsyncCustomRequester):
+    '''
+    Асинхронная версия MoviesApi: методы те же, но возвращают корутины.
+    '''
+    _run_batch = staticmethod(run_batch_async)
+
+    async def iter_pages(self, page_size=MOVIES_PAGE_SIZE, max_workers=1, params=None, start_page=1):
+        '''
+        Асинхронный генератор страниц каталога: пары (номер страницы, разобранное тело страницы) по порядку.
+        :param page_size: Размер страницы.
+        :param max_workers: Сколько страниц запрашивать одновременно.
+        :param params: Дополнительные query-параметры (фильтры).
+        :param start_page: С какой страницы начать.
+        '''
+        first_page = json_loads((await self.get_movies_page(start_page, page_size, params)).content)
+        page_count = first_page['pageCount']
+        yield start_page, first_page
+        del first_page
+
+        step = max(max_workers, 1)
+        for start in range(start_page + 1, page_count + 1, step):
+            pages = range(start, min(start + step, page_count + 1))
+            responses = await asyncio.gather(*(self.get_movies_page(page, page_size, params) for page in pages))
+            for page, response in zip(pages, responses):
+                yield page, json_loads(response.content)
+
+    async def iter_all_movies(self, page_size=MOVIES_PAGE_SIZE, max_workers=1, params=None, as_model=False):
+        '''
+        Асинхронный генератор по всему каталогу фильмов (см. iter_pages).
+        :param page_size: Размер страницы.
+        :param max_workers: Сколько страниц запрашивать одновременно.
+        :param params: Дополнительные query-параметры (фильтры).
+        :param as_model: Отдавать Movie вместо словарей.
+        '''
+        wrap = Movie if as_model else None
+        async for _, page in self.iter_pages(page_size, max_workers, params):
+            for movie in _movies_of(page, wrap):
+                yield movie
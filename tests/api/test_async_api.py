@@ -0,0 +1,65 @@
+import anyio
+import pytest
+
+from utils.data_generator import DataGenerator
+
+
+@pytest.mark.anyio
+class TestAsyncMoviesAPI:
+    async def test_get_movies_concurrently(self, async_api_manager):
+        """
+        Параллельное получение списка фильмов из одного процесса
+        """
+        results = []
+
+        async def fetch():
+            response = await async_api_manager.movies_api.get_all_movies(expected_status=200)
+            results.append(response.json())
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(10):
+                tg.start_soon(fetch)
+
+        assert len(results) == 10
+        for body in results:
+            assert isinstance(body['movies'], list), 'Ответ должен быть списком'
+
+    async def test_movie_crud_concurrently(self, async_api_manager, async_admin_auth):
+        '''
+        Параллельное создание, получение и удаление нескольких фильмов
+        '''
+        movies_api = async_api_manager.movies_api
+        created = []
+
+        async def crud(movie_data):
+            movie = (await movies_api.create_movie(movie_data, expected_status=201)).json()
+            created.append(movie['id'])
+            fetched = (await movies_api.get_movie_by_id(movie['id'], expected_status=200)).json()
+            assert fetched['name'] == movie_data['name']
+            await movies_api.delete_movie(movie['id'], expected_status=200)
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(5):
+                tg.start_soon(crud, DataGenerator.generate_movie_data())
+
+        assert len(created) == 5
+
+    async def test_unexpected_status_raises(self, async_api_manager):
+        '''
+        Семантика expected_status такая же, как у синхронного клиента
+        '''
+        with pytest.raises(ValueError):
+            await async_api_manager.auth_api.login_user({'email': '', 'password': ''},
+                                                        expected_status=200)
+
+    async def test_auth_per_request_and_pages(self, async_api_manager, async_admin_auth):
+        '''
+        Токен подставляется в каждый запрос, а не в заголовки общего клиента; страницы каталога
+        обходятся асинхронным iter_pages
+        '''
+        assert 'Authorization' not in async_api_manager.session.headers
+        assert await async_api_manager.auth_api.bearer_auth.auth_headers_async()
+        pages = [page async for page, _ in async_api_manager.movies_api.iter_pages(page_size=5, max_workers=3)]
+        assert pages == list(range(1, len(pages) + 1))
+        movies = [movie async for movie in async_api_manager.movies_api.iter_all_movies(page_size=5, max_workers=3)]
+        assert len({movie['id'] for movie in movies}) == len(movies) > 0
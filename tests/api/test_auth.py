@@ -1,5 +1,7 @@
-from conftest import api_manager
+import pytest
+
 from constants import LOGIN_ENDPOINT
+from custom_requester.token_provider import BearerAuth, TokenProvider
 from tests.api.api_manager import ApiManager
 
 
@@ -66,3 +68,47 @@ class TestAuthAPI:
         assert "error" in response.json() or "message" in response.json(), \
             "В ответе нет информации об ошибке"
 
+    def test_authenticate_reuses_cached_token(self, api_manager, session, registered_user, tmp_path):
+        '''
+        Повторная авторизация с теми же данными берёт токен из файлового кэша,
+        заголовки общей сессии при этом не меняются
+        '''
+        _, test_user_with_id = registered_user
+        creds = (test_user_with_id['email'], test_user_with_id['password'])
+        cache_path = str(tmp_path / 'tokens.json')
+        base_url = api_manager.auth_api.base_url
+
+        first_token = ApiManager(session, auth=BearerAuth(TokenProvider(cache_path)), base_url=base_url) \
+            .auth_api.authenticate(creds)
+        second_token = ApiManager(session, auth=BearerAuth(TokenProvider(cache_path)), base_url=base_url) \
+            .auth_api.authenticate(creds)
+
+        assert first_token == second_token, "Токен должен браться из кэша без повторного логина"
+        assert 'Authorization' not in session.headers, "Общая сессия не должна меняться"
+
+    def test_relogin_after_rejected_token(self, api_manager, session, registered_user, tmp_path):
+        '''
+        Отвергнутый сервером токен (401) сбрасывается из кэша, запрос повторяется после нового логина
+        '''
+        _, test_user_with_id = registered_user
+        manager = ApiManager(session, auth=BearerAuth(TokenProvider(str(tmp_path / 'tokens.json'))),
+                             base_url=api_manager.auth_api.base_url)
+        manager.auth_api.authenticate((test_user_with_id['email'], test_user_with_id['password']))
+        auth = manager.auth
+        # Токен, который сервер не примет: как после отзыва или смены ключа подписи
+        auth.provider._tokens[auth.key]['token'] = 'rejected'
+
+        response = manager.user_api.get_user_info(test_user_with_id['id'])
+
+        assert response.json()['email'] == test_user_with_id['email']
+        assert auth.token() != 'rejected', "Отвергнутый токен должен быть заменён"
+
+    @pytest.mark.perf_budget(calls=1, endpoints={'POST /login': 2.0}, samples=3)
+    def test_login_pooled_user(self, api_manager, pooled_user):
+        '''
+        Пользователь из пула логинится без повторной регистрации (медиана трёх логинов в бюджете)
+        '''
+        result = api_manager.auth_api.login_user(pooled_user.login_data(), as_model=True)
+
+        assert result.access_token, "Токен доступа отсутствует в ответе"
+        assert result.user.email == pooled_user.email, "Email не совпадает"
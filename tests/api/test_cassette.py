@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from custom_requester.cassette import Cassette, CassetteMissError, merge_worker_cassettes, worker_cassette_path
+
+
+def _record(path, nodeid, exchanges):
+    cassette = Cassette(path, 'record')
+    cassette.begin_test(nodeid)
+    for method, endpoint, params, data, status, body in exchanges:
+        cassette.record(method, endpoint, params, data, status,
+                        {'Content-Type': 'application/json', 'Authorization': 'Bearer secret'}, body)
+    cassette.end_test()
+    cassette.close()
+
+
+class TestCassette:
+    def test_record_and_replay(self, tmp_path):
+        '''
+        Ответы находятся по пути и телу, при другом id - по шаблону пути, в другом тесте - по всей кассете;
+        заголовок Authorization не сохраняется
+        '''
+        path = str(tmp_path / 'api.cassette')
+        _record(path, 'test_a', [
+            ('POST', '/movies', None, {'name': 'A', 'price': 1}, 201, b'{"id": 1}'),
+            ('GET', '/movies/1', None, None, 200, b'{"id": 1, "name": "A"}'),
+            ('GET', '/movies', {'page': 2, 'pageSize': 5}, None, 200, b'{"page": 2}'),
+        ])
+        assert 'secret' not in open(path, encoding='utf-8').read()
+
+        cassette = Cassette(path, 'replay')
+        try:
+            cassette.begin_test('test_a')
+            # Порядок ключей тела и query не важен
+            assert cassette.replay('POST', '/movies', data={'price': 1, 'name': 'A'})['s'] == 201
+            assert cassette.replay('GET', '/movies', params={'pageSize': 5, 'page': 2})['b'] == '{"page": 2}'
+            assert cassette.replay('GET', '/movies/77')['b'] == '{"id": 1, "name": "A"}'
+            cassette.end_test()
+
+            cassette.begin_test('test_other')
+            assert cassette.replay('GET', '/movies/5')['hd'] == {'Content-Type': 'application/json'}
+            with pytest.raises(CassetteMissError):
+                cassette.replay('DELETE', '/users/1')
+        finally:
+            cassette.close()
+
+    def test_merge_worker_cassettes(self, tmp_path):
+        '''
+        Файлы воркеров xdist склеиваются в одну кассету и удаляются
+        '''
+        path = str(tmp_path / 'api.cassette')
+        _record(worker_cassette_path(path, 'gw0'), 'test_a', [('GET', '/movies/1', None, None, 200, b'{}')])
+        _record(worker_cassette_path(path, 'gw1'), 'test_b', [('GET', '/movies/2', None, None, 404, b'{}')])
+
+        assert merge_worker_cassettes(path) == 2
+        assert os.listdir(tmp_path) == ['api.cassette']
+        cassette = Cassette(path, 'replay')
+        try:
+            cassette.begin_test('test_b')
+            assert cassette.replay('GET', '/movies/2')['s'] == 404
+        finally:
+            cassette.close()
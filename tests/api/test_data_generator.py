@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from utils.data_generator import DataGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestDataGenerator:
+    def test_batches_are_unique(self):
+        '''
+        Email-ы и названия фильмов не повторяются между пакетами, в том числе с одним и тем же seed
+        '''
+        users = DataGenerator.generate_users(300, seed=1) + DataGenerator.generate_users(300, seed=1) \
+            + DataGenerator.generate_users(300)
+        assert len({user['email'] for user in users}) == len(users)
+        movies = DataGenerator.generate_movies(300, seed=1) + DataGenerator.generate_movies(300, seed=1)
+        assert len({movie['name'] for movie in movies}) == len(movies)
+
+    def test_seed_reproduces_batches(self):
+        '''
+        Одинаковый seed - одинаковые данные, кроме уникального суффикса email и названия
+        '''
+        def without_suffix(items, key):
+            return [{**item, key: item[key].rsplit('-', 1)[0]} for item in items]
+
+        first, second = DataGenerator.generate_users(20, seed=42), DataGenerator.generate_users(20, seed=42)
+        assert without_suffix(first, 'email') == without_suffix(second, 'email')
+        assert [user['password'] for user in first] != [user['password'] for user in
+                                                        DataGenerator.generate_users(20, seed=43)]
+
+        first, second = DataGenerator.generate_movies(20, seed=42), DataGenerator.generate_movies(20, seed=42)
+        assert without_suffix(first, 'name') == without_suffix(second, 'name')
+        assert first != second
+
+    def test_seed_reproduces_across_processes(self):
+        '''
+        Seed воспроизводит данные и в другом процессе - при любом PYTHONHASHSEED
+        '''
+        code = ("from utils.data_generator import DataGenerator; "
+                "print([movie['name'].rsplit(' ', 1)[0] for movie in DataGenerator.generate_movies(5, seed=42)])")
+
+        def run(hash_seed):
+            return subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True,
+                                  env={**os.environ, 'PYTHONHASHSEED': hash_seed}).stdout
+
+        assert run('1') == run('2')
@@ -0,0 +1,33 @@
+import pytest
+
+from custom_requester.token_provider import BearerAuth, TokenProvider
+from custom_requester.transport import build_session
+from tests.api.api_manager import ApiManager
+from utils.load_runner import SCENARIOS, LoadRunner
+
+
+class TestLoadRunner:
+    def test_movie_crud_against_stub(self, stub_server, admin_creds):
+        '''
+        Короткий нагрузочный прогон по расписанию: итерации без ошибок, сбой setup попадает в отчёт
+        '''
+        if stub_server is None:
+            pytest.skip('Нагрузочный прогон в тестах только против --stub')
+
+        def factory():
+            return ApiManager(build_session(), auth=BearerAuth(TokenProvider(cache_path=None)),
+                              base_url=stub_server.base_url, movies_url=stub_server.base_url)
+
+        runner = LoadRunner(SCENARIOS['movie_crud'], concurrency=2, rps=10, duration=1,
+                            api_manager_factory=factory, credentials=admin_creds)
+        report = runner.report(runner.run())
+        assert runner.iterations >= 5, report
+        assert runner.iteration_stats.histogram.count == runner.iterations, report
+        assert not any(stats.errors for stats in runner.stats.values()), report
+        assert runner.setup_stats.errors == runner.cleanup_stats.errors == 0, report
+
+        failing = LoadRunner(SCENARIOS['movie_crud'], concurrency=2, duration=0.2, api_manager_factory=factory,
+                             credentials=(admin_creds[0], 'wrong password'))
+        report = failing.report(failing.run())
+        assert failing.setup_stats.errors == 2 and failing.iterations == 0
+        assert 'setup failed in 2 of 2 workers' in report
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from custom_requester.metrics import PRECISION_BITS, LatencyHistogram, LatencyRegistry, endpoint_template
+from custom_requester.transport import TransportStats, build_session, transport_stats
+
+
+class TestLatencyMetrics:
+    def test_histogram_bucket_error_bound(self):
+        '''
+        Середина корзины отличается от значения не больше чем на 1 / 2**PRECISION_BITS
+        '''
+        rng = random.Random(1)
+        for value in [0, 1, 127, 128, 129, 255, 256] + [rng.randint(1, 10 ** 9) for _ in range(5000)]:
+            approx = LatencyHistogram._bucket_value(LatencyHistogram._bucket(value))
+            assert abs(approx - value) <= max(value, 1) / 2 ** PRECISION_BITS, value
+
+    def test_histogram_percentiles_and_merge(self):
+        '''
+        Перцентили равномерного ряда 1..1000 мс - с точностью корзины; слияние равно общей записи
+        '''
+        values = [ms / 1000 for ms in range(1, 1001)]
+        whole, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for index, value in enumerate(values):
+            whole.record(value)
+            (first if index % 2 else second).record(value)
+        for percent, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            assert abs(whole.percentile(percent) - expected) <= expected / 2 ** PRECISION_BITS
+        assert whole.percentile(100) == whole.summary()['max'] == 1.0
+
+        first.merge(second)
+        assert (first.counts, first.count, first.total, first.max) == \
+               (whole.counts, whole.count, whole.total, whole.max)
+        assert LatencyHistogram().percentile(50) == 0.0
+
+    def test_registry_snapshot_merge(self):
+        '''
+        Гистограммы воркера xdist переносятся через snapshot без потери корзин
+        '''
+        worker, controller = LatencyRegistry(), LatencyRegistry()
+        for ms in (5, 10, 20):
+            worker.record('GET', '/movies/42', ms / 1000)
+        controller.record('GET', '/movies/7', 0.040)
+        controller.merge_snapshot(worker.snapshot())
+        summary = controller.summaries()['GET /movies/{id}']
+        assert controller.total == summary['count'] == 4
+        assert summary['max'] == 0.040
+        assert endpoint_template('/users/3fa85f64-5717-4562-b3fc-2c963f66afa6?x=1') == '/users/{id}'
+
+
+class TestTransportStats:
+    def test_report_and_merge(self):
+        '''
+        Переиспользованные соединения - разница запросов и открытых соединений; счётчики воркеров суммируются
+        '''
+        stats, other = TransportStats(), TransportStats()
+        for _ in range(5):
+            stats.record_request('api.local')
+        stats.record_connection('api.local', 0.010, 0.020)
+        other.record_request('api.local')
+        other.record_connection('api.local', 0.005, 0.0)
+        stats.merge_snapshot(other.snapshot())
+        assert stats.hosts['api.local'] == {'requests': 6, 'opened': 2, 'connect_time': 0.015, 'tls_time': 0.02}
+        row = stats.report().splitlines()[1].split()
+        assert row[:4] == ['api.local', '6', '2', '4']
+
+    def test_keep_alive_reuses_connection(self, stub_server):
+        '''
+        Запросы одной сессии к заглушке идут по одному keep-alive соединению
+        '''
+        if stub_server is None:
+            pytest.skip('Счётчики соединений проверяются против --stub')
+        session = build_session()
+        host = '127.0.0.1'
+        before = dict(transport_stats.hosts.get(host, {'requests': 0, 'opened': 0}))
+        for _ in range(3):
+            session.get(f'{stub_server.base_url}/movies', params={'pageSize': 1}).raise_for_status()
+        session.close()
+        after = transport_stats.hosts[host]
+        assert after['requests'] - before['requests'] == 3
+        assert after['opened'] - before['opened'] == 1
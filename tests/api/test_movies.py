@@ -1,20 +1,33 @@
-import json
 import os
 import random
+from itertools import islice
+from urllib.parse import urlsplit
 
+import pytest
 import requests
-from jsonschema import validate
 
-from constants import MOVIES_URL, MOVIES_ENDPOINT, HEADERS
+from custom_requester.http_cache import ResponseCache, http_cache_stats
+from custom_requester.json_backend import dumps
+from custom_requester.middleware import CircuitBreaker, CircuitOpenError, MiddlewareChain, RetryMiddleware, \
+    middleware_stats
+from tests.api.models import Movie, MoviePage
+from tests.api.movies_api import MoviesApi
+from utils.catalogue_diff import diff_snapshots
+from utils.catalogue_export import checkpoint_path, export_catalogue
 from utils.data_generator import DataGenerator
+from utils.schema_registry import schema_registry
+from utils.soak_checker import SoakChecker, analyze
 
 
 class TestMoviesAPI:
+    @pytest.mark.perf_budget(total=3.0, calls=1, endpoints={'GET /movies': 2.0})
     def test_get_movies(self, api_manager):
         """
         Тест на получение списка фильмов
         """
-        response = api_manager.movies_api.get_all_movies(expected_status=200)
+        # Валидация ответа от сервера по схеме get_movies
+        response = api_manager.movies_api.get_all_movies(expected_status=200,
+                                                         schema='get_movies')
         body=response.json()
 
         assert isinstance(body['movies'], list), 'Ответ должен быть списком'
@@ -22,16 +35,19 @@ class TestMoviesAPI:
         assert 'id' in body['movies'][0], "у фильма должен быть id"
         assert 'name' in body['movies'][0], 'у фильма должно быть название'
 
-        # Валидация ответа от сервера
-        schema_path = os.path.join(os.path.dirname(__file__),
-                                   "../..",
-                                   'schemas',
-                                   'get_movies.json')
-        with open(schema_path) as file:
-            schema = json.load(file)
-        validate(response.json(), schema)  # Валидация ответа от сервера
+    def test_iter_all_movies(self, api_manager):
+        """
+        Постраничный обход каталога: параллельный режим отдаёт фильмы в том же порядке
+        """
+        movies_api = api_manager.movies_api
+        sequential = [movie['id'] for movie in islice(movies_api.iter_all_movies(page_size=10), 50)]
+        parallel = [movie['id'] for movie in islice(movies_api.iter_all_movies(page_size=10,
+                                                                                max_workers=4), 50)]
 
+        assert sequential == parallel, 'Порядок фильмов не должен зависеть от параллельности'
+        assert len(set(sequential)) == len(sequential), 'Фильмы на страницах не должны повторяться'
 
+    @pytest.mark.perf_budget(calls=1, endpoints={'POST /movies': 2.0}, setup=True)
     def test_create_movie(self, created_movie, admin_auth):
         '''
         Тест на создание нового фильма
@@ -40,14 +56,14 @@ class TestMoviesAPI:
         assert movie['name'] == payload['name']
         assert 'id' in movie
 
-        # Валидация ответа от сервера
-        schema_path = os.path.join(os.path.dirname(__file__),
-                                   "../..",
-                                   'schemas',
-                                   'post_movie.json')
-        with open(schema_path) as file:
-            schema = json.load(file)
-        validate(movie, schema)  # Валидация ответа от сервера
+        schema_registry.validate(movie, 'post_movie')  # Валидация ответа от сервера
+
+    def test_create_movie_non_object_body(self, api_manager, admin_auth):
+        '''
+        Тело-массив вместо объекта - ошибка валидации, а не падение сервера
+        '''
+        response = api_manager.movies_api.create_movie([], expected_status=400)
+        assert response.json()['statusCode'] == 400
 
 
     def test_get_movie_by_id(self, api_manager, created_movie, admin_auth):
@@ -57,19 +73,12 @@ class TestMoviesAPI:
 
         movie, _ = created_movie
         movie_id = movie['id']
-        response = api_manager.movies_api.get_movie_by_id(movie_id, expected_status=200)
-        assert response.json()['id'] == movie['id']
-        assert response.json()['name'] == movie['name']
-        assert response.json()['description'] == movie['description']
-
-        # Валидация ответа от сервера
-        schema_path = os.path.join(os.path.dirname(__file__),
-                                   "../..",
-                                   'schemas',
-                                   'get_new_movie_by_id.json')
-        with open(schema_path) as file:
-            schema = json.load(file)
-        validate(response.json(), schema)  # Валидация ответа от сервера
+        # Валидация ответа от сервера по схеме get_new_movie_by_id
+        fetched = api_manager.movies_api.get_movie_by_id(movie_id, expected_status=200,
+                                                         schema='get_new_movie_by_id', as_model=True)
+        assert fetched.id == movie['id']
+        assert fetched.name == movie['name']
+        assert fetched.description == movie['description']
 
 
     def test_update_movie(self, api_manager, admin_auth, created_movie):
@@ -85,15 +94,15 @@ class TestMoviesAPI:
             'price': payload['price'] + random.randint(100,500)
         }
 
-        response = api_manager.movies_api.update_movie(movie_id,
-                                                       movie_data=updated_movie_payload,
-                                                       expected_status=200)
+        updated = api_manager.movies_api.update_movie(movie_id,
+                                                      movie_data=updated_movie_payload,
+                                                      expected_status=200,
+                                                      as_model=True)
 
-        assert response.status_code == 200, "Обновление инфы через PUT не удалось"
-        assert response.json()['id'] == movie_id
-        assert updated_movie_payload['name'] == response.json()['name']
-        assert updated_movie_payload['description'] == response.json()['description']
-        assert updated_movie_payload['price'] == response.json()['price']
+        assert updated.id == movie_id
+        assert updated_movie_payload['name'] == updated.name
+        assert updated_movie_payload['description'] == updated.description
+        assert updated_movie_payload['price'] == updated.price
 
     def test_delete_movie_by_id(self, api_manager, admin_auth, created_movie):
         '''
@@ -103,28 +112,21 @@ class TestMoviesAPI:
         movie, payload = created_movie
         movie_id = movie['id']
 
-        response = api_manager.movies_api.delete_movie(movie_id, expected_status=200)
+        # Валидация ответа от сервера по схеме delete_movie
+        api_manager.movies_api.delete_movie(movie_id, expected_status=200,
+                                            schema='delete_movie')
 
-        # Валидация ответа от сервера
-        schema_path = os.path.join(os.path.dirname(__file__),
-                                   "../..",
-                                   'schemas',
-                                   'delete_movie.json')
-        with open(schema_path) as file:
-            schema = json.load(file)
-        validate(response.json(), schema)  # Валидация ответа от сервера
 
-
-    def test_delete_without_auth(self, admin_auth, created_movie):
+    def test_delete_without_auth(self, api_manager, admin_auth, created_movie):
         '''
         Проверка на удаление без авторизации
         '''
         movie, payload = created_movie
         movie_id = movie['id']
 
-        session = requests.Session()
-        response = session.delete(f'{MOVIES_URL}{MOVIES_ENDPOINT}/{movie_id}',
-                                  headers=HEADERS)
+        # Отдельная сессия и клиент без токена
+        movies_api = MoviesApi(requests.Session(), base_url=api_manager.movies_api.base_url)
+        response = movies_api.delete_movie(movie_id, expected_status=401)
         assert response.status_code == 401, ("Не должно допустить удаление без "
                                              "авторизации")
 
@@ -158,8 +160,149 @@ class TestMoviesAPI:
         assert "error" in response.json() or "message" in response.json(), ("В ответе должно быть "
                                                          "описаниешибки")
 
+    def test_movie_factory_bulk_create(self, api_manager, movie_factory):
+        '''
+        Параллельное создание нескольких фильмов через фабрику
+        '''
+        created = movie_factory.create(5, location='SPB')
 
+        assert len({movie['id'] for movie, _ in created}) == 5, 'У фильмов должны быть разные id'
+        for movie, payload in created:
+            response = api_manager.movies_api.get_movie_by_id(movie['id'], expected_status=200)
+            assert response.json()['name'] == payload['name']
+            assert response.json()['location'] == 'SPB'
 
+    def test_movie_page_model(self, api_manager):
+        '''
+        Страница афиш разбирается в MoviePage с объектами Movie
+        '''
+        page = api_manager.movies_api.get_all_movies(params={'pageSize': 5}, as_model=True)
+        assert isinstance(page, MoviePage)
+        assert len(page) <= 5
+        for movie in page:
+            assert isinstance(movie, Movie)
+            assert Movie.from_dict(movie.to_dict()) == movie
+
+    def test_batch_get_and_delete(self, api_manager, admin_auth, movie_factory):
+        '''
+        Пакетные операции возвращают результаты в порядке входных id
+        '''
+        movies_api = api_manager.movies_api
+        movie_ids = [movie['id'] for movie, _ in movie_factory.create(3)]
+        missing_id = 999999999
 
+        fetched = movies_api.get_movies_by_ids(movie_ids + [missing_id], as_model=True)
+        assert [result.value.id for result in fetched[:3]] == movie_ids
+        assert fetched[3].error.response.status_code == 404
 
+        deleted = movies_api.delete_movies(movie_ids + [missing_id], expected_status=200, missing_ok=True)
+        assert all(result.ok for result in deleted)
+        assert not any(result.ok for result in movies_api.get_movies_by_ids(movie_ids))
 
+    def test_retry_and_circuit_breaker_on_503(self, api_manager, stub_server):
+        '''
+        Повторы переживают случайные 503, а при постоянных 503 circuit breaker отказывает сразу
+        '''
+        if stub_server is None:
+            pytest.skip('Внедрение ошибок доступно только с --stub')
+        base_url = api_manager.movies_api.base_url
+        faults = stub_server.faults
+        retrying = MoviesApi(api_manager.session, base_url=base_url,
+                             middleware=MiddlewareChain([RetryMiddleware(max_retries=30, backoff=0.001)]))
+        breaking = MoviesApi(api_manager.session, base_url=base_url,
+                             middleware=MiddlewareChain([CircuitBreaker(failure_threshold=2, reset_timeout=60)]))
+        host = urlsplit(base_url).netloc
+        retries_before = middleware_stats.hosts.get(host, {}).get('retries', 0)
+        faults.retry_after, faults.error_rate = 0, 0.5
+        try:
+            for _ in range(20):
+                retrying.get_all_movies(params={'pageSize': 1})
+            assert middleware_stats.hosts[host]['retries'] > retries_before
+
+            faults.error_rate = 1.0
+            for _ in range(2):
+                breaking.get_all_movies(expected_status=503)
+            with pytest.raises(CircuitOpenError):
+                breaking.get_all_movies()
+        finally:
+            faults.retry_after, faults.error_rate = 1, 0.0
+
+    def test_http_cache_revalidation(self, api_manager, admin_auth, created_movie, stub_server):
+        '''
+        Повторный GET отдаётся из кэша, PATCH сбрасывает запись, устаревшая запись перепроверяется по ETag
+        '''
+        movie_id = created_movie[0]['id']
+        cached = MoviesApi(api_manager.session, auth=api_manager.auth, base_url=api_manager.movies_api.base_url,
+                           cache=ResponseCache(ttl=60))
+        before = dict(http_cache_stats.counts)
+
+        first = cached.get_movie_by_id(movie_id)
+        assert cached.get_movie_by_id(movie_id) is first
+        assert http_cache_stats.counts['hits'] == before['hits'] + 1
+
+        cached.update_movie(movie_id, {'description': 'Cached and invalidated'})
+        assert http_cache_stats.counts['invalidated'] > before['invalidated']
+        assert cached.get_movie_by_id(movie_id).json()['description'] == 'Cached and invalidated'
+
+        if stub_server is None:
+            return  # ETag отдаёт заглушка, у реального сервиса его может не быть
+        cached.cache.ttl = 0
+        assert cached.get_movie_by_id(movie_id).json()['description'] == 'Cached and invalidated'
+        assert http_cache_stats.counts['revalidated'] == before['revalidated'] + 1
+
+    def test_catalogue_export_and_diff(self, api_manager, stub_server, tmp_path):
+        '''
+        Выгрузка каталога в оба формата даёт одинаковые снимки, продолжение с контрольной точки - тоже
+        '''
+        if stub_server is None:
+            pytest.skip('Полный обход каталога несколько раз - только против --stub')
+        movies_api = api_manager.movies_api
+        ndjson = str(tmp_path / 'catalogue.ndjson')
+        columnar = str(tmp_path / 'catalogue.colz')
+
+        rows = export_catalogue(movies_api, ndjson, page_size=5, max_workers=3)
+        assert rows == sum(1 for _ in movies_api.iter_all_movies(page_size=5))
+        assert export_catalogue(movies_api, columnar, 'columnar', page_size=5, max_workers=3, chunk_rows=7) == rows
+        assert diff_snapshots(ndjson, columnar).identical
+
+        # Контрольная точка после первой страницы: продолжение дописывает остальные
+        with open(ndjson, 'rb') as file:
+            offset = sum(len(line) for line in file.readlines()[:5])
+        with open(checkpoint_path(ndjson), 'wb') as file:
+            file.write(dumps({'format': 'ndjson', 'page_size': 5, 'params': {}, 'page': 1, 'rows': 5,
+                              'offset': offset}))
+        assert export_catalogue(movies_api, ndjson, page_size=5, resume=True) == rows
+        assert diff_snapshots(ndjson, columnar).identical
+
+        # Файл выгрузки удалён, контрольная точка осталась: выгрузка начинается заново
+        with open(checkpoint_path(ndjson), 'wb') as file:
+            file.write(dumps({'format': 'ndjson', 'page_size': 5, 'params': {}, 'page': 1, 'rows': 5,
+                              'offset': offset}))
+        os.remove(ndjson)
+        assert export_catalogue(movies_api, ndjson, page_size=5, resume=True) == rows
+        assert diff_snapshots(ndjson, columnar).identical
+        assert not os.path.exists(checkpoint_path(ndjson))
+
+    def test_soak_read_after_write(self, api_manager, admin_auth, stub_server):
+        '''
+        Короткий soak-прогон: ни устаревших чтений, ни потерянных обновлений
+        '''
+        if stub_server is None:
+            pytest.skip('Нагрузка писателей и читателей на общем окружении - только против --stub')
+        report = SoakChecker(api_manager.movies_api, writers=2, readers=4, movies_per_writer=1, duration=1).run()
+        assert report.writes and report.reads
+        assert report.ok, report.format()
+
+        # Проверка самого анализатора: чтение v1 после подтверждения v2 - устаревшее
+        history = [('write', 1, 1, 0.0, 1.0, None), ('write', 1, 2, 1.0, 2.0, None),
+                   ('read', 1, 1, 3.0, 4.0, None)]
+        stale = analyze(history, {1: 2})
+        assert stale.stale_reads == [(1, 1, 2)] and not stale.lost_updates
+        # v1 впервые прочитана в 4.0 (через 3 с после подтверждения), v2 не прочитана ни разу
+        assert stale.lag.count == 1 and stale.lag.max == 3_000_000
+
+        # Задержка - до первого чтения новой версии; несостоявшееся итоговое чтение - не потерянное обновление
+        history.append(('read', 1, 2, 5.0, 6.0, None))
+        report = analyze(history, {})
+        assert report.lag.count == 2 and report.lag.max == 4_000_000
+        assert report.final_read_failures == [1] and not report.lost_updates and not report.ok
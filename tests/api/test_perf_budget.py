@@ -0,0 +1,39 @@
+import threading
+
+from custom_requester.batch import run_batch
+from custom_requester.metrics import call_recorder
+from utils.perf_budget import PerfBudget
+
+
+class TestPerfBudget:
+    def test_perf_budget_check(self):
+        '''
+        Бюджет сравнивает медиану замеров: один медленный прогон из трёх не нарушение, два - нарушение
+        '''
+        budget = PerfBudget(total=1.0, calls=2, endpoints={'POST /login': 0.5})
+        fast, slow = [('POST', '/login', 0.1)], [('POST', '/login', 0.9)]
+
+        summary, violations = budget.check([(0.2, fast), (3.0, slow), (0.3, fast)])
+        assert violations == [] and summary['wall'] == 0.3
+
+        summary, violations = budget.check([(0.2, fast), (3.0, slow), (2.0, slow + fast * 2)])
+        assert summary['endpoints'] == {'POST /login': 0.9}
+        assert violations == ['wall time 2000 ms > 1000 ms', '3 HTTP calls > 2', 'POST /login 900 ms > 500 ms']
+
+    def test_call_recorder_threads(self):
+        '''
+        В запись попадают запросы потока теста и потоков пакетных методов, но не посторонних фоновых потоков
+        '''
+        def request(endpoint):
+            call_recorder.record('GET', endpoint, 0.1)
+
+        call_recorder.start()
+        try:
+            background = threading.Thread(target=request, args=('/filler',))
+            background.start()
+            background.join()
+            request('/movies/1')
+            run_batch(request, ['/movies/2', '/movies/3'], max_workers=2)
+        finally:
+            calls = call_recorder.stop()
+        assert sorted(calls) == [('GET', '/movies/{id}', 0.1)] * 3
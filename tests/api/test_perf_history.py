@@ -0,0 +1,42 @@
+import random
+
+from utils.perf_history import ResultsStore, compare, mann_whitney, trend
+
+
+class TestPerfHistory:
+    def test_perf_history_compare(self, tmp_path):
+        '''
+        Сдвиг задержки POST /movies на 50% в трёх прогонах - регрессия, тот же разброс у POST /login -
+        без изменений; один медленный прогон с тысячей запросов значимым не считается
+        '''
+        rng = random.Random(7)
+        store = ResultsStore(str(tmp_path / 'results.sqlite'))
+        try:
+            def run(movies_scale, requests=30):
+                endpoints = {'POST /movies': [(rng.uniform(0.1, 0.2) * movies_scale, 1) for _ in range(requests)],
+                             'POST /login': [(rng.uniform(0.05, 0.1), 1) for _ in range(30)]}
+                return store.add_run('abc123', 'dev', endpoints, {'test_create_movie': 0.3})
+
+            for _ in range(10):
+                run(1.0)
+            store.add_run('other', 'prod', {'POST /movies': [(10.0, 100)]}, {})
+            run(1.5, requests=1000)
+            # Запросы одного прогона не независимы: по одному прогону решения нет
+            verdicts = {item.name: item.verdict for item in compare(store, environment='dev', current_runs=1)}
+            assert verdicts == {'POST /movies': 'insufficient', 'POST /login': 'insufficient'}
+            verdicts = {item.name: item.verdict
+                        for item in compare(store, environment='dev', current_runs=1, min_samples=1)}
+            assert verdicts['POST /movies'] == 'same'
+
+            run(1.5)
+            run(1.5)
+            verdicts = {item.name: item.verdict for item in compare(store, environment='dev')}
+            assert verdicts == {'POST /movies': 'regression', 'POST /login': 'same'}
+            tests = compare(store, kind='test', environment='dev', current_runs=3, min_samples=3)
+            assert [(item.name, item.verdict) for item in tests] == [('test_create_movie', 'same')]
+            assert 'abc123' in trend(store, environment='dev', runs=3)
+        finally:
+            store.close()
+
+        # Веса эквивалентны повторам значений
+        assert mann_whitney([(1, 2), (3, 1)], [(2, 3)]) == mann_whitney([(1, 1), (1, 1), (3, 1)], [(2, 1)] * 3)
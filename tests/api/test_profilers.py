@@ -0,0 +1,76 @@
+import threading
+from types import SimpleNamespace
+
+from custom_requester.batch import run_batch
+from custom_requester.metrics import record_call
+from utils.fixture_profiler import FixtureProfiler
+from utils.startup_profile import format_report, parse_importtime
+
+
+class TestFixtureProfiler:
+    def test_stats_merge_and_report(self, tmp_path):
+        '''
+        Setup и teardown считаются раздельно, статистика воркера xdist складывается с основной,
+        folded stacks пишет только основной процесс
+        '''
+        login = SimpleNamespace(argname='admin_auth', scope='session')
+        movie = SimpleNamespace(argname='created_movie', scope='function')
+        worker = FixtureProfiler()
+        worker._nodeid = 'test_a'
+        worker._add(movie, 'setup', 0.2, 1)
+        worker._add(movie, 'teardown', 0.1, 1)
+        worker_config = SimpleNamespace(workeroutput={})
+        worker.pytest_sessionfinish(SimpleNamespace(config=worker_config))
+
+        folded = str(tmp_path / 'fixtures.folded')
+        controller = FixtureProfiler(top=1, folded_path=folded)
+        controller._add(login, 'setup', 0.05, 1)
+        controller._add(movie, 'setup', 0.3, 1)
+        controller.pytest_testnodedown(SimpleNamespace(workeroutput=worker_config.workeroutput), None)
+
+        assert controller.stats['created_movie [function]'] == [2, 0.5, 1, 0.1, 3]
+        lines = controller.report().splitlines()
+        assert len(lines) == 2 and lines[1].startswith('created_movie [function]')
+        controller.pytest_sessionfinish(SimpleNamespace(config=SimpleNamespace()))
+        assert open(folded, encoding='utf-8').read().splitlines() == [
+            'session;admin_auth;setup 50000', 'session;created_movie;setup 300000',
+            'test_a;created_movie;setup 200000', 'test_a;created_movie;teardown 100000']
+
+    def test_http_calls_of_current_thread(self):
+        '''
+        Запросы фикстуры - из потока pytest и пулов пакетных методов, запросы фоновых потоков не считаются
+        '''
+        profiler = FixtureProfiler()
+        fixture = SimpleNamespace(argname='movies', scope='function', addfinalizer=lambda finalizer: None)
+        profiler.pytest_configure(None)
+        try:
+            setup = profiler.pytest_fixture_setup(fixture, None)
+            next(setup)
+            background = threading.Thread(target=record_call, args=('POST', '/register', 0.1))
+            background.start()
+            background.join()
+            record_call('GET', '/movies', 0.1)
+            run_batch(lambda movie_id: record_call('GET', f'/movies/{movie_id}', 0.1), [1, 2], max_workers=2)
+            next(setup, None)
+        finally:
+            profiler.pytest_unconfigure(None)
+        assert profiler.stats['movies [function]'][4] == 3
+
+
+class TestStartupProfile:
+    def test_parse_and_report(self):
+        '''
+        Разбор вывода -X importtime и суммирование собственного времени по пакетам
+        '''
+        records = parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       300 |        300 |   faker.providers',
+            'import time:      1200 |       1500 | faker',
+            'import time:       500 |        500 | requests',
+            'unrelated line',
+        ])
+        assert records == [('faker.providers', 300, 300), ('faker', 1200, 1500), ('requests', 500, 500)]
+        report = format_report(0.5, records, top=1)
+        assert 'imports: 0.00s in 3 modules' in report
+        assert [line.split() for line in report.splitlines() if line.startswith(('faker', 'requests'))] == \
+               [['faker', '1.5'], ['faker', '1.2', '1.5']]
@@ -0,0 +1,47 @@
+import json
+import random
+from types import SimpleNamespace
+
+from custom_requester.tracing import STATUS_ERROR, Tracer
+
+
+class TestTracing:
+    def test_spans_export(self, tmp_path):
+        '''
+        Спаны запросов привязаны к спану теста; прерванный исключением запрос - спан с ошибкой;
+        фиксация глобального random не повторяет идентификаторы
+        '''
+        path = str(tmp_path / 'trace.jsonl')
+        tracer = Tracer()
+        tracer.start(path, interval=60)
+        try:
+            trace_ids = []
+            for nodeid in ('test_a', 'test_b'):
+                random.seed(1)
+                tracer.start_test(nodeid)
+                trace_ids.append(tracer.current_test[0])
+                response = SimpleNamespace(status_code=201, request=SimpleNamespace(body=b'{"a": 1}'),
+                                           content=b'{"id": 1}')
+                tracer.record_http(1, 'POST', 'http://api/movies', '/movies', response, retries=1)
+                tracer.record_http(2, 'GET', 'http://api/movies/1', '/movies/1', None,
+                                   error=ConnectionError('refused'))
+                tracer.mark_failed()
+                tracer.end_test()
+        finally:
+            tracer.stop()
+
+        spans = [span for line in open(path, encoding='utf-8')
+                 for resource in json.loads(line)['resourceSpans']
+                 for scope in resource['scopeSpans'] for span in scope['spans']]
+        assert len(spans) == 6 and trace_ids[0] != trace_ids[1]
+        # Спан теста пишется последним - когда тест закончился
+        ok, failed, test_span = spans[:3]
+        assert test_span['name'] == 'test_a' and test_span['status'] == {'code': STATUS_ERROR}
+        assert ok['traceId'] == failed['traceId'] == test_span['traceId']
+        assert ok['parentSpanId'] == test_span['spanId'] and 'status' not in ok
+        attributes = {item['key']: item['value'] for item in ok['attributes']}
+        assert attributes['http.response.status_code'] == {'intValue': '201'}
+        assert attributes['http.request.body.size'] == {'intValue': '8'}
+        assert failed['name'] == 'GET /movies/{id}'
+        assert failed['status'] == {'code': STATUS_ERROR, 'message': 'ConnectionError'}
+        assert 'http.response.status_code' not in {item['key'] for item in failed['attributes']}
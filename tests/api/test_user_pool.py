@@ -0,0 +1,57 @@
+import pytest
+
+from custom_requester.batch import BatchResult
+from utils.user_pool import UserPool
+
+
+class TestUserPool:
+    def test_user_pool_lease_recycle_cleanup(self, api_manager, admin_auth, tmp_path):
+        '''
+        Аренда эксклюзивна между экземплярами пула, списанные пользователи удаляются cleanup,
+        фоновое пополнение отдаёт пользователей, не дожидаясь конца регистрации
+        '''
+        path = str(tmp_path / 'users.sqlite')
+        base_url = api_manager.auth_api.base_url
+        pool, other = UserPool(path, base_url), UserPool(path, base_url)
+        try:
+            assert pool.fill(api_manager.auth_api, 6, max_workers=3, chunk=4) == 6
+            first, second = pool.lease(), pool.lease()
+            assert first.email != second.email
+            pool.release(first)
+            pool.release(second, recycle=False)
+            assert pool.stats() == {'free': 5, 'leased': 0, 'retired': 1}
+
+            leased = [other.lease() for _ in range(5)]
+            assert len({user.email for user in leased}) == 5
+            with pytest.raises(TimeoutError):
+                pool.lease(timeout=0.2)
+
+            pool.start_filling(api_manager.auth_api, target=8, max_workers=2, chunk=1)
+            assert pool.lease(timeout=10).uses == 1
+
+            assert pool.cleanup(api_manager.user_api) == []
+            assert pool.stats()['retired'] == 0
+            api_manager.user_api.get_user_info(second.user_id, expected_status=404)
+        finally:
+            pool.close()
+            other.close()
+
+    def test_lease_timeout_when_registration_fails(self, tmp_path):
+        '''
+        Пустой пул и сбой регистрации: lease не регистрирует в цикле, а падает по timeout с причиной
+        '''
+        class FailingAuthApi:
+            calls = 0
+
+            def register_users(self, users, max_workers=1):
+                self.calls += 1
+                return [BatchResult(user, error=ConnectionError('register is down')) for user in users]
+
+        auth_api = FailingAuthApi()
+        pool = UserPool(str(tmp_path / 'users.sqlite'), 'http://localhost')
+        try:
+            with pytest.raises(TimeoutError, match='register is down'):
+                pool.lease(auth_api, timeout=0.3)
+            assert auth_api.calls == 1
+        finally:
+            pool.close()
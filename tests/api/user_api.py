@@ -1,4 +1,6 @@
 from constants import BASE_URL
+from custom_requester.async_custom_requester import AsyncCustomRequester
+from custom_requester.batch import DEFAULT_BATCH_WORKERS, run_batch, run_batch_async
 from custom_requester.custom_requester import CustomRequester
 
 
@@ -7,8 +9,8 @@ class UserAPI(CustomRequester):
     Класс для работы с API пользователей
     '''
 
-    def __init__(self, session):
-        super().__init__(session=session, base_url=BASE_URL)
+    def __init__(self, session, auth=None, base_url=BASE_URL, middleware=None, cache=None):
+        super().__init__(session=session, base_url=base_url, auth=auth, middleware=middleware, cache=cache)
 
     def get_user_info(self, user_id, expected_status=200):
         '''
@@ -39,4 +41,33 @@ class UserAPI(CustomRequester):
             self.delete_user(user_id, expected_status=204)
         except ValueError:
             # уже удалён или нет прав
-            pass
\ No newline at end of file
+            pass
+
+    _run_batch = staticmethod(run_batch)
+
+    def delete_users(self, user_ids, max_workers=DEFAULT_BATCH_WORKERS, expected_status=204,
+                     missing_ok=False):
+        '''
+        Удаление нескольких пользователей параллельными запросами (bulk-эндпоинта нет).
+        :param user_ids: Список ID пользователей.
+        :param max_workers: Максимум одновременных запросов.
+        :param expected_status: Ожидаемый статус-код.
+        :param missing_ok: Не считать ошибкой уже удалённых пользователей (404).
+        :return: Список BatchResult в порядке user_ids.
+        '''
+        return self._run_batch(lambda user_id: self.delete_user(user_id, expected_status=expected_status),
+                               user_ids, max_workers, missing_ok)
+
+
+class AsyncUserAPI(UserAPI, AsyncCustomRequester):
+    '''
+    Асинхронная версия UserAPI: методы те же, но возвращают корутины.
+    '''
+    _run_batch = staticmethod(run_batch_async)
+
+    async def clean_up_user(self, user_id):
+        try:
+            await self.delete_user(user_id, expected_status=204)
+        except ValueError:
+            # уже удалён или нет прав
+            pass
@@ -0,0 +1,81 @@
+'''
+Сравнение двух выгрузок каталога (utils.catalogue_export) по id фильма.
+Каждая строка сводится к 8-байтовому хэшу канонического JSON, поэтому в памяти
+держатся только пары id -> хэш, а не сами фильмы.
+
+Запуск:
+    python -m utils.catalogue_diff snapshots/dev.ndjson snapshots/stage.colz --ignore createdAt,rating
+'''
+import argparse
+from dataclasses import dataclass, field
+from hashlib import blake2b
+
+from custom_requester.json_backend import dumps
+from utils.catalogue_export import iter_snapshot
+
+
+def snapshot_hashes(path, ignore=()):
+    '''
+    :param path: Файл выгрузки (NDJSON или колоночный).
+    :param ignore: Поля, которые не участвуют в сравнении (например, createdAt).
+    :return: Словарь id -> хэш строки.
+    '''
+    ignore = frozenset(ignore)
+    hashes = {}
+    for row in iter_snapshot(path):
+        # null и отсутствующее поле считаются одинаковыми - так совпадают оба формата
+        canonical = {key: value for key, value in row.items() if value is not None and key not in ignore}
+        hashes[row.get('id')] = blake2b(dumps(canonical, sort_keys=True), digest_size=8).digest()
+    return hashes
+
+
+@dataclass
+class SnapshotDiff:
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+
+    @property
+    def identical(self):
+        return not (self.added or self.removed or self.changed)
+
+    def report(self, limit=20):
+        lines = [f'added: {len(self.added)}, removed: {len(self.removed)}, changed: {len(self.changed)}']
+        for name in ('added', 'removed', 'changed'):
+            ids = getattr(self, name)
+            if ids:
+                shown = ', '.join(str(movie_id) for movie_id in ids[:limit])
+                lines.append(f'{name}: {shown}' + (' ...' if len(ids) > limit else ''))
+        return '\n'.join(lines)
+
+
+def diff_snapshots(path_a, path_b, ignore=()):
+    '''
+    Сравнение выгрузок: какие id появились в path_b, пропали из него и изменились.
+    :return: SnapshotDiff с отсортированными списками id.
+    '''
+    hashes_a = snapshot_hashes(path_a, ignore)
+    hashes_b = snapshot_hashes(path_b, ignore)
+    return SnapshotDiff(
+        added=sorted(hashes_b.keys() - hashes_a.keys()),
+        removed=sorted(hashes_a.keys() - hashes_b.keys()),
+        changed=sorted(movie_id for movie_id, digest in hashes_a.items()
+                       if movie_id in hashes_b and hashes_b[movie_id] != digest),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение двух выгрузок каталога Cinescope')
+    parser.add_argument('old', help='Первая выгрузка')
+    parser.add_argument('new', help='Вторая выгрузка')
+    parser.add_argument('--ignore', default='', help='Поля через запятую, которые не сравниваются')
+    parser.add_argument('--limit', type=int, default=20, help='Сколько id показывать в каждом списке')
+    args = parser.parse_args()
+
+    diff = diff_snapshots(args.old, args.new, [name for name in args.ignore.split(',') if name])
+    print(diff.report(args.limit))
+    raise SystemExit(0 if diff.identical else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+'''
+Потоковая выгрузка каталога фильмов в NDJSON или колоночный формат с контрольными точками.
+
+Колоночный формат (.colz) - последовательность gzip-блоков, в каждом одна строка JSON
+{"rows": N, "columns": {"id": [...], "name": [...], ...}}. Блоки независимы, поэтому
+файл можно обрезать по границе блока и дописывать при продолжении выгрузки.
+
+Запуск:
+    python -m utils.catalogue_export --out snapshots/dev.ndjson
+    python -m utils.catalogue_export --out snapshots/dev.colz --format columnar --workers 8 --resume
+'''
+import argparse
+import gzip
+import os
+
+from constants import MOVIES_PAGE_SIZE, MOVIES_URL
+from custom_requester.json_backend import dumps, loads
+from custom_requester.middleware import get_default_middleware
+from custom_requester.transport import build_session
+from tests.api.movies_api import MoviesApi
+
+FORMATS = ('ndjson', 'columnar')
+DEFAULT_CHUNK_ROWS = 10000
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class NdjsonWriter:
+    '''
+    Фильм на строку. Строки копятся до flush, чтобы контрольная точка совпадала с границей записи.
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self._lines = []
+
+    @property
+    def pending(self):
+        return len(self._lines)
+
+    def add(self, movies):
+        self._lines.extend(dumps(movie) + b'\n' for movie in movies)
+
+    def flush(self):
+        count = len(self._lines)
+        if count:
+            self.file.write(b''.join(self._lines))
+            self._lines = []
+        return count
+
+
+class ColumnarWriter:
+    '''
+    Группа строк на gzip-блок: значения каждого поля лежат подряд и хорошо сжимаются.
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self._rows = []
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def add(self, movies):
+        self._rows.extend(movies)
+
+    def flush(self):
+        rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        fields = dict.fromkeys(key for row in rows for key in row)
+        columns = {field: [row.get(field) for row in rows] for field in fields}
+        self.file.write(gzip.compress(dumps({'rows': len(rows), 'columns': columns}) + b'\n', compresslevel=6))
+        return len(rows)
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'columnar': ColumnarWriter}
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def _load_checkpoint(path):
+    try:
+        with open(checkpoint_path(path), 'rb') as file:
+            return loads(file.read())
+    except FileNotFoundError:
+        return None
+
+
+def _save_checkpoint(path, state):
+    # Запись через временный файл: контрольная точка не бывает записана наполовину
+    tmp_path = checkpoint_path(path) + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(dumps(state))
+    os.replace(tmp_path, checkpoint_path(path))
+
+
+def export_catalogue(movies_api, path, fmt='ndjson', page_size=MOVIES_PAGE_SIZE, max_workers=4, params=None,
+                     chunk_rows=DEFAULT_CHUNK_ROWS, resume=False):
+    '''
+    Выгрузка каталога в файл. Страницы запрашиваются параллельно, а пишутся по порядку
+    пачками по chunk_rows строк; после каждой пачки сохраняется контрольная точка
+    (последняя записанная страница и размер файла).
+    :param movies_api: Экземпляр MoviesApi.
+    :param path: Файл выгрузки.
+    :param fmt: 'ndjson' или 'columnar'.
+    :param page_size: Размер страницы API.
+    :param max_workers: Сколько страниц запрашивать параллельно.
+    :param params: Фильтры каталога (query-параметры).
+    :param chunk_rows: Сколько строк копить перед записью и контрольной точкой.
+    :param resume: Продолжить с контрольной точки, если она есть.
+    :return: Сколько фильмов в файле.
+    '''
+    params = params or {}
+    state = {'format': fmt, 'page_size': page_size, 'params': params, 'page': 0, 'rows': 0, 'offset': 0}
+    checkpoint = _load_checkpoint(path) if resume else None
+    if checkpoint is not None and (not os.path.exists(path) or os.path.getsize(path) < checkpoint['offset']):
+        # Файл выгрузки удалён или обрезан: контрольная точка ему не соответствует, выгружаем заново
+        os.remove(checkpoint_path(path))
+        checkpoint = None
+    if checkpoint is not None:
+        for key in ('format', 'page_size', 'params'):
+            if checkpoint[key] != state[key]:
+                raise ValueError(f'Checkpoint {key}={checkpoint[key]!r} does not match {state[key]!r}')
+        state = checkpoint
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'r+b' if checkpoint is not None else 'wb') as file:
+        # Всё, что записано после контрольной точки, выгружается заново
+        file.truncate(state['offset'])
+        file.seek(state['offset'])
+        writer = WRITERS[fmt](file)
+        last_page = state['page']
+        for page, body in movies_api.iter_pages(page_size, max_workers, params, start_page=state['page'] + 1):
+            writer.add(body['movies'])
+            last_page = page
+            if writer.pending >= chunk_rows:
+                state['rows'] += writer.flush()
+                file.flush()
+                state.update(page=last_page, offset=file.tell())
+                _save_checkpoint(path, state)
+        state['rows'] += writer.flush()
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
+    return state['rows']
+
+
+def iter_snapshot(path):
+    '''
+    Чтение выгрузки любого формата (определяется по содержимому): генератор словарей фильмов.
+    В колоночном формате пустые (null) поля в строки не попадают.
+    '''
+    with open(path, 'rb') as file:
+        columnar = file.read(2) == GZIP_MAGIC
+    if not columnar:
+        with open(path, 'rb') as file:
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+        return
+    with gzip.open(path, 'rb') as file:
+        for line in file:
+            columns = loads(line)['columns']
+            fields = list(columns)
+            for values in zip(*columns.values()):
+                yield {field: value for field, value in zip(fields, values) if value is not None}
+
+
+def _parse_param(value):
+    key, sep, param = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'Expected key=value, got {value!r}')
+    return key, param
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка каталога фильмов Cinescope')
+    parser.add_argument('--out', required=True, help='Файл выгрузки')
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--base-url', default=MOVIES_URL, help='Адрес сервиса фильмов')
+    parser.add_argument('--page-size', type=int, default=MOVIES_PAGE_SIZE)
+    parser.add_argument('--workers', type=int, default=4, help='Страниц запрашивать параллельно')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help='Строк в пачке записи (и между контрольными точками)')
+    parser.add_argument('--param', type=_parse_param, action='append', default=[],
+                        help='Фильтр каталога key=value, например locations=MSK')
+    parser.add_argument('--resume', action='store_true', help='Продолжить с контрольной точки')
+    args = parser.parse_args()
+
+    movies_api = MoviesApi(build_session(), base_url=args.base_url, middleware=get_default_middleware())
+    rows = export_catalogue(movies_api, args.out, args.format, args.page_size, args.workers,
+                            dict(args.param), args.chunk_rows, args.resume)
+    print(f'{rows} movies exported to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,77 @@
+import itertools
+import os
 import random
 import string
 
-from faker import Faker
+# Локаль Faker: загружаются провайдеры только этой локали
+FAKER_LOCALE = os.getenv('CINESCOPE_FAKER_LOCALE', 'en_US')
 
-faker = Faker()
+# Размер заранее сгенерированных пулов значений для пакетной генерации
+POOL_SIZE = 2000
+POOL_SEED = 1234
+PASSWORD_SPECIAL_CHARS = '?@#$%^&*|:'
+
+
+class _DataPools:
+    '''
+    Пулы имён, слов и описаний, один раз сгенерированные Faker-ом с фиксированным seed.
+    Пакетная генерация берёт значения отсюда вместо вызова Faker на каждое поле.
+    '''
+
+    def __init__(self, size=POOL_SIZE, seed=POOL_SEED):
+        from faker import Faker
+        pool_faker = Faker(FAKER_LOCALE)
+        pool_faker.seed_instance(seed)
+        self.first_names = tuple(pool_faker.first_name() for _ in range(size))
+        self.last_names = tuple(pool_faker.last_name() for _ in range(size))
+        # Без повторов, но в порядке генерации: порядок множества зависит от PYTHONHASHSEED
+        self.words = tuple(dict.fromkeys(pool_faker.word().capitalize() for _ in range(size * 2)))
+        self.descriptions = tuple(pool_faker.text(max_nb_chars=100) for _ in range(size))
+
+
+_pools = None
+# Токен процесса и сквозной счётчик - уникальные email-ы и названия фильмов в прогоне, в том числе
+# между воркерами xdist и при одинаковом seed. Из seed они не выводятся, поэтому seed воспроизводит
+# все поля, кроме этого суффикса
+_run_token = os.urandom(4).hex()
+_run_counter = itertools.count()
+
+
+def _unique_suffix():
+    return f'{_run_token}-{next(_run_counter):x}'
+
+
+_faker = None
+
+
+def _get_faker():
+    '''
+    Faker создаётся при первом обращении: импорт faker и загрузка провайдеров заметно замедляют старт.
+    '''
+    global _faker
+    if _faker is None:
+        from faker import Faker
+        _faker = Faker(FAKER_LOCALE)
+    return _faker
+
+
+def _get_pools():
+    global _pools
+    if _pools is None:
+        _pools = _DataPools()
+    return _pools
 
 
 class DataGenerator:
 
+    @staticmethod
+    def seed(value):
+        '''
+        Фиксация генераторов random и Faker - данные поштучных методов становятся воспроизводимыми.
+        '''
+        random.seed(value)
+        _get_faker().seed_instance(value)
+
     # Генератор случайных email-ов
     # string.ascii_lowercase = 'abcdefghijklmnopqrstuvwxyz'
     # string.digits = '0123456789'
@@ -26,6 +90,7 @@ class DataGenerator:
     # Создаем рандомные имя с фамилией с библиотекой Faker
     @staticmethod
     def generate_random_name():
+        faker = _get_faker()
         return f"{faker.first_name()} {faker.last_name()}"
 
     # Создаем рандомный пароль, соответствующий требованиям
@@ -67,13 +132,63 @@ class DataGenerator:
         Генерация случайного фильма
         '''
         return {
-            'name': faker.sentence(nb_words=3).rstrip('.'), # случайное название из 3
+            'name': _get_faker().sentence(nb_words=3).rstrip('.'), # случайное название из 3
             # букв и удаление точки в конце имени
             'price': random.randint(50,1000),
-            'description': faker.text(max_nb_chars=100), # случайное описание,
+            'description': _get_faker().text(max_nb_chars=100), # случайное описание,
             # не более 100 букв
             'location': random.choice(['MSK', 'SPB']),
             'published': random.choice([True, False]),
             'genreId': random.randint(1, 4),
 
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def generate_movies(count, seed=None):
+        '''
+        Пакетная генерация фильмов из заранее подготовленных пулов.
+        Названия уникальны в рамках прогона (суффикс "<токен процесса>-<счётчик>").
+        :param count: Количество фильмов.
+        :param seed: Seed для воспроизводимости (None - случайный).
+        :return: Список словарей в формате generate_movie_data.
+        '''
+        pools = _get_pools()
+        rng = random.Random(seed)
+        words = pools.words
+        return [
+            {
+                'name': f"{' '.join(rng.choices(words, k=3))} {_unique_suffix()}",
+                'price': rng.randint(50, 1000),
+                'description': rng.choice(pools.descriptions),
+                'location': rng.choice(('MSK', 'SPB')),
+                'published': rng.random() < 0.5,
+                'genreId': rng.randint(1, 4),
+            }
+            for _ in range(count)
+        ]
+
+    @staticmethod
+    def generate_users(count, seed=None):
+        '''
+        Пакетная генерация пользователей для регистрации.
+        Email-ы уникальны в рамках прогона (kek<токен процесса>-<счётчик>), пароли соответствуют требованиям.
+        :param count: Количество пользователей.
+        :param seed: Seed для воспроизводимости (None - случайный).
+        :return: Список словарей в формате фикстуры test_user.
+        '''
+        pools = _get_pools()
+        rng = random.Random(seed)
+        all_chars = string.ascii_lowercase + string.digits + PASSWORD_SPECIAL_CHARS
+        users = []
+        for _ in range(count):
+            password = [rng.choice(string.ascii_uppercase), rng.choice(string.digits)]
+            password += rng.choices(all_chars, k=rng.randint(6, 18))
+            rng.shuffle(password)
+            password = ''.join(password)
+            users.append({
+                'email': f"kek{_unique_suffix()}@gmail.com",
+                'fullName': f"{rng.choice(pools.first_names)} {rng.choice(pools.last_names)}",
+                'password': password,
+                'passwordRepeat': password,
+            })
+        return users
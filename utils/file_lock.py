@@ -0,0 +1,32 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессной блокировки нет, остаётся блокировка потоков
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    '''
+    Эксклюзивная блокировка между потоками и процессами (в том числе воркерами xdist).
+    :param path: Путь к lock-файлу (создаётся при необходимости).
+    '''
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,126 @@
+'''
+Профилировщик фикстур: время setup и teardown каждой фикстуры отдельно и число
+HTTP-запросов, которые она сделала через CustomRequester (только из потока pytest и пулов
+пакетных методов - фоновые потоки вроде пополнения UserPool не считаются). Итоги печатаются в конце
+прогона, по желанию - файл folded stacks для flamegraph.pl / speedscope.
+Подключается из conftest.py опцией --fixture-profile.
+'''
+import functools
+import time
+
+import pytest
+
+from custom_requester.metrics import CallCounter, call_recorders
+
+
+class FixtureProfiler:
+    '''
+    Плагин pytest. Время setup считается без зависимостей фикстуры (они поднимаются раньше),
+    время teardown - без teardown зависящих от неё фикстур.
+    '''
+
+    def __init__(self, top=15, folded_path=None):
+        '''
+        :param top: Сколько самых дорогих фикстур выводить.
+        :param folded_path: Файл для folded stacks (тест;фикстура;фаза микросекунды).
+        '''
+        self.top = top
+        self.folded_path = folded_path
+        # 'имя [scope]' -> [setups, setup_time, teardowns, teardown_time, http_calls]
+        self.stats = {}
+        # 'тест;фикстура;фаза' -> микросекунды
+        self.stacks = {}
+        self._teardowns = {}
+        self._nodeid = None
+        self.calls = CallCounter()
+
+    def _add(self, fixturedef, phase, elapsed, calls):
+        key = f'{fixturedef.argname} [{fixturedef.scope}]'
+        stats = self.stats.setdefault(key, [0, 0.0, 0, 0.0, 0])
+        offset = 0 if phase == 'setup' else 2
+        stats[offset] += 1
+        stats[offset + 1] += elapsed
+        stats[4] += calls
+        stack = f'{self._nodeid or "session"};{fixturedef.argname};{phase}'
+        self.stacks[stack] = self.stacks.get(stack, 0) + int(elapsed * 1_000_000)
+
+    def pytest_configure(self, config):
+        # Счёт идёт в потоке, где выполняются фикстуры
+        self.calls.start()
+        call_recorders.append(self.calls)
+
+    def pytest_unconfigure(self, config):
+        self.calls.stop()
+        call_recorders.remove(self.calls)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self._nodeid = item.nodeid
+        yield
+        self._nodeid = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        start = time.perf_counter()
+        yield
+        stack = f'{item.nodeid};call'
+        self.stacks[stack] = self.stacks.get(stack, 0) + int((time.perf_counter() - start) * 1_000_000)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        calls = self.calls.count
+        start = time.perf_counter()
+        yield
+        self._add(fixturedef, 'setup', time.perf_counter() - start, self.calls.count - calls)
+        # Финализаторы выполняются в обратном порядке: этот сработает сразу перед teardown фикстуры
+        fixturedef.addfinalizer(functools.partial(self._teardown_started, fixturedef))
+
+    def _teardown_started(self, fixturedef):
+        self._teardowns[id(fixturedef)] = (time.perf_counter(), self.calls.count)
+
+    def pytest_fixture_post_finalizer(self, fixturedef, request):
+        started = self._teardowns.pop(id(fixturedef), None)
+        if started is not None:
+            start, calls = started
+            self._add(fixturedef, 'teardown', time.perf_counter() - start, self.calls.count - calls)
+
+    # --- xdist: воркеры отдают статистику основному процессу ---
+
+    def pytest_sessionfinish(self, session):
+        workeroutput = getattr(session.config, 'workeroutput', None)
+        if workeroutput is not None:
+            workeroutput['fixture_profile'] = {'stats': self.stats, 'stacks': self.stacks}
+        elif self.folded_path:
+            with open(self.folded_path, 'w', encoding='utf-8') as file:
+                for stack, micros in sorted(self.stacks.items()):
+                    file.write(f'{stack} {micros}\n')
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        profile = getattr(node, 'workeroutput', {}).get('fixture_profile')
+        if not profile:
+            return
+        for key, values in profile['stats'].items():
+            stats = self.stats.setdefault(key, [0, 0.0, 0, 0.0, 0])
+            for i, value in enumerate(values):
+                stats[i] += value
+        for stack, micros in profile['stacks'].items():
+            self.stacks[stack] = self.stacks.get(stack, 0) + micros
+
+    def report(self):
+        '''
+        Текстовая таблица самых дорогих фикстур (по сумме setup и teardown).
+        '''
+        lines = [f"{'fixture':<40} {'setups':>6} {'setup, s':>9} {'teardowns':>9} {'teardown, s':>11} {'http':>6}"]
+        ranked = sorted(self.stats.items(), key=lambda item: item[1][1] + item[1][3], reverse=True)
+        for key, (setups, setup_time, teardowns, teardown_time, calls) in ranked[:self.top]:
+            lines.append(f"{key:<40} {setups:>6} {setup_time:>9.3f} {teardowns:>9} {teardown_time:>11.3f} {calls:>6}")
+        return '\n'.join(lines)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if getattr(terminalreporter.config, 'workeroutput', None) is not None or not self.stats:
+            return
+        terminalreporter.write_sep('=', 'Fixture profile')
+        terminalreporter.write_line(self.report())
+        if self.folded_path:
+            terminalreporter.write_line(f'folded stacks saved to {self.folded_path}')
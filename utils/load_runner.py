@@ -0,0 +1,299 @@
+'''
+Нагрузочный режим: прогон сценария из API-клиентов (ApiManager) с заданной
+интенсивностью или конкурентностью в течение заданного времени.
+
+Запуск:
+    python -m utils.load_runner --scenario movie_crud --concurrency 10 --rps 20 --duration 60
+    python -m utils.load_runner --scenario movie_crud --http-cache    # GET через общий кэш с ETag
+    python -m utils.load_runner --scenario pool_login --concurrency 50   # логин пользователями из пула
+    python -m utils.load_runner --stub --duration 10                     # против локальной заглушки
+
+С --rps задержка итерации (строка iteration) считается от запланированного старта, а не от фактического:
+если воркеры не успевают, ожидание в очереди попадает в перцентили (coordinated omission).
+'''
+import argparse
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from constants import BASE_URL, MOVIES_URL
+from custom_requester.http_cache import ResponseCache, http_cache_stats
+from custom_requester.metrics import LatencyHistogram
+from custom_requester.token_provider import BearerAuth, TokenProvider
+from custom_requester.transport import build_session
+from tests.api.api_manager import ApiManager
+from utils.data_generator import DataGenerator
+from utils.stub_server import CinescopeStubServer
+from utils.user_pool import USER_POOL_PATH, UserPool
+
+
+@dataclass
+class Scenario:
+    '''
+    Сценарий нагрузки: шаги выполняются по порядку в каждой итерации.
+    Шаг - пара (имя, функция(api_manager, ctx)); ctx - словарь итерации для передачи данных между шагами,
+    в ctx['credentials'] - логин и пароль прогона.
+    setup(api_manager, credentials) вызывается один раз на воркер, cleanup(api_manager, ctx) - после каждой
+    итерации; их ошибки считаются отдельно от ошибок шагов.
+    '''
+    name: str
+    steps: list
+    setup: object = None
+    cleanup: object = None
+
+
+@dataclass
+class StepStats:
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    errors: int = 0
+    last_error: str = ''
+
+
+def _movie_crud_setup(api_manager, credentials):
+    api_manager.auth_api.authenticate(credentials)
+
+
+def _login(api_manager, ctx):
+    email, password = ctx['credentials']
+    api_manager.auth_api.login_user({'email': email, 'password': password})
+
+
+def _create_movie(api_manager, ctx):
+    ctx['movie'] = DataGenerator.generate_movie_data()
+    ctx['movie_id'] = api_manager.movies_api.create_movie(ctx['movie']).json()['id']
+
+
+def _get_movie(api_manager, ctx):
+    api_manager.movies_api.get_movie_by_id(ctx['movie_id'])
+
+
+def _patch_movie(api_manager, ctx):
+    api_manager.movies_api.update_movie(ctx['movie_id'], {'price': ctx['movie']['price'] + 1})
+
+
+def _delete_movie(api_manager, ctx):
+    api_manager.movies_api.delete_movie(ctx.pop('movie_id'), expected_status=200)
+
+
+def _movie_crud_cleanup(api_manager, ctx):
+    # Фильм остался, если итерация упала до шага delete
+    if 'movie_id' in ctx:
+        api_manager.movies_api.delete_movie(ctx['movie_id'], expected_status=200)
+
+
+SCENARIOS = {
+    'movie_crud': Scenario(
+        name='movie_crud',
+        steps=[('login', _login), ('create', _create_movie), ('get', _get_movie),
+               ('patch', _patch_movie), ('delete', _delete_movie)],
+        setup=_movie_crud_setup,
+        cleanup=_movie_crud_cleanup,
+    ),
+    'get_movies': Scenario(
+        name='get_movies',
+        steps=[('get_movies', lambda api_manager, ctx: api_manager.movies_api.get_all_movies())],
+    ),
+}
+
+
+def pool_login_scenario(pool):
+    '''
+    Логин разными пользователями из UserPool: пул заполняется заранее (python -m utils.user_pool fill),
+    поэтому в прогон попадает только аренда и вход, а не регистрация.
+    '''
+    def lease(api_manager, ctx):
+        ctx['user'] = pool.lease(timeout=10)
+
+    def login(api_manager, ctx):
+        api_manager.auth_api.login_user(ctx['user'].login_data())
+
+    def cleanup(api_manager, ctx):
+        if 'user' in ctx:
+            pool.release(ctx.pop('user'))
+
+    return Scenario(name='pool_login', steps=[('lease', lease), ('login', login)], cleanup=cleanup)
+
+
+class LoadRunner:
+    '''
+    Запуск сценария пулом потоков.
+    Если задан rps, итерации стартуют по расписанию (итераций в секунду),
+    иначе каждый из concurrency воркеров крутит итерации без пауз.
+    '''
+
+    def __init__(self, scenario, concurrency=10, rps=None, duration=60, api_manager_factory=None,
+                 credentials=None):
+        '''
+        :param scenario: Экземпляр Scenario.
+        :param concurrency: Количество воркеров.
+        :param rps: Целевое количество итераций в секунду (None - без ограничения).
+        :param duration: Длительность прогона в секундах.
+        :param api_manager_factory: Функция без аргументов, создающая ApiManager для воркера.
+        :param credentials: Пара (логин, пароль) для setup и шагов сценария.
+        '''
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.rps = rps
+        self.duration = duration
+        self.api_manager_factory = api_manager_factory or (lambda: ApiManager(build_session()))
+        self.credentials = credentials
+        self.stats = {name: StepStats() for name, _ in scenario.steps}
+        # Итерация целиком; с rps - от запланированного старта
+        self.iteration_stats = StepStats()
+        self.setup_stats = StepStats()
+        self.cleanup_stats = StepStats()
+        self.iterations = 0
+        self._lock = threading.Lock()
+        self._ticket = 0
+
+    def _next_start(self, started_at):
+        '''
+        Время старта следующей итерации по расписанию или None, если время вышло.
+        '''
+        with self._lock:
+            ticket = self._ticket
+            self._ticket += 1
+        start = started_at + ticket / self.rps if self.rps else time.monotonic()
+        return start if start < started_at + self.duration else None
+
+    def _error(self, stats, error):
+        with self._lock:
+            stats.errors += 1
+            stats.last_error = f'{type(error).__name__}: {error}'
+
+    def _worker(self, started_at):
+        try:
+            api_manager = self.api_manager_factory()
+            if self.scenario.setup:
+                self.scenario.setup(api_manager, self.credentials)
+        except Exception as e:
+            # Воркер без setup не запускается, остальные продолжают
+            self._error(self.setup_stats, e)
+            return
+        while True:
+            start = self._next_start(started_at)
+            if start is None:
+                return
+            delay = start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            ctx = {'credentials': self.credentials}
+            failed = False
+            for name, step in self.scenario.steps:
+                step_start = time.perf_counter()
+                try:
+                    step(api_manager, ctx)
+                except Exception as e:
+                    self._error(self.stats[name], e)
+                    failed = True
+                    break
+                elapsed = time.perf_counter() - step_start
+                with self._lock:
+                    self.stats[name].histogram.record(elapsed)
+            # start - запланированный старт (с rps) или фактический (без rps)
+            elapsed = time.monotonic() - start
+            if self.scenario.cleanup:
+                try:
+                    self.scenario.cleanup(api_manager, ctx)
+                except Exception as e:
+                    self._error(self.cleanup_stats, e)
+            with self._lock:
+                self.iterations += 1
+                if failed:
+                    self.iteration_stats.errors += 1
+                else:
+                    self.iteration_stats.histogram.record(elapsed)
+
+    def run(self):
+        '''
+        Прогон сценария.
+        :return: Фактическая длительность прогона в секундах.
+        '''
+        started_at = time.monotonic()
+        workers = [threading.Thread(target=self._worker, args=(started_at,), daemon=True)
+                   for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.monotonic() - started_at
+
+    def report(self, elapsed):
+        '''
+        Текстовый отчёт: пропускная способность, перцентили (мс) и доля ошибок по шагам,
+        сбои setup и cleanup.
+        '''
+        lines = [f'scenario {self.scenario.name}: {self.iterations} iterations in {elapsed:.1f} s '
+                 f'({self.iterations / elapsed:.1f} it/s)',
+                 f"{'step':<14} {'ok':>7} {'errors':>7} {'err %':>6} {'ops/s':>8} "
+                 f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"]
+        for name, stats in {**self.stats, 'iteration': self.iteration_stats}.items():
+            summary = stats.histogram.summary()
+            attempts = summary['count'] + stats.errors
+            error_rate = stats.errors / attempts * 100 if attempts else 0.0
+            lines.append(f"{name:<14} {summary['count']:>7} {stats.errors:>7} {error_rate:>6.1f} "
+                         f"{summary['count'] / elapsed:>8.1f} " + ' '.join(
+                             f"{summary[key] * 1000:>8.1f}" for key in ('p50', 'p95', 'p99', 'max')))
+        if self.setup_stats.errors:
+            lines.append(f'setup failed in {self.setup_stats.errors} of {self.concurrency} workers')
+        if self.cleanup_stats.errors:
+            lines.append(f'cleanup failed in {self.cleanup_stats.errors} iterations')
+        for name, stats in {**self.stats, 'setup': self.setup_stats, 'cleanup': self.cleanup_stats}.items():
+            if stats.last_error:
+                lines.append(f'last error in {name}: {stats.last_error}')
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон сценариев Cinescope')
+    parser.add_argument('--scenario', choices=sorted([*SCENARIOS, 'pool_login']), default='movie_crud')
+    parser.add_argument('--concurrency', type=int, default=10, help='Количество воркеров')
+    parser.add_argument('--rps', type=float, default=None, help='Итераций сценария в секунду')
+    parser.add_argument('--duration', type=float, default=60, help='Длительность, секунды')
+    parser.add_argument('--user-pool', default=USER_POOL_PATH, help='Файл пула пользователей (pool_login)')
+    parser.add_argument('--http-cache', action='store_true',
+                        help='Общий для воркеров кэш ответов GET с перепроверкой по ETag')
+    parser.add_argument('--base-url', default=None,
+                        help='Адрес стенда (auth и фильмы), по умолчанию BASE_URL и MOVIES_URL')
+    parser.add_argument('--stub', action='store_true', help='Прогон против локальной заглушки Cinescope')
+    parser.add_argument('--stub-movies', type=int, default=30, help='Сколько фильмов создать в заглушке заранее')
+    args = parser.parse_args()
+
+    load_dotenv()
+    stub = None
+    base_url, movies_url = (args.base_url, args.base_url) if args.base_url else (BASE_URL, MOVIES_URL)
+    credentials = (os.getenv('USERNAME'), os.getenv('PASSWORD'))
+    if args.stub:
+        stub = CinescopeStubServer().start()
+        stub.seed_movies(args.stub_movies)
+        base_url = movies_url = stub.base_url
+        credentials = (stub.admin_email, stub.admin_password)
+    cache = ResponseCache() if args.http_cache else None
+
+    def factory():
+        # Токены заглушки живут только в этом прогоне - файловый кэш не нужен
+        auth = BearerAuth(TokenProvider(cache_path=None)) if stub is not None else None
+        return ApiManager(build_session(), auth=auth, base_url=base_url, movies_url=movies_url, cache=cache)
+
+    pool = UserPool(args.user_pool) if args.scenario == 'pool_login' else None
+    scenario = pool_login_scenario(pool) if pool is not None else SCENARIOS[args.scenario]
+    runner = LoadRunner(scenario, concurrency=args.concurrency, rps=args.rps, duration=args.duration,
+                        api_manager_factory=factory, credentials=credentials)
+    try:
+        elapsed = runner.run()
+    finally:
+        if pool is not None:
+            pool.close()
+        if stub is not None:
+            stub.stop()
+    print(runner.report(elapsed))
+    if http_cache_stats.used:
+        print(f'http cache: {http_cache_stats.report()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import threading
+
+from custom_requester.custom_requester import UnexpectedStatusError
+from utils.data_generator import DataGenerator
+
+
+class MovieFactory:
+    '''
+    Фабрика фильмов для тестов: параллельно создаёт фильмы, запоминает их id
+    и параллельно удаляет всё созданное при очистке.
+    '''
+
+    def __init__(self, movies_api, max_workers=8):
+        '''
+        :param movies_api: Экземпляр MoviesApi (с авторизацией админа).
+        :param max_workers: Максимум одновременных запросов.
+        '''
+        self.movies_api = movies_api
+        self.max_workers = max_workers
+        self.created_ids = []
+        self._lock = threading.Lock()
+
+    def create(self, count=1, **overrides):
+        '''
+        Создание count случайных фильмов.
+        :param count: Количество фильмов.
+        :param overrides: Поля, которые нужно задать явно (например, location='MSK').
+        :return: Список пар (тело ответа, отправленные данные) в порядке создания.
+        '''
+        payloads = [{**DataGenerator.generate_movie_data(), **overrides} for _ in range(count)]
+        return self.create_from(payloads)
+
+    def create_from(self, payloads):
+        '''
+        Создание фильмов из готовых данных.
+        :param payloads: Список данных фильмов.
+        :return: Список пар (тело ответа, отправленные данные) в порядке payloads.
+        '''
+        results = self.movies_api.create_movies(payloads, max_workers=self.max_workers)
+        created = []
+        with self._lock:
+            for result in results:
+                if result.ok:
+                    movie = result.value.json()
+                    self.created_ids.append(movie['id'])
+                    created.append((movie, result.item))
+        # Созданные до ошибки фильмы уже запомнены и удалятся в cleanup()
+        for result in results:
+            if not result.ok:
+                raise result.error
+        return created
+
+    def cleanup(self):
+        '''
+        Параллельное удаление всех созданных фильмов.
+        Уже удалённые фильмы (404) ошибкой не считаются.
+        :return: Список строк с описанием ошибок удаления (пустой, если всё удалено).
+        '''
+        with self._lock:
+            movie_ids, self.created_ids = self.created_ids, []
+        results = self.movies_api.delete_movies(movie_ids, max_workers=self.max_workers,
+                                                expected_status=200, missing_ok=True)
+        return [_describe_error(result) for result in results if not result.ok]
+
+
+def _describe_error(result):
+    if isinstance(result.error, UnexpectedStatusError):
+        return f'{result.item}: {result.error}'
+    return f'{result.item}: {type(result.error).__name__} - {result.error}'
@@ -0,0 +1,211 @@
+'''
+Бюджеты производительности тестов. Маркер perf_budget ограничивает время теста,
+задержку отдельных запросов по шаблонам эндпойнтов и число HTTP-запросов:
+
+    @pytest.mark.perf_budget(total=2.0, calls=3, endpoints={'GET /movies': 0.5})
+    @pytest.mark.perf_budget(endpoints={'POST /login': 0.3}, samples=5, mode='fail')
+
+Запросы считает CustomRequester (call_recorder) - только из потока теста и пулов пакетных методов,
+фоновые потоки (пополнение UserPool) не учитываются. В бюджет идёт тело теста, а с setup=True -
+и function-фикстуры; запросы фикстур шире function (логин админа и т.п.) не учитываются.
+С samples=N тело теста выполняется N раз и с бюджетом сравниваются медианы.
+Режимы: warn - предупреждение PerfBudgetWarning, fail - тест падает, record - только отчёт.
+Опция --perf-budget-mode переопределяет режим всех маркеров (off - не проверять).
+Подключается из conftest.py.
+'''
+import inspect
+import statistics
+import time
+import warnings
+
+import pytest
+
+from custom_requester.metrics import call_recorder
+
+MODES = ('warn', 'fail', 'record')
+
+
+class PerfBudgetWarning(pytest.PytestWarning):
+    '''
+    Тест превысил бюджет производительности (режим warn).
+    '''
+
+
+class PerfBudget:
+    '''
+    Лимиты одного теста. Время - в секундах, эндпойнты - 'METHOD /шаблон', как в отчёте задержек.
+    '''
+
+    def __init__(self, total=None, calls=None, endpoints=None, mode='warn', samples=1, setup=False):
+        '''
+        :param total: Время теста.
+        :param calls: Максимум HTTP-запросов (попыток, включая повторы).
+        :param endpoints: Словарь 'METHOD /шаблон' -> лимит задержки одного запроса.
+        :param mode: 'warn', 'fail' или 'record'.
+        :param samples: Сколько раз выполнить тело теста (сравниваются медианы).
+        :param setup: Учитывать setup function-фикстур.
+        '''
+        if mode not in MODES:
+            raise ValueError(f'perf_budget mode must be one of {MODES}, got {mode!r}')
+        self.total = total
+        self.calls = calls
+        self.endpoints = endpoints or {}
+        self.mode = mode
+        self.samples = max(samples, 1)
+        self.setup = setup
+
+    @classmethod
+    def from_marker(cls, marker):
+        return cls(*marker.args, **marker.kwargs)
+
+    def check(self, samples):
+        '''
+        Сравнение замеров с лимитами.
+        :param samples: Пары (время в секундах, вызовы из CallRecorder) - по одной на выполнение теста.
+        :return: Пара (сводка: медианное время, максимум запросов, медиана худшей задержки по эндпойнтам;
+            список нарушений).
+        '''
+        wall = statistics.median(elapsed for elapsed, _ in samples)
+        calls = max(len(sample_calls) for _, sample_calls in samples)
+        worst = {}
+        for _, sample_calls in samples:
+            slowest = {}
+            for method, template, seconds in sample_calls:
+                key = f'{method} {template}'
+                slowest[key] = max(slowest.get(key, 0.0), seconds)
+            for key, seconds in slowest.items():
+                worst.setdefault(key, []).append(seconds)
+        endpoints = {key: statistics.median(values) for key, values in sorted(worst.items())}
+
+        violations = []
+        if self.total is not None and wall > self.total:
+            violations.append(f'wall time {wall * 1000:.0f} ms > {self.total * 1000:.0f} ms')
+        if self.calls is not None and calls > self.calls:
+            violations.append(f'{calls} HTTP calls > {self.calls}')
+        for key, limit in self.endpoints.items():
+            if endpoints.get(key, 0.0) > limit:
+                violations.append(f'{key} {endpoints[key] * 1000:.0f} ms > {limit * 1000:.0f} ms')
+        summary = {'wall': wall, 'calls': calls, 'endpoints': endpoints, 'samples': len(samples)}
+        return summary, violations
+
+
+class PerfBudgetPlugin:
+    '''
+    Плагин pytest: замер тестов с маркером perf_budget и итоговая таблица.
+    Результат теста попадает в report.user_properties, поэтому таблица собирается и под xdist.
+    '''
+
+    def __init__(self, mode_override=None):
+        '''
+        :param mode_override: Режим для всех маркеров, 'off' - не проверять (None - режим маркера).
+        '''
+        self.mode_override = mode_override
+        # (nodeid, результат из user_properties)
+        self.results = []
+        self._setup = None
+        self._samples = None
+        self._paused = 0.0
+
+    def _budget(self, item):
+        marker = item.get_closest_marker('perf_budget')
+        if marker is None or self.mode_override == 'off':
+            return None
+        budget = PerfBudget.from_marker(marker)
+        if self.mode_override:
+            budget.mode = self.mode_override
+        return budget
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        if not call_recorder.active or fixturedef.scope == 'function':
+            return (yield)
+        # Фикстуры шире function поднимаются один раз на много тестов - в бюджет теста не идут
+        call_recorder.active = False
+        start = time.perf_counter()
+        try:
+            return (yield)
+        finally:
+            self._paused += time.perf_counter() - start
+            call_recorder.active = True
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_setup(self, item):
+        self._setup = None
+        budget = self._budget(item)
+        if budget is None or not budget.setup:
+            return (yield)
+        self._paused = 0.0
+        call_recorder.start()
+        start = time.perf_counter()
+        try:
+            return (yield)
+        finally:
+            self._setup = (time.perf_counter() - start - self._paused, call_recorder.stop())
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_pyfunc_call(self, pyfuncitem):
+        budget = self._budget(pyfuncitem)
+        if budget is None or budget.samples == 1 or inspect.iscoroutinefunction(pyfuncitem.obj):
+            return None
+        funcargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        for _ in range(budget.samples):
+            call_recorder.start()
+            start = time.perf_counter()
+            pyfuncitem.obj(**funcargs)
+            self._samples.append((time.perf_counter() - start, call_recorder.stop()))
+        return True
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_call(self, item):
+        budget = self._budget(item)
+        if budget is None:
+            return (yield)
+        self._samples = []
+        self._paused = 0.0
+        call_recorder.start()
+        start = time.perf_counter()
+        try:
+            result = yield
+        finally:
+            elapsed = time.perf_counter() - start - self._paused
+            calls = call_recorder.stop()
+            samples, self._samples = self._samples or [(elapsed, calls)], None
+        if self._setup is not None:
+            setup_elapsed, setup_calls = self._setup
+            samples = [(elapsed + setup_elapsed, setup_calls + calls) for elapsed, calls in samples]
+
+        summary, violations = budget.check(samples)
+        item.user_properties.append(('perf_budget', {**summary, 'mode': budget.mode, 'violations': violations}))
+        if violations and budget.mode != 'record':
+            message = f'perf budget exceeded: {"; ".join(violations)}'
+            if budget.samples > 1:
+                message += f' (median of {budget.samples} runs)'
+            if budget.mode == 'fail':
+                pytest.fail(message, pytrace=False)
+            warnings.warn(PerfBudgetWarning(message))
+        return result
+
+    def pytest_runtest_logreport(self, report):
+        if report.when != 'call':
+            return
+        for name, value in report.user_properties:
+            if name == 'perf_budget':
+                self.results.append((report.nodeid, value))
+
+    def report(self):
+        '''
+        Текстовая таблица тестов с бюджетом: медианное время, число запросов, статус.
+        '''
+        lines = [f"{'test':<70} {'mode':>6} {'wall, ms':>9} {'calls':>6} {'status':>8}"]
+        for nodeid, result in self.results:
+            status = 'over' if result['violations'] else 'ok'
+            lines.append(f"{nodeid[-70:]:<70} {result['mode']:>6} {result['wall'] * 1000:>9.1f} "
+                         f"{result['calls']:>6} {status:>8}")
+            lines.extend(f'    {violation}' for violation in result['violations'])
+        return '\n'.join(lines)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if getattr(terminalreporter.config, 'workeroutput', None) is not None or not self.results:
+            return
+        terminalreporter.write_sep('=', 'Performance budgets')
+        terminalreporter.write_line(self.report())
@@ -0,0 +1,394 @@
+'''
+История производительности между прогонами: локальная SQLite-база с задержками эндпойнтов
+и длительностями тестов каждого прогона (с git SHA и окружением), сравнение с базовой линией
+из предыдущих прогонов критерием Манна-Уитни и таблица трендов.
+
+Прогон сохраняется из conftest.py опцией --results-db (или CINESCOPE_RESULTS_DB).
+Задержки эндпойнтов хранятся корзинами гистограммы (значение, количество), а не по запросу.
+Единица сравнения - прогон: запросы одного прогона зависимы (общий стенд, общая нагрузка),
+поэтому эндпойнт прогона представлен медианой, а тест - длительностью.
+
+Запуск:
+    python -m utils.perf_history compare --env dev --baseline 10   # 3 последних прогона против 10 до них
+    python -m utils.perf_history compare --kind test --current 5 --min-samples 5
+    python -m utils.perf_history trend --runs 8
+    python -m utils.perf_history runs
+'''
+import argparse
+import math
+import os
+import sqlite3
+import subprocess
+import time
+from dataclasses import dataclass
+
+import pytest
+
+from custom_requester.metrics import latency_registry
+
+RESULTS_DB_PATH = os.getenv('CINESCOPE_RESULTS_DB')
+KINDS = ('endpoint', 'test')
+DEFAULT_CURRENT_RUNS = 3
+DEFAULT_BASELINE_RUNS = 10
+# На выборках из нескольких прогонов уровень 0.01 недостижим (3 против 10 дают p не меньше 0.014)
+DEFAULT_ALPHA = 0.05
+# Значимое, но меньшее изменение медианы не считается ни регрессией, ни улучшением
+DEFAULT_MIN_CHANGE = 0.10
+# Минимум прогонов с замером с каждой стороны
+DEFAULT_MIN_SAMPLES = 3
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    git_sha TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    tests INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    weight INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_by_run ON samples (run_id, kind, name);
+'''
+
+
+def git_sha(cwd=None):
+    '''
+    Текущий коммит: из git, иначе из переменных CI, иначе 'unknown'.
+    '''
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short=12', 'HEAD'], cwd=cwd,
+                                capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return os.getenv('CI_COMMIT_SHA') or os.getenv('GITHUB_SHA') or 'unknown'
+
+
+@dataclass
+class Run:
+    id: int
+    started_at: float
+    git_sha: str
+    environment: str
+    tests: int
+    failed: int
+
+
+class ResultsStore:
+    '''
+    Прогоны и их замеры. Замер - тройка (вид 'endpoint'/'test', имя, значение в секундах)
+    с весом: для эндпойнтов вес - число запросов в корзине гистограммы.
+    '''
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(_SCHEMA)
+
+    def add_run(self, sha, environment, endpoints, tests, failed=0, started_at=None):
+        '''
+        Сохранение прогона.
+        :param sha: Git SHA.
+        :param environment: Окружение (dev, stub, ...) - базовая линия строится в его пределах.
+        :param endpoints: Словарь 'METHOD /шаблон' -> пары (секунды, количество).
+        :param tests: Словарь nodeid -> длительность теста в секундах.
+        :param failed: Сколько тестов упало.
+        :return: id прогона.
+        '''
+        with self.db:
+            run_id = self.db.execute(
+                'INSERT INTO runs (started_at, git_sha, environment, tests, failed) VALUES (?, ?, ?, ?, ?)',
+                (started_at or time.time(), sha, environment, len(tests), failed)).lastrowid
+            rows = [(run_id, 'endpoint', name, value, weight)
+                    for name, values in endpoints.items() for value, weight in values]
+            rows += [(run_id, 'test', nodeid, seconds, 1) for nodeid, seconds in tests.items()]
+            self.db.executemany('INSERT INTO samples (run_id, kind, name, value, weight) VALUES (?, ?, ?, ?, ?)',
+                                rows)
+        return run_id
+
+    def runs(self, environment=None, limit=None, before=None):
+        '''
+        Прогоны от новых к старым.
+        :param environment: Только прогоны этого окружения.
+        :param limit: Максимум прогонов.
+        :param before: Только прогоны с id меньше указанного.
+        '''
+        query, args = 'SELECT * FROM runs WHERE 1', []
+        if environment is not None:
+            query += ' AND environment = ?'
+            args.append(environment)
+        if before is not None:
+            query += ' AND id < ?'
+            args.append(before)
+        query += ' ORDER BY id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            args.append(limit)
+        return [Run(*row) for row in self.db.execute(query, args)]
+
+    def samples(self, run_ids, kind):
+        '''
+        :return: Словарь имя -> список пар (значение, вес) по всем указанным прогонам.
+        '''
+        samples = {}
+        if not run_ids:
+            return samples
+        rows = self.db.execute(f"SELECT name, value, weight FROM samples WHERE kind = ? "
+                               f"AND run_id IN ({', '.join('?' * len(run_ids))})", (kind, *run_ids))
+        for name, value, weight in rows:
+            samples.setdefault(name, []).append((value, weight))
+        return samples
+
+    def run_medians(self, run_ids, kind):
+        '''
+        :return: Словарь имя -> список пар (медиана в прогоне, 1), по паре на прогон с замером.
+        '''
+        medians = {}
+        for run_id in run_ids:
+            for name, values in self.samples([run_id], kind).items():
+                medians.setdefault(name, []).append((weighted_median(values), 1))
+        return medians
+
+    def close(self):
+        self.db.close()
+
+
+def weighted_median(values):
+    '''
+    :param values: Пары (значение, вес).
+    '''
+    values = sorted(values)
+    half = sum(weight for _, weight in values) / 2
+    seen = 0
+    for value, weight in values:
+        seen += weight
+        if seen >= half:
+            return value
+    return 0.0
+
+
+def mann_whitney(first, second):
+    '''
+    Двусторонний критерий Манна-Уитни для взвешенных выборок: нормальное приближение
+    с поправкой на связи и на непрерывность.
+    :param first: Пары (значение, вес).
+    :param second: Пары (значение, вес).
+    :return: Пара (U для first, p-value).
+    '''
+    n1 = sum(weight for _, weight in first)
+    n2 = sum(weight for _, weight in second)
+    total = n1 + n2
+    if not n1 or not n2:
+        return 0.0, 1.0
+    # Значение -> [вес в first, вес в second]
+    groups = {}
+    for index, sample in enumerate((first, second)):
+        for value, weight in sample:
+            groups.setdefault(value, [0, 0])[index] += weight
+    rank_sum, rank, ties = 0.0, 0, 0
+    for value in sorted(groups):
+        in_first, in_second = groups[value]
+        size = in_first + in_second
+        # Связанные значения получают средний ранг
+        rank_sum += in_first * (rank + (size + 1) / 2)
+        rank += size
+        ties += size ** 3 - size
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = max(abs(u - mean) - 0.5, 0.0) / math.sqrt(variance)
+    return u, math.erfc(z / math.sqrt(2))
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+    p_value: float
+    verdict: str  # regression, improvement, same, insufficient
+
+    @property
+    def change(self):
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def compare(store, kind='endpoint', environment=None, current_runs=DEFAULT_CURRENT_RUNS,
+            baseline_runs=DEFAULT_BASELINE_RUNS, alpha=DEFAULT_ALPHA, min_change=DEFAULT_MIN_CHANGE,
+            min_samples=DEFAULT_MIN_SAMPLES):
+    '''
+    Сравнение последних current_runs прогонов с baseline_runs прогонами до них (того же окружения)
+    по медианам прогонов. Регрессия - значимый (p < alpha) рост медианы больше чем на min_change,
+    улучшение - такое же падение.
+    :param min_samples: Минимум прогонов с замером в каждой группе, иначе 'insufficient'.
+    :return: Список Comparison: сначала регрессии, затем улучшения, по убыванию изменения.
+    '''
+    runs = store.runs(environment, current_runs + baseline_runs)
+    current = store.run_medians([run.id for run in runs[:current_runs]], kind)
+    baseline = store.run_medians([run.id for run in runs[current_runs:]], kind)
+
+    comparisons = []
+    for name in sorted(current):
+        now, before = current[name], baseline.get(name, [])
+        if len(now) < min_samples or len(before) < min_samples:
+            comparisons.append(Comparison(name, weighted_median(before) if before else 0.0,
+                                          weighted_median(now), 1.0, 'insufficient'))
+            continue
+        _, p_value = mann_whitney(now, before)
+        result = Comparison(name, weighted_median(before), weighted_median(now), p_value, 'same')
+        if p_value < alpha and result.change > min_change:
+            result.verdict = 'regression'
+        elif p_value < alpha and result.change < -min_change:
+            result.verdict = 'improvement'
+        comparisons.append(result)
+    order = {'regression': 0, 'improvement': 1, 'same': 2, 'insufficient': 3}
+    return sorted(comparisons, key=lambda item: (order[item.verdict], -abs(item.change)))
+
+
+def format_comparisons(comparisons, only_flagged=False):
+    lines = [f"{'name':<50} {'baseline, ms':>12} {'current, ms':>11} {'change':>8} {'p-value':>9}  verdict"]
+    for item in comparisons:
+        if only_flagged and item.verdict not in ('regression', 'improvement'):
+            continue
+        lines.append(f'{item.name[-50:]:<50} {item.baseline * 1000:>12.1f} {item.current * 1000:>11.1f} '
+                     f'{item.change:>+8.1%} {item.p_value:>9.2g}  {item.verdict}')
+    return '\n'.join(lines)
+
+
+def trend(store, kind='endpoint', environment=None, runs=8):
+    '''
+    Таблица медиан по последним прогонам: строка - эндпойнт или тест, столбец - прогон (старые слева).
+    '''
+    selected = store.runs(environment, runs)[::-1]
+    columns = [store.samples([run.id], kind) for run in selected]
+    names = sorted({name for column in columns for name in column})
+    lines = [f"{'name':<50} " + ' '.join(f'{run.git_sha[:8]:>9}' for run in selected)]
+    for name in names:
+        cells = [f'{weighted_median(column[name]) * 1000:>9.1f}' if name in column else f"{'-':>9}"
+                 for column in columns]
+        lines.append(f'{name[-50:]:<50} ' + ' '.join(cells))
+    return '\n'.join(lines)
+
+
+class PerfHistoryPlugin:
+    '''
+    Плагин pytest: сохранение прогона в ResultsStore и сравнение эндпойнтов последних
+    DEFAULT_CURRENT_RUNS прогонов с базовой линией в итогах. Под xdist воркеры передают
+    гистограммы основному процессу.
+    '''
+
+    def __init__(self, path, environment, baseline_runs=DEFAULT_BASELINE_RUNS):
+        self.path = path
+        self.environment = environment
+        self.baseline_runs = baseline_runs
+        self.tests = {}
+        self.failed = set()
+        # 'METHOD /шаблон' -> {секунды: количество}, от воркеров xdist
+        self.endpoints = {}
+        self.run_id = None
+        self.comparisons = []
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'call' and report.passed:
+            self.tests[report.nodeid] = report.duration
+        elif report.failed:
+            self.failed.add(report.nodeid)
+
+    def _merge(self, endpoints):
+        for name, values in endpoints.items():
+            merged = self.endpoints.setdefault(name, {})
+            for value, count in values:
+                merged[value] = merged.get(value, 0) + count
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        self._merge(getattr(node, 'workeroutput', {}).get('perf_history', {}))
+
+    def pytest_sessionfinish(self, session):
+        local = {name: histogram.values() for name, histogram in
+                 ((f'{method} {template}', histogram)
+                  for (method, template), histogram in latency_registry.histograms.items())}
+        workeroutput = getattr(session.config, 'workeroutput', None)
+        if workeroutput is not None:
+            workeroutput['perf_history'] = local
+            return
+        self._merge(local)
+        if not self.tests and not self.endpoints:
+            return
+        store = ResultsStore(self.path)
+        try:
+            endpoints = {name: sorted(values.items()) for name, values in self.endpoints.items()}
+            self.run_id = store.add_run(git_sha(str(session.config.rootpath)), self.environment, endpoints,
+                                        self.tests, len(self.failed))
+            if len(store.runs(self.environment, 2)) > 1:
+                self.comparisons = compare(store, environment=self.environment, baseline_runs=self.baseline_runs)
+        finally:
+            store.close()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.run_id is None:
+            return
+        terminalreporter.write_sep('=', 'Performance vs baseline')
+        flagged = [item for item in self.comparisons if item.verdict in ('regression', 'improvement')]
+        if flagged:
+            terminalreporter.write_line(format_comparisons(flagged))
+        terminalreporter.write_line(f'run {self.run_id} ({self.environment}) saved to {self.path}, '
+                                    f'{len(flagged)} significant changes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='История производительности прогонов Cinescope')
+    parser.add_argument('command', choices=('compare', 'trend', 'runs'))
+    parser.add_argument('--db', default=RESULTS_DB_PATH, required=RESULTS_DB_PATH is None,
+                        help='Файл базы (по умолчанию CINESCOPE_RESULTS_DB)')
+    parser.add_argument('--env', default=None, help='Окружение (по умолчанию все)')
+    parser.add_argument('--kind', choices=KINDS, default='endpoint')
+    parser.add_argument('--current', type=int, default=DEFAULT_CURRENT_RUNS,
+                        help='compare: сколько последних прогонов сравнивать')
+    parser.add_argument('--baseline', type=int, default=DEFAULT_BASELINE_RUNS,
+                        help='compare: сколько прогонов до них берётся в базовую линию')
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help='compare: уровень значимости')
+    parser.add_argument('--min-change', type=float, default=DEFAULT_MIN_CHANGE,
+                        help='compare: минимальное изменение медианы (доля)')
+    parser.add_argument('--min-samples', type=int, default=DEFAULT_MIN_SAMPLES,
+                        help='compare: минимум прогонов с замером в каждой группе')
+    parser.add_argument('--all', action='store_true', help='compare: показывать и незначимые изменения')
+    parser.add_argument('--runs', type=int, default=8, help='trend/runs: сколько прогонов')
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    try:
+        if args.command == 'runs':
+            for run in store.runs(args.env, args.runs):
+                started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started_at))
+                print(f'{run.id:>5} {started} {run.git_sha:<12} {run.environment:<12} '
+                      f'tests: {run.tests} failed: {run.failed}')
+            return
+        if args.command == 'trend':
+            print(trend(store, args.kind, args.env, args.runs))
+            return
+        comparisons = compare(store, args.kind, args.env, args.current, args.baseline, args.alpha, args.min_change,
+                              args.min_samples)
+    finally:
+        store.close()
+    print(format_comparisons(comparisons, only_flagged=not args.all))
+    regressions = sum(item.verdict == 'regression' for item in comparisons)
+    print(f'regressions: {regressions}, improvements: {sum(item.verdict == "improvement" for item in comparisons)}')
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
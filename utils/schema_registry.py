@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'schemas')
+
+
+class SchemaRegistry:
+    '''
+    Реестр JSON-схем из каталога schemas/.
+    Каждая схема читается, проверяется и компилируется в валидатор один раз за процесс,
+    дальше отдаётся закэшированный объект валидатора.
+    '''
+
+    def __init__(self, schemas_dir=SCHEMAS_DIR):
+        '''
+        :param schemas_dir: Каталог с JSON-схемами.
+        '''
+        self.schemas_dir = schemas_dir
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def get_validator(self, name):
+        '''
+        Получение скомпилированного валидатора по имени схемы.
+        :param name: Имя схемы без расширения (например, get_movies).
+        :return: Экземпляр валидатора jsonschema.
+        '''
+        validator = self._validators.get(name)
+        if validator is None:
+            with self._lock:
+                validator = self._validators.get(name)
+                if validator is None:
+                    validator = self._validators[name] = self._compile(name)
+        return validator
+
+    def _compile(self, name):
+        # jsonschema импортируется при первой валидации, а не при старте прогона
+        from jsonschema.validators import validator_for
+
+        schema_path = os.path.join(self.schemas_dir, f'{name}.json')
+        with open(schema_path, encoding='utf-8') as file:
+            schema = json.load(file)
+        validator_cls = validator_for(schema)
+        validator_cls.check_schema(schema)
+        return validator_cls(schema)
+
+    def preload(self):
+        '''
+        Компиляция всех схем каталога заранее.
+        '''
+        for file_name in sorted(os.listdir(self.schemas_dir)):
+            if file_name.endswith('.json'):
+                self.get_validator(file_name[:-len('.json')])
+
+    def validate(self, instance, name):
+        '''
+        Валидация данных по схеме. Ошибка выбирается так же, как в jsonschema.validate.
+        :param instance: Данные для проверки (например, response.json()).
+        :param name: Имя схемы без расширения.
+        '''
+        from jsonschema.exceptions import best_match
+
+        error = best_match(self.get_validator(name).iter_errors(instance))
+        if error is not None:
+            raise error
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,292 @@
+'''
+Проверка согласованности чтения после записи на /movies под нагрузкой.
+
+Писатели обновляют свои фильмы (у каждого фильма ровно один писатель, поэтому версии
+растут строго по порядку), читатели читают случайные фильмы. Все операции пишутся
+в историю с временем начала и конца, после прогона история проверяется на:
+- устаревшие чтения: чтение началось после подтверждения записи версии k, а вернуло версию < k;
+- потерянные обновления: итоговое состояние фильма старше последней подтверждённой записи;
+- задержку видимости: время от подтверждения записи до первого чтения, вернувшего её версию
+  (оценка сверху, с точностью до частоты чтений этого фильма).
+
+Итоговое состояние читается с повторами; фильмы, которые так и не удалось прочитать,
+попадают в отчёт отдельно от потерянных обновлений.
+
+Запуск:
+    python -m utils.soak_checker --stub --writers 4 --readers 16 --duration 30
+    python -m utils.soak_checker --duration 600    # против окружения из .env
+'''
+import argparse
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from custom_requester.metrics import LatencyHistogram
+from custom_requester.token_provider import BearerAuth, TokenProvider
+from custom_requester.transport import build_session
+from tests.api.api_manager import ApiManager
+from utils.data_generator import DataGenerator
+from utils.stub_server import CinescopeStubServer
+
+VERSION_PREFIX = 'soak v'
+FINAL_READ_ATTEMPTS = 3
+
+
+def version_marker(version):
+    return f'{VERSION_PREFIX}{version}'
+
+
+def parse_version(description):
+    '''
+    :return: Версия из описания фильма или None, если описание не от soak-проверки.
+    '''
+    if description and description.startswith(VERSION_PREFIX):
+        return int(description[len(VERSION_PREFIX):])
+    return None
+
+
+@dataclass
+class SoakReport:
+    duration: float = 0.0
+    writes: int = 0
+    reads: int = 0
+    errors: int = 0
+    # (movie_id, прочитанная версия, ожидаемая минимум)
+    stale_reads: list = field(default_factory=list)
+    # (movie_id, итоговая версия, последняя подтверждённая)
+    lost_updates: list = field(default_factory=list)
+    # movie_id, итоговое состояние которых прочитать не удалось
+    final_read_failures: list = field(default_factory=list)
+    lag: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def ok(self):
+        return not (self.stale_reads or self.lost_updates or self.final_read_failures)
+
+    def format(self, limit=10):
+        lines = [f'duration: {self.duration:.1f}s, writes: {self.writes}, reads: {self.reads}, '
+                 f'errors: {self.errors}',
+                 f'stale reads: {len(self.stale_reads)}, lost updates: {len(self.lost_updates)}, '
+                 f'final read failures: {len(self.final_read_failures)}']
+        if self.lag.count:
+            summary = self.lag.summary()
+            lines.append('visibility lag (until first read), ms: ' + ', '.join(
+                f'{key} {summary[key] * 1000:.1f}' for key in ('p50', 'p95', 'p99', 'max')))
+        for movie_id, seen, expected in self.stale_reads[:limit]:
+            lines.append(f'stale read: movie {movie_id} returned v{seen}, expected >= v{expected}')
+        for movie_id, final, expected in self.lost_updates[:limit]:
+            lines.append(f'lost update: movie {movie_id} is at v{final}, last acknowledged v{expected}')
+        for movie_id in self.final_read_failures[:limit]:
+            lines.append(f'final read failed: movie {movie_id}, lost updates not checked')
+        return '\n'.join(lines)
+
+
+def analyze(operations, final_versions, duration=0.0):
+    '''
+    Проверка истории операций.
+    :param operations: Кортежи (вид 'write'/'read', movie_id, версия, начало, конец, ошибка или None).
+    :param final_versions: Словарь movie_id -> версия, прочитанная после остановки нагрузки;
+        фильма нет в словаре - итоговое чтение не удалось.
+    :param duration: Длительность прогона (для отчёта).
+    :return: SoakReport.
+    '''
+    report = SoakReport(duration=duration)
+    # movie_id -> версии и времена подтверждения записей (по возрастанию версии и времени)
+    acked = {}
+    reads = []
+    for kind, movie_id, version, start, end, error in operations:
+        if error is not None:
+            report.errors += 1
+            continue
+        if kind == 'write':
+            report.writes += 1
+            acked.setdefault(movie_id, []).append((version, end))
+        else:
+            report.reads += 1
+            reads.append((movie_id, version, start, end))
+
+    ack_versions, ack_ends, seen_at = {}, {}, {}
+    for movie_id, writes in acked.items():
+        writes.sort()
+        ack_versions[movie_id] = [version for version, _ in writes]
+        ack_ends[movie_id] = [end for _, end in writes]
+        seen_at[movie_id] = {}
+
+    for movie_id, seen, start, end in reads:
+        ends = ack_ends.get(movie_id)
+        if not ends:
+            continue
+        if seen is not None:
+            # Самое раннее завершение чтения, вернувшего версию seen
+            seen_at[movie_id][seen] = min(end, seen_at[movie_id].get(seen, end))
+        # Последняя запись, подтверждённая до начала чтения
+        index = bisect_left(ends, start) - 1
+        if index < 0:
+            continue
+        expected = ack_versions[movie_id][index]
+        if seen is None or seen < expected:
+            report.stale_reads.append((movie_id, seen, expected))
+
+    for movie_id, versions in ack_versions.items():
+        if movie_id not in final_versions:
+            report.final_read_failures.append(movie_id)
+        else:
+            final = final_versions[movie_id]
+            if final is None or final < versions[-1]:
+                report.lost_updates.append((movie_id, final, versions[-1]))
+        # Версию v показывает и любое чтение более новой версии: идём от новых версий к старым
+        first_seen = sorted(seen_at[movie_id].items(), reverse=True)
+        earliest, position = None, 0
+        for version, ack_end in reversed(list(zip(versions, ack_ends[movie_id]))):
+            while position < len(first_seen) and first_seen[position][0] >= version:
+                end = first_seen[position][1]
+                earliest = end if earliest is None else min(earliest, end)
+                position += 1
+            # Запись, которую ни одно чтение не увидело, в задержку не попадает
+            if earliest is not None:
+                report.lag.record(max(earliest - ack_end, 0.0))
+    return report
+
+
+class SoakChecker:
+    '''
+    Прогон писателей и читателей в потоках с записью истории операций.
+    '''
+
+    def __init__(self, movies_api, writers=4, readers=8, movies_per_writer=2, duration=60.0):
+        '''
+        :param movies_api: MoviesApi с правами на создание и изменение фильмов.
+        :param writers: Количество потоков-писателей.
+        :param readers: Количество потоков-читателей.
+        :param movies_per_writer: Сколько фильмов обновляет каждый писатель.
+        :param duration: Длительность нагрузки в секундах.
+        '''
+        self.movies_api = movies_api
+        self.writers = writers
+        self.readers = readers
+        self.movies_per_writer = movies_per_writer
+        self.duration = duration
+        # list.append потокобезопасен - отдельная блокировка не нужна
+        self.operations = []
+        self._stop = threading.Event()
+
+    def _setup(self):
+        payloads = [{**DataGenerator.generate_movie_data(), 'description': version_marker(0)}
+                    for _ in range(self.writers * self.movies_per_writer)]
+        start = time.monotonic()
+        movie_ids = []
+        for result in self.movies_api.create_movies(payloads):
+            if not result.ok:
+                raise result.error
+            movie_ids.append(result.value.json()['id'])
+        end = time.monotonic()
+        for movie_id in movie_ids:
+            self.operations.append(('write', movie_id, 0, start, end, None))
+        return movie_ids
+
+    def _writer(self, movie_ids):
+        versions = dict.fromkeys(movie_ids, 0)
+        while not self._stop.is_set():
+            for movie_id in movie_ids:
+                versions[movie_id] += 1
+                version = versions[movie_id]
+                start = time.monotonic()
+                try:
+                    self.movies_api.update_movie(movie_id, {'description': version_marker(version)})
+                    error = None
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+                self.operations.append(('write', movie_id, version, start, time.monotonic(), error))
+
+    def _reader(self, movie_ids):
+        while not self._stop.is_set():
+            movie_id = random.choice(movie_ids)
+            start = time.monotonic()
+            version, error = None, None
+            try:
+                version = parse_version(self.movies_api.get_movie_by_id(movie_id).json().get('description'))
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            self.operations.append(('read', movie_id, version, start, time.monotonic(), error))
+
+    def _read_final(self, movie_ids):
+        '''
+        Итоговое чтение фильмов с повторами: сбой чтения - не потерянное обновление.
+        :return: Словарь movie_id -> версия; фильмы, которые не удалось прочитать, в него не попадают.
+        '''
+        final_versions, pending = {}, list(movie_ids)
+        for _ in range(FINAL_READ_ATTEMPTS):
+            if not pending:
+                break
+            failed = []
+            for result in self.movies_api.get_movies_by_ids(pending):
+                if result.ok:
+                    final_versions[result.item] = parse_version(result.value.json().get('description'))
+                else:
+                    failed.append(result.item)
+            pending = failed
+        return final_versions
+
+    def run(self):
+        '''
+        :return: SoakReport.
+        '''
+        movie_ids = self._setup()
+        threads = [threading.Thread(target=self._writer, args=(movie_ids[i::self.writers],), daemon=True)
+                   for i in range(self.writers)]
+        threads += [threading.Thread(target=self._reader, args=(movie_ids,), daemon=True)
+                    for _ in range(self.readers)]
+        started_at = time.monotonic()
+        try:
+            for thread in threads:
+                thread.start()
+            self._stop.wait(self.duration)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        elapsed = time.monotonic() - started_at
+        try:
+            final_versions = self._read_final(movie_ids)
+        finally:
+            self.movies_api.delete_movies(movie_ids, expected_status=200, missing_ok=True)
+        return analyze(self.operations, final_versions, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка чтения после записи на /movies под нагрузкой')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--movies-per-writer', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=60, help='Длительность, секунды')
+    parser.add_argument('--stub', action='store_true', help='Прогон против локальной заглушки Cinescope')
+    args = parser.parse_args()
+
+    stub = None
+    if args.stub:
+        stub = CinescopeStubServer().start()
+        api_manager = ApiManager(build_session(), auth=BearerAuth(TokenProvider(cache_path=None)),
+                                 base_url=stub.base_url, movies_url=stub.base_url)
+        creds = (stub.admin_email, stub.admin_password)
+    else:
+        load_dotenv()
+        api_manager = ApiManager(build_session())
+        creds = (os.getenv('USERNAME'), os.getenv('PASSWORD'))
+    try:
+        api_manager.auth_api.authenticate(creds)
+        report = SoakChecker(api_manager.movies_api, args.writers, args.readers,
+                             args.movies_per_writer, args.duration).run()
+    finally:
+        if stub is not None:
+            stub.stop()
+    print(report.format())
+    raise SystemExit(0 if report.ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+Профиль старта прогона: время импорта по модулям и пакетам.
+Сбор тестов (pytest --collect-only) запускается в отдельном процессе с -X importtime,
+потому что к моменту разбора опций текущий процесс уже всё импортировал.
+Вызывается из conftest.py опцией --startup-profile.
+'''
+import subprocess
+import sys
+import time
+
+IMPORTTIME_PREFIX = 'import time:'
+
+
+def parse_importtime(lines):
+    '''
+    Разбор вывода -X importtime.
+    :return: Список кортежей (модуль, собственное время в мкс, вместе с вложенными импортами в мкс).
+    '''
+    records = []
+    for line in lines:
+        if not line.startswith(IMPORTTIME_PREFIX):
+            continue
+        self_us, cumulative_us, name = line[len(IMPORTTIME_PREFIX):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # строка заголовка
+        records.append((name.strip(), int(self_us), int(cumulative_us)))
+    return records
+
+
+def profile_startup(pytest_args, cwd=None):
+    '''
+    Сбор тестов с теми же аргументами в отдельном процессе.
+    :return: Пара (время сбора в секундах, записи parse_importtime).
+    '''
+    command = [sys.executable, '-X', 'importtime', '-m', 'pytest', '--collect-only', '-q', *pytest_args]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+    return time.perf_counter() - start, parse_importtime(result.stderr.splitlines())
+
+
+def format_report(elapsed, records, top=20):
+    '''
+    Текстовый отчёт: суммарное время импорта по пакетам верхнего уровня и самые медленные модули.
+    '''
+    packages = {}
+    for name, self_us, _ in records:
+        package = name.split('.', 1)[0]
+        packages[package] = packages.get(package, 0) + self_us
+    total = sum(packages.values())
+    lines = [f'collect-only: {elapsed:.2f}s, imports: {total / 1e6:.2f}s in {len(records)} modules', '',
+             f"{'package':<40} {'import, ms':>10}"]
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f'{package:<40} {self_us / 1000:>10.1f}')
+    lines += ['', f"{'module':<50} {'self, ms':>9} {'total, ms':>10}"]
+    for name, self_us, cumulative_us in sorted(records, key=lambda record: record[1], reverse=True)[:top]:
+        lines.append(f'{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}')
+    return '\n'.join(lines)
@@ -0,0 +1,535 @@
+'''
+Локальная in-process заглушка сервисов Cinescope: /register, /login, /users/{id}
+и CRUD /movies с пагинацией и фильтрами. Ответы соответствуют схемам из schemas/.
+Состояние хранится в памяти в индексированных таблицах, можно добавлять задержку и ошибки.
+
+Запуск отдельно: python -m utils.stub_server --port 8000 --movies 1000
+Админ - из STUB_ADMIN_EMAIL/STUB_ADMIN_PASSWORD (или .env), иначе admin@cinescope.local.
+'''
+import argparse
+import base64
+import bisect
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from utils.data_generator import DataGenerator
+
+DEFAULT_ADMIN_EMAIL = 'admin@cinescope.local'
+DEFAULT_ADMIN_PASSWORD = 'Admin1234'
+GENRES = {1: 'Драма', 2: 'Комедия', 3: 'Боевик', 4: 'Ужасы'}
+ADMIN_ROLES = {'ADMIN', 'SUPER_ADMIN'}
+MOVIE_REQUIRED_FIELDS = ('name', 'price', 'description', 'location', 'published', 'genreId')
+# Поля фильма с индексами для фильтров списка
+MOVIE_INDEXED_FIELDS = ('genreId', 'location', 'published')
+MAX_PAGE_SIZE = 20
+TOKEN_TTL = 30 * 60
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+class StubError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class FaultConfig:
+    '''
+    Внедрение задержек и ошибок: каждый запрос ждёт latency + random(0, jitter) секунд
+    и с вероятностью error_rate получает error_status (с заголовком Retry-After).
+    '''
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: int = 1
+
+
+def _index_value(field, value):
+    # published приходит в query строкой 'true'/'false'
+    return str(value).lower() if field == 'published' else value
+
+
+def _sorted_remove(items, item):
+    index = bisect.bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
+
+
+class CinescopeState:
+    '''
+    Таблицы пользователей и фильмов с индексами по email и названию.
+    Для списка фильмов - отсортированные индексы: id (порядок создания), (цена, id)
+    и id по жанру, локации и признаку published. Страница без фильтров - срез списка id,
+    с фильтрами просматривается только самый узкий индекс.
+    '''
+
+    def __init__(self, admin_email=DEFAULT_ADMIN_EMAIL, admin_password=DEFAULT_ADMIN_PASSWORD):
+        self.lock = threading.Lock()
+        self.secret = os.urandom(16)
+        self.users = {}
+        self.users_by_email = {}
+        self.movies = {}
+        self.movies_by_name = {}
+        self.movie_ids = []
+        self.movies_by_price = []
+        # Поле -> значение -> отсортированный список id
+        self.movie_index = {field: {} for field in MOVIE_INDEXED_FIELDS}
+        self._movie_ids = itertools.count(1)
+        self.admin = self.add_user(admin_email, 'Cinescope Admin', admin_password, ['SUPER_ADMIN'])
+
+    # --- пользователи ---
+
+    def add_user(self, email, full_name, password, roles=('USER',)):
+        user = {
+            'id': str(uuid.uuid4()),
+            'email': email,
+            'fullName': full_name,
+            'roles': list(roles),
+            'verified': True,
+            'createdAt': _now_iso(),
+            'banned': False,
+        }
+        with self.lock:
+            if email in self.users_by_email:
+                raise StubError(409, 'Пользователь с таким email уже зарегистрирован')
+            self.users[user['id']] = {**user, 'password': password}
+            self.users_by_email[email] = user['id']
+        return user
+
+    @staticmethod
+    def public_user(user, full=True):
+        keys = ('id', 'email', 'fullName', 'roles', 'verified', 'createdAt', 'banned') if full \
+            else ('id', 'email', 'fullName', 'roles')
+        return {key: user[key] for key in keys}
+
+    def register(self, body):
+        for field in ('email', 'fullName', 'password', 'passwordRepeat'):
+            if not body.get(field):
+                raise StubError(400, f'Поле {field} обязательно')
+        if body['password'] != body['passwordRepeat']:
+            raise StubError(400, 'Пароли не совпадают')
+        return self.add_user(body['email'], body['fullName'], body['password'])
+
+    def login(self, body):
+        user_id = self.users_by_email.get(body.get('email') or '')
+        user = self.users.get(user_id)
+        if user is None or user['password'] != body.get('password'):
+            raise StubError(401, 'Неверный логин или пароль')
+        return {
+            'user': self.public_user(user, full=False),
+            'accessToken': self.issue_token(user),
+            'refreshToken': str(uuid.uuid4()),
+            'expiresIn': int((time.time() + TOKEN_TTL) * 1000),
+        }
+
+    def issue_token(self, user):
+        header = _b64(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+        payload = _b64(json.dumps({'id': user['id'], 'email': user['email'], 'roles': user['roles'],
+                                   'exp': int(time.time()) + TOKEN_TTL}).encode())
+        signature = _b64(hmac.new(self.secret, f'{header}.{payload}'.encode(), hashlib.sha256).digest())
+        return f'{header}.{payload}.{signature}'
+
+    def authorize(self, authorization, admin=False):
+        '''
+        Проверка заголовка Authorization: подпись, срок действия и (при admin=True) роль.
+        :return: Пользователь из таблицы.
+        '''
+        if not authorization or not authorization.startswith('Bearer '):
+            raise StubError(401, 'Unauthorized')
+        try:
+            header, payload, signature = authorization[len('Bearer '):].split('.')
+            expected = _b64(hmac.new(self.secret, f'{header}.{payload}'.encode(), hashlib.sha256).digest())
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except ValueError:
+            raise StubError(401, 'Unauthorized')
+        user = self.users.get(claims.get('id'))
+        if not hmac.compare_digest(signature, expected) or claims['exp'] < time.time() or user is None:
+            raise StubError(401, 'Unauthorized')
+        if admin and not ADMIN_ROLES & set(user['roles']):
+            raise StubError(403, 'Forbidden resource')
+        return user
+
+    def get_user(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            raise StubError(404, 'Пользователь не найден')
+        return self.public_user(user)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            user = self.users.pop(user_id, None)
+            if user is None:
+                raise StubError(404, 'Пользователь не найден')
+            self.users_by_email.pop(user['email'], None)
+
+    # --- фильмы ---
+
+    def _index_movie(self, movie):
+        movie_id = movie['id']
+        # id растут, поэтому новый фильм - в конец; insort нужен для переиндексации при update
+        bisect.insort(self.movie_ids, movie_id)
+        bisect.insort(self.movies_by_price, (movie['price'], movie_id))
+        for field, index in self.movie_index.items():
+            bisect.insort(index.setdefault(_index_value(field, movie[field]), []), movie_id)
+
+    def _unindex_movie(self, movie):
+        movie_id = movie['id']
+        _sorted_remove(self.movie_ids, movie_id)
+        _sorted_remove(self.movies_by_price, (movie['price'], movie_id))
+        for field, index in self.movie_index.items():
+            _sorted_remove(index.get(_index_value(field, movie[field]), []), movie_id)
+
+    @staticmethod
+    def _check_price(body):
+        price = body.get('price', 0)
+        if isinstance(price, bool) or not isinstance(price, (int, float)):
+            raise StubError(400, 'Цена должна быть числом')
+
+    def create_movie(self, body):
+        missing = [field for field in MOVIE_REQUIRED_FIELDS if field not in body]
+        if missing:
+            raise StubError(400, f"Поля {', '.join(missing)} обязательны")
+        self._check_price(body)
+        genre_id = body['genreId']
+        if genre_id not in GENRES:
+            raise StubError(400, 'Жанр не найден')
+        with self.lock:
+            if body['name'] in self.movies_by_name:
+                raise StubError(409, 'Фильм с таким названием уже существует')
+            movie = {
+                'id': next(self._movie_ids),
+                'name': body['name'],
+                'price': body['price'],
+                'description': body['description'],
+                'imageUrl': body.get('imageUrl', ''),
+                'location': body['location'],
+                'published': body['published'],
+                'genreId': genre_id,
+                'genre': {'name': GENRES[genre_id]},
+                'createdAt': _now_iso(),
+                'rating': 0,
+            }
+            self.movies[movie['id']] = movie
+            self.movies_by_name[movie['name']] = movie['id']
+            self._index_movie(movie)
+        return dict(movie)
+
+    def get_movie(self, movie_id):
+        movie = self.movies.get(movie_id)
+        if movie is None:
+            raise StubError(404, 'Фильм не найден')
+        return {**movie, 'reviews': []}
+
+    def update_movie(self, movie_id, body):
+        with self.lock:
+            movie = self.movies.get(movie_id)
+            if movie is None:
+                raise StubError(404, 'Фильм не найден')
+            name = body.get('name', movie['name'])
+            if name != movie['name'] and name in self.movies_by_name:
+                raise StubError(409, 'Фильм с таким названием уже существует')
+            if 'genreId' in body and body['genreId'] not in GENRES:
+                raise StubError(400, 'Жанр не найден')
+            self._check_price(body)
+            updated = {**movie, **{key: value for key, value in body.items()
+                                   if key in MOVIE_REQUIRED_FIELDS or key == 'imageUrl'}}
+            updated['genre'] = {'name': GENRES[updated['genreId']]}
+            self.movies_by_name.pop(movie['name'])
+            self.movies_by_name[name] = movie_id
+            self.movies[movie_id] = updated
+            self._unindex_movie(movie)
+            self._index_movie(updated)
+        return dict(updated)
+
+    def delete_movie(self, movie_id):
+        with self.lock:
+            movie = self.movies.pop(movie_id, None)
+            if movie is None:
+                raise StubError(404, 'Фильм не найден')
+            self.movies_by_name.pop(movie['name'], None)
+            self._unindex_movie(movie)
+        return movie
+
+    def list_movies(self, query):
+        def param(name, cast, default):
+            try:
+                return cast(query[name][0]) if name in query else default
+            except ValueError:
+                raise StubError(400, f'Некорректный параметр {name}')
+
+        page = param('page', int, 1)
+        page_size = param('pageSize', int, 10)
+        if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise StubError(400, 'Некорректные параметры пагинации')
+        min_price = param('minPrice', int, None)
+        max_price = param('maxPrice', int, None)
+        genre_id = param('genreId', int, None)
+        published = query.get('published', [None])[0]
+        locations = set(','.join(query.get('locations', [])).split(',')) - {''}
+
+        start = (page - 1) * page_size
+        with self.lock:
+            # Кандидаты - самый узкий из подходящих индексов, остальные фильтры проверяются по фильмам
+            candidates = [self.movie_ids]
+            if min_price is not None or max_price is not None:
+                low = bisect.bisect_left(self.movies_by_price, (min_price,)) if min_price is not None else 0
+                high = bisect.bisect_left(self.movies_by_price, (max_price + 1,)) if max_price is not None \
+                    else len(self.movies_by_price)
+                candidates.append(sorted(movie_id for _, movie_id in self.movies_by_price[low:high]))
+            if genre_id is not None:
+                candidates.append(self.movie_index['genreId'].get(genre_id, []))
+            if published is not None:
+                candidates.append(self.movie_index['published'].get(published.lower(), []))
+            if locations:
+                by_location = self.movie_index['location']
+                candidates.append(sorted(itertools.chain.from_iterable(by_location.get(location, [])
+                                                                       for location in locations)))
+            ids = min(candidates, key=len)
+            if len(candidates) > 1:
+                ids = [movie_id for movie_id in ids if self._matches(self.movies[movie_id], min_price, max_price,
+                                                                     genre_id, published, locations)]
+            count = len(ids)
+            if query.get('createdAt', ['desc'])[0] == 'desc':
+                page_ids = ids[max(count - start - page_size, 0):max(count - start, 0)][::-1]
+            else:
+                page_ids = ids[start:start + page_size]
+            movies = [self.movies[movie_id] for movie_id in page_ids]
+        return {
+            'movies': movies,
+            'count': count,
+            'page': page,
+            'pageSize': page_size,
+            'pageCount': max((count + page_size - 1) // page_size, 1),
+        }
+
+
+    @staticmethod
+    def _matches(movie, min_price, max_price, genre_id, published, locations):
+        return ((min_price is None or movie['price'] >= min_price)
+                and (max_price is None or movie['price'] <= max_price)
+                and (genre_id is None or movie['genreId'] == genre_id)
+                and (published is None or str(movie['published']).lower() == published.lower())
+                and (not locations or movie['location'] in locations))
+
+
+class CinescopeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'CinescopeStub/1.0'
+    # Заголовки и тело уходят разными write - без TCP_NODELAY ответ ждёт delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        stub = self.server.stub
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+
+        faults = stub.faults
+        delay = faults.latency + (random.uniform(0, faults.jitter) if faults.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if faults.error_rate and random.random() < faults.error_rate:
+            self._send(faults.error_status, {'message': 'Injected failure', 'statusCode': faults.error_status},
+                       {'Retry-After': str(faults.retry_after)})
+            return
+
+        try:
+            body = json.loads(raw_body) if raw_body else {}
+            if not isinstance(body, dict):
+                raise StubError(400, 'Тело запроса должно быть JSON-объектом')
+            status, payload = stub.route(method, parts.path, parse_qs(parts.query), body,
+                                         self.headers.get('Authorization'))
+        except StubError as e:
+            status, payload = e.status, {'message': e.message, 'error': self.responses[e.status][0],
+                                         'statusCode': e.status}
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = 400, {'message': str(e), 'error': 'Bad Request', 'statusCode': 400}
+        self._send(status, payload)
+
+    def _send(self, status, payload, headers=None):
+        data = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode()
+        if self.command == 'GET' and status == 200:
+            # ETag по содержимому ответа; совпавший If-None-Match получает 304 без тела
+            etag = f'"{hashlib.blake2b(data, digest_size=12).hexdigest()}"'
+            headers = {**(headers or {}), 'ETag': etag}
+            if etag in self.headers.get('If-None-Match', ''):
+                status, data = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class CinescopeHTTPServer(ThreadingHTTPServer):
+    '''
+    Очередь входящих соединений больше стандартных 5: при параллельных клиентах
+    переполненный backlog даёт секундные задержки на повторной отправке SYN.
+    '''
+    request_queue_size = 128
+    daemon_threads = True
+
+
+_MOVIE_PATH = re.compile(r'^/movies/(\d+)$')
+_USER_PATH = re.compile(r'^/users/([^/]+)$')
+
+
+class CinescopeStubServer:
+    '''
+    HTTP-заглушка в фоновом потоке. Один порт обслуживает и auth-, и movies-эндпойнты,
+    поэтому base_url подходит и вместо BASE_URL, и вместо MOVIES_URL.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=0, admin_email=None, admin_password=None, faults=None):
+        '''
+        :param host: Адрес для прослушивания.
+        :param port: Порт (0 - любой свободный).
+        :param admin_email: Email предсозданного админа (по умолчанию DEFAULT_ADMIN_EMAIL).
+        :param admin_password: Пароль предсозданного админа.
+        :param faults: FaultConfig для внедрения задержек и ошибок.
+        '''
+        self.admin_email = admin_email or DEFAULT_ADMIN_EMAIL
+        self.admin_password = admin_password or DEFAULT_ADMIN_PASSWORD
+        self.state = CinescopeState(self.admin_email, self.admin_password)
+        self.faults = faults or FaultConfig()
+        self.httpd = CinescopeHTTPServer((host, port), CinescopeStubHandler)
+        self.httpd.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='cinescope-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def seed_movies(self, count, seed=None):
+        '''
+        Наполнение каталога случайными фильмами.
+        '''
+        for movie in DataGenerator.generate_movies(count, seed=seed):
+            self.state.create_movie(movie)
+
+    def route(self, method, path, query, body, authorization):
+        '''
+        Маршрутизация запроса.
+        :return: Пара (статус-код, тело ответа).
+        '''
+        state = self.state
+        if path == '/register' and method == 'POST':
+            return 201, state.register(body)
+        if path == '/login' and method == 'POST':
+            return 200, state.login(body)
+        if path == '/movies':
+            if method == 'GET':
+                return 200, state.list_movies(query)
+            if method == 'POST':
+                state.authorize(authorization, admin=True)
+                return 201, state.create_movie(body)
+
+        match = _MOVIE_PATH.match(path)
+        if match:
+            movie_id = int(match.group(1))
+            if method == 'GET':
+                return 200, state.get_movie(movie_id)
+            if method in ('PATCH', 'PUT', 'DELETE'):
+                state.authorize(authorization, admin=True)
+                if method == 'DELETE':
+                    return 200, state.delete_movie(movie_id)
+                return 200, state.update_movie(movie_id, body)
+
+        match = _USER_PATH.match(path)
+        if match:
+            user_id = match.group(1)
+            current_user = state.authorize(authorization, admin=method == 'DELETE')
+            if method == 'GET':
+                if current_user['id'] != user_id and not ADMIN_ROLES & set(current_user['roles']):
+                    raise StubError(403, 'Forbidden resource')
+                return 200, state.get_user(user_id)
+            if method == 'DELETE':
+                state.delete_user(user_id)
+                return 204, None
+
+        raise StubError(404, f'Cannot {method} {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная заглушка Cinescope')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--movies', type=int, default=0, help='Сколько фильмов создать заранее')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка каждого ответа, секунды')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов с ошибкой 503')
+    args = parser.parse_args()
+
+    # Тесты и утилиты против стенда читают USERNAME/PASSWORD из .env - заглушка берёт те же данные
+    from dotenv import load_dotenv
+    load_dotenv()
+    server = CinescopeStubServer(args.host, args.port,
+                                 os.getenv('STUB_ADMIN_EMAIL') or os.getenv('USERNAME'),
+                                 os.getenv('STUB_ADMIN_PASSWORD') or os.getenv('PASSWORD'),
+                                 FaultConfig(latency=args.latency, error_rate=args.error_rate))
+    server.seed_movies(args.movies)
+    print(f'Cinescope stub on {server.base_url} (admin {server.admin_email})')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
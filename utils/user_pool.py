@@ -0,0 +1,330 @@
+'''
+Пул заранее зарегистрированных пользователей в локальной SQLite-базе.
+
+Пользователи регистрируются пачками параллельно (в том числе фоновым потоком, пока идут тесты),
+а тесты и воркеры нагрузки берут их в аренду: аренда эксклюзивна между потоками и процессами
+(в том числе воркерами xdist), после теста пользователь возвращается в пул или списывается.
+Аренды упавших процессов истекают через lease_ttl. Списанных пользователей удаляет cleanup.
+
+Запуск:
+    python -m utils.user_pool fill --count 10000 --workers 32
+    python -m utils.user_pool stats
+    python -m utils.user_pool cleanup --all    # удалить всех пользователей пула (нужен админ из .env)
+'''
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from constants import BASE_URL
+from custom_requester.middleware import get_default_middleware
+from custom_requester.transport import build_session
+from tests.api.api_manager import ApiManager
+from utils.data_generator import DataGenerator
+
+USER_POOL_PATH = os.getenv('CINESCOPE_USER_POOL', os.path.join(tempfile.gettempdir(), 'cinescope_users.sqlite'))
+# Через сколько секунд аренда без release считается брошенной
+DEFAULT_LEASE_TTL = 15 * 60
+DEFAULT_FILL_WORKERS = 16
+DEFAULT_FILL_CHUNK = 200
+STATES = ('free', 'leased', 'retired')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    base_url TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    password TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'free',
+    owner TEXT,
+    leased_until REAL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_by_state ON users (base_url, state, uses);
+'''
+
+
+class PooledUser:
+    '''
+    Арендованный пользователь.
+    '''
+    __slots__ = ('email', 'password', 'full_name', 'user_id', 'uses')
+
+    def __init__(self, email, password, full_name, user_id, uses=0):
+        self.email = email
+        self.password = password
+        self.full_name = full_name
+        self.user_id = user_id
+        self.uses = uses
+
+    @property
+    def creds(self):
+        return self.email, self.password
+
+    def login_data(self):
+        return {'email': self.email, 'password': self.password}
+
+    def __repr__(self):
+        return f'PooledUser({self.email!r}, id={self.user_id!r}, uses={self.uses})'
+
+
+class UserPool:
+    '''
+    Пул пользователей одного auth-сервиса (base_url) в SQLite-файле.
+    Пароли хранятся открытым текстом - только для тестовых учёток, файл доступен лишь владельцу.
+    '''
+
+    def __init__(self, path=USER_POOL_PATH, base_url=BASE_URL, lease_ttl=DEFAULT_LEASE_TTL, max_uses=None):
+        '''
+        :param path: Файл базы (создаётся при необходимости).
+        :param base_url: Адрес auth-сервиса: пулы разных окружений в одном файле не смешиваются.
+        :param lease_ttl: Через сколько секунд невозвращённая аренда освобождается.
+        :param max_uses: После скольких аренд пользователь списывается (None - без ограничения).
+        '''
+        self.path = path
+        self.base_url = base_url
+        self.lease_ttl = lease_ttl
+        self.max_uses = max_uses
+        # Владелец аренд этого экземпляра: по нему release отличает свои аренды
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._added = threading.Condition()
+        self._filler = None
+        self._stop = threading.Event()
+        self.fill_errors = 0
+        self.last_fill_error = ''
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        created = not os.path.exists(path)
+        self._db().executescript(_SCHEMA)
+        if created:
+            os.chmod(path, 0o600)
+
+    def _db(self):
+        # Соединение на поток; check_same_thread снят только ради закрытия всех соединений в close
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def add(self, users):
+        '''
+        Добавление зарегистрированных пользователей.
+        :param users: Пары (отправленные при регистрации данные, id пользователя).
+        :return: Сколько добавлено.
+        '''
+        now = time.time()
+        rows = [(user['email'], self.base_url, str(user_id), user['password'], user['fullName'], now)
+                for user, user_id in users]
+        with self._write_lock:
+            self._db().executemany('INSERT OR IGNORE INTO users (email, base_url, user_id, password, full_name, '
+                                   'created_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+        if rows:
+            with self._added:
+                self._added.notify_all()
+        return len(rows)
+
+    def fill(self, auth_api, count, max_workers=DEFAULT_FILL_WORKERS, chunk=DEFAULT_FILL_CHUNK):
+        '''
+        Регистрация count новых пользователей пачками по chunk параллельных запросов.
+        Каждая пачка попадает в пул сразу, не дожидаясь остальных.
+        :param auth_api: AuthAPI сервиса base_url.
+        :return: Сколько пользователей добавлено (ошибки регистрации считаются в fill_errors).
+        '''
+        added = 0
+        while added < count and not self._stop.is_set():
+            results = auth_api.register_users(DataGenerator.generate_users(min(chunk, count - added)),
+                                              max_workers=max_workers)
+            registered = [(result.item, result.value.json()['id']) for result in results if result.ok]
+            failed = [result for result in results if not result.ok]
+            if failed:
+                self.fill_errors += len(failed)
+                self.last_fill_error = f'{type(failed[-1].error).__name__}: {failed[-1].error}'
+            if not registered:
+                # Сервис не регистрирует вовсе - не крутимся впустую
+                break
+            added += self.add(registered)
+        return added
+
+    def start_filling(self, auth_api, target, max_workers=DEFAULT_FILL_WORKERS, chunk=DEFAULT_FILL_CHUNK):
+        '''
+        Фоновое пополнение пула до target пользователей (включая арендованные).
+        Аренда при этом не ждёт конца пополнения - только первой пачки, если пул пуст.
+        '''
+        def run():
+            while not self._stop.is_set():
+                missing = target - self.size()
+                if missing <= 0 or not self.fill(auth_api, min(missing, chunk), max_workers, chunk):
+                    return
+
+        self._filler = threading.Thread(target=run, name='user-pool-filler', daemon=True)
+        self._filler.start()
+        return self
+
+    @property
+    def filling(self):
+        return self._filler is not None and self._filler.is_alive()
+
+    def _try_lease(self):
+        db = self._db()
+        now = time.time()
+        # Записи потоков одного процесса ждут на блокировке, а не в цикле ожидания SQLite
+        with self._write_lock:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute("SELECT email, password, full_name, user_id, uses FROM users "
+                                 "WHERE base_url = ? AND state = 'free' ORDER BY uses LIMIT 1",
+                                 (self.base_url,)).fetchone()
+                if row is None:
+                    row = db.execute("SELECT email, password, full_name, user_id, uses FROM users "
+                                     "WHERE base_url = ? AND state = 'leased' AND leased_until < ? LIMIT 1",
+                                     (self.base_url, now)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE users SET state = 'leased', owner = ?, leased_until = ?, uses = uses + 1 "
+                               "WHERE email = ?", (self.owner, now + self.lease_ttl, row[0]))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return None if row is None else PooledUser(*row[:4], uses=row[4] + 1)
+
+    def lease(self, auth_api=None, timeout=30.0):
+        '''
+        Аренда свободного пользователя (реже использованные - первыми).
+        Если свободных нет: ждёт фоновое пополнение, а при его отсутствии регистрирует
+        одного пользователя через auth_api (если регистрация не удалась - ждёт до timeout).
+        :param auth_api: AuthAPI для регистрации при пустом пуле (None - только ждать).
+        :param timeout: Сколько секунд ждать освобождения или пополнения.
+        :return: PooledUser.
+        '''
+        deadline = time.monotonic() + timeout
+        register = auth_api is not None
+        while True:
+            user = self._try_lease()
+            if user is not None:
+                return user
+            if register and not self.filling:
+                if self.fill(auth_api, 1, max_workers=1):
+                    continue
+                # Регистрация не удалась - больше не пробуем, ждём release до конца timeout
+                register = False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                message = f'No free users in pool {self.path} for {self.base_url} after {timeout}s'
+                if self.last_fill_error:
+                    message += f', last registration error: {self.last_fill_error}'
+                raise TimeoutError(message)
+            # Пополнение в этом процессе будит сразу, release в других процессах замечается опросом
+            with self._added:
+                self._added.wait(min(remaining, 0.1))
+
+    def release(self, user, recycle=True):
+        '''
+        Возврат пользователя в пул.
+        :param recycle: False - пользователь изменён тестом (удалён, сменён пароль) и списывается.
+        '''
+        retire = not recycle or (self.max_uses is not None and user.uses >= self.max_uses)
+        with self._write_lock:
+            self._db().execute("UPDATE users SET state = ?, owner = NULL, leased_until = NULL "
+                               "WHERE email = ? AND state = 'leased' AND owner = ?",
+                               ('retired' if retire else 'free', user.email, self.owner))
+        if not retire:
+            with self._added:
+                self._added.notify_all()
+
+    def stats(self):
+        '''
+        :return: Словарь состояние -> количество пользователей этого base_url.
+        '''
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self._db().execute('SELECT state, COUNT(*) FROM users WHERE base_url = ? GROUP BY state',
+                                         (self.base_url,)).fetchall())
+        return counts
+
+    def size(self):
+        '''
+        Пользователи, доступные для аренды сейчас или после release.
+        '''
+        return self._db().execute("SELECT COUNT(*) FROM users WHERE base_url = ? AND state != 'retired'",
+                                  (self.base_url,)).fetchone()[0]
+
+    def cleanup(self, user_api, include_free=False, max_workers=DEFAULT_FILL_WORKERS):
+        '''
+        Удаление списанных (и, если include_free, свободных) пользователей в сервисе и в пуле.
+        Уже удалённые (404) ошибкой не считаются.
+        :param user_api: UserAPI с правами на удаление пользователей.
+        :return: Список строк с описанием ошибок удаления.
+        '''
+        states = ('retired', 'free') if include_free else ('retired',)
+        rows = self._db().execute(
+            f"SELECT user_id, email FROM users WHERE base_url = ? AND state IN ({', '.join('?' * len(states))})",
+            (self.base_url, *states)).fetchall()
+        emails = dict(rows)
+        results = user_api.delete_users(list(emails), max_workers=max_workers, missing_ok=True)
+        self._db().executemany('DELETE FROM users WHERE email = ?',
+                               [(emails[result.item],) for result in results if result.ok])
+        return [f'{result.item}: {type(result.error).__name__} - {result.error}' for result in results if not result.ok]
+
+    def close(self):
+        '''
+        Остановка фонового пополнения и закрытие соединений.
+        '''
+        self._stop.set()
+        if self._filler is not None:
+            self._filler.join()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пул заранее зарегистрированных пользователей Cinescope')
+    parser.add_argument('command', choices=('fill', 'stats', 'cleanup'))
+    parser.add_argument('--path', default=USER_POOL_PATH, help='Файл пула')
+    parser.add_argument('--base-url', default=BASE_URL, help='Адрес auth-сервиса')
+    parser.add_argument('--count', type=int, default=1000, help='Сколько пользователей зарегистрировать (fill)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_FILL_WORKERS, help='Параллельных запросов')
+    parser.add_argument('--all', action='store_true', help='cleanup: удалить и свободных пользователей')
+    args = parser.parse_args()
+
+    pool = UserPool(args.path, args.base_url)
+    try:
+        if args.command == 'fill':
+            api_manager = ApiManager(build_session(), base_url=args.base_url, middleware=get_default_middleware())
+            started = time.perf_counter()
+            added = pool.fill(api_manager.auth_api, args.count, args.workers)
+            print(f'{added} users registered in {time.perf_counter() - started:.1f}s, errors: {pool.fill_errors}')
+            if pool.last_fill_error:
+                print(f'last error: {pool.last_fill_error}')
+        elif args.command == 'cleanup':
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            api_manager = ApiManager(build_session(), base_url=args.base_url)
+            api_manager.auth_api.authenticate((os.getenv('USERNAME'), os.getenv('PASSWORD')))
+            for error in pool.cleanup(api_manager.user_api, include_free=args.all, max_workers=args.workers):
+                print(error)
+        print(' '.join(f'{state}: {count}' for state, count in pool.stats().items()))
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+
+from utils.file_lock import file_lock
+
+DURATIONS_CACHE_KEY = 'cinescope/durations'
+
+
+def is_xdist_worker():
+    return 'PYTEST_XDIST_WORKER' in os.environ
+
+
+def is_xdist_controller(config):
+    '''
+    Основной процесс прогона с -n N: сам тесты не выполняет, только раздаёт их воркерам.
+    '''
+    return not hasattr(config, 'workerinput') and getattr(config.option, 'dist', 'no') != 'no'
+
+
+def shared_session_value(shared_dir, name, factory):
+    '''
+    Значение, которое вычисляется один раз на весь прогон и делится между воркерами xdist
+    через JSON-файл под блокировкой. Первый воркер вызывает factory, остальные читают файл.
+    :param shared_dir: Общий для воркеров каталог (None - без разделения, просто factory()).
+    :param name: Имя значения (имя файла).
+    :param factory: Функция без аргументов, возвращающая JSON-сериализуемое значение.
+    '''
+    if shared_dir is None:
+        return factory()
+    path = os.path.join(shared_dir, f'{name}.json')
+    with file_lock(f'{path}.lock'):
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        value = factory()
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(value, file)
+        return value
+
+
+class DurationStore:
+    '''
+    Длительности тестов из прошлых прогонов (в кэше pytest), сглаженные
+    экспоненциальным средним, чтобы один медленный прогон не ломал шардирование.
+    '''
+
+    def __init__(self, cache, smoothing=0.5):
+        self.cache = cache
+        self.smoothing = smoothing
+        self.durations = cache.get(DURATIONS_CACHE_KEY, {})
+        self._current = {}
+
+    def add(self, nodeid, duration):
+        self._current[nodeid] = self._current.get(nodeid, 0.0) + duration
+
+    def save(self):
+        if not self._current:
+            return
+        for nodeid, duration in self._current.items():
+            previous = self.durations.get(nodeid)
+            self.durations[nodeid] = duration if previous is None else \
+                previous * (1 - self.smoothing) + duration * self.smoothing
+        self.cache.set(DURATIONS_CACHE_KEY, self.durations)
+
+    def estimate(self, nodeid):
+        '''
+        Ожидаемая длительность; для новых тестов - медиана известных.
+        '''
+        if nodeid in self.durations:
+            return self.durations[nodeid]
+        if not self.durations:
+            return 0.0
+        known = sorted(self.durations.values())
+        return known[len(known) // 2]
+
+
+def make_duration_scheduler(config, log, durations):
+    '''
+    Планировщик xdist: как --dist load, но сначала раздаёт самые долгие тесты
+    (жадный LPT), чтобы воркеры заканчивали примерно одновременно.
+    '''
+    from xdist.scheduler import LoadScheduling
+
+    class DurationScheduling(LoadScheduling):
+        _sorted = False
+
+        def _send_tests(self, node, num):
+            if not self._sorted:
+                self._sorted = True
+                self.pending.sort(key=lambda index: durations.estimate(self.collection[index]), reverse=True)
+            super()._send_tests(node, num)
+
+    return DurationScheduling(config, log)